@@ -0,0 +1,294 @@
+import argparse
+import re
+import sqlite3
+from collections import Counter
+from datetime import date, timedelta
+
+import repository
+from config import Config
+
+HWM_KEY = 'search_history_hwm'
+PRUNED_KEY = 'search_history_pruned'  # events deleted by retention.py
+UPDATE_BATCH_SIZE = 5000
+RECOMPUTE_CHUNK_SIZE = 100000
+
+PERIOD_EXPRESSIONS = {
+    'day': 'day',
+    'week': "strftime('%Y-W%W', day)",
+}
+
+
+def normalize_title(title):
+    """Fold case and whitespace so 'Dark Knight ' and 'dark knight' roll up together"""
+    return re.sub(r'\s+', ' ', (title or '').strip().lower())
+
+
+def init_analytics(conn):
+    """Create the rollup tables (idempotent)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS search_daily_titles (
+            day TEXT NOT NULL,
+            title TEXT NOT NULL,
+            searches INTEGER NOT NULL,
+            PRIMARY KEY (day, title)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS search_daily_users (
+            day TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            searches INTEGER NOT NULL,
+            PRIMARY KEY (day, user_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_search_daily_users_user ON search_daily_users (user_id, day)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS analytics_state (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    ''')
+    conn.commit()
+
+
+def shard_hwm_key(index, shard_count):
+    """High-water mark name for one search_history shard (the original name when unsharded)"""
+    return HWM_KEY if shard_count == 1 else f'{HWM_KEY}:shard{index}'
+
+
+def get_high_water_mark(conn, key=HWM_KEY):
+    row = conn.execute('SELECT value FROM analytics_state WHERE name = ?', (key,)).fetchone()
+    return row[0] if row else 0
+
+
+def set_high_water_mark(conn, value, key=HWM_KEY):
+    conn.execute(
+        'INSERT INTO analytics_state (name, value) VALUES (?, ?) '
+        'ON CONFLICT(name) DO UPDATE SET value = excluded.value',
+        (key, value)
+    )
+
+
+def _merge_counts(conn, title_counts, user_counts):
+    conn.executemany(
+        'INSERT INTO search_daily_titles (day, title, searches) VALUES (?, ?, ?) '
+        'ON CONFLICT(day, title) DO UPDATE SET searches = searches + excluded.searches',
+        [(day, title, count) for (day, title), count in title_counts.items()]
+    )
+    conn.executemany(
+        'INSERT INTO search_daily_users (day, user_id, searches) VALUES (?, ?, ?) '
+        'ON CONFLICT(day, user_id) DO UPDATE SET searches = searches + excluded.searches',
+        [(day, user_id, count) for (day, user_id), count in user_counts.items()]
+    )
+
+
+def update_rollups(conn, batch_size=UPDATE_BATCH_SIZE, source='main', hwm_key=HWM_KEY):
+    """Fold search_history rows newer than the high-water mark into the rollups.
+
+    source is the schema holding search_history (an attached shard, see
+    update_all_rollups) and hwm_key its high-water mark. Each batch is
+    committed together with the new high-water mark, so an interrupted run
+    resumes where it stopped without double counting.
+    Returns the number of events processed.
+    """
+    init_analytics(conn)
+    hwm = get_high_water_mark(conn, hwm_key)
+    processed = 0
+
+    while True:
+        rows = conn.execute(
+            f'SELECT id, user_id, movie_title, date(search_date) FROM {source}.search_history '
+            'WHERE id > ? ORDER BY id LIMIT ?',
+            (hwm, batch_size)
+        ).fetchall()
+        if not rows:
+            break
+
+        title_counts = Counter()
+        user_counts = Counter()
+        for row_id, user_id, title, day in rows:
+            title_counts[(day, normalize_title(title))] += 1
+            if user_id is not None:
+                user_counts[(day, user_id)] += 1
+
+        hwm = rows[-1][0]
+        _merge_counts(conn, title_counts, user_counts)
+        set_high_water_mark(conn, hwm, hwm_key)
+        conn.commit()
+        processed += len(rows)
+
+    return processed
+
+
+def update_all_rollups(conn, path_template=Config.SHARD_PATH_TEMPLATE):
+    """update_rollups() over every search_history shard; conn is a main-database connection"""
+    sources = repository.attach_shards(conn, path_template)
+    return sum(
+        update_rollups(conn, source=schema, hwm_key=shard_hwm_key(index, len(sources)))
+        for schema, index in sources
+    )
+
+
+def recompute_rollups(conn, chunk_size=RECOMPUTE_CHUNK_SIZE, path_template=Config.SHARD_PATH_TEMPLATE):
+    """Rebuild the rollups from scratch with vectorized pandas group-bys.
+
+    search_history (every shard of it) is read in chunks; each chunk is
+    reduced to partial counts, which are summed at the end, so memory scales
+    with the number of distinct (day, title) pairs rather than raw events.
+    Returns the number of events counted.
+    """
+    import pandas as pd
+
+    init_analytics(conn)
+    if conn.execute('SELECT 1 FROM analytics_state WHERE name = ? AND value > 0', (PRUNED_KEY,)).fetchone():
+        # The deleted events only survive in the rollups; rebuilding would drop them
+        raise RuntimeError('search_history has been pruned by retention; the rollups cannot be rebuilt from it')
+    sources = repository.attach_shards(conn, path_template)
+    title_parts = []
+    user_parts = []
+    max_ids = {}
+    events = 0
+
+    for schema, index in sources:
+        max_ids[index] = 0
+        query = f'SELECT id, user_id, movie_title, search_date FROM {schema}.search_history'
+        for frame in pd.read_sql_query(query, conn, chunksize=chunk_size):
+            if frame.empty:
+                continue
+            max_ids[index] = max(max_ids[index], int(frame['id'].max()))
+            events += len(frame)
+            _add_partial_counts(frame, title_parts, user_parts)
+
+    with conn:
+        conn.execute('DELETE FROM search_daily_titles')
+        conn.execute('DELETE FROM search_daily_users')
+        if title_parts:
+            titles = pd.concat(title_parts).groupby(level=[0, 1]).sum()
+            conn.executemany(
+                'INSERT INTO search_daily_titles (day, title, searches) VALUES (?, ?, ?)',
+                ((day, title, int(count)) for (day, title), count in titles.items())
+            )
+        if user_parts:
+            users = pd.concat(user_parts).groupby(level=[0, 1]).sum()
+            conn.executemany(
+                'INSERT INTO search_daily_users (day, user_id, searches) VALUES (?, ?, ?)',
+                ((day, int(user_id), int(count)) for (day, user_id), count in users.items())
+            )
+        for index, max_id in max_ids.items():
+            set_high_water_mark(conn, max_id, shard_hwm_key(index, len(sources)))
+
+    return events
+
+
+def _add_partial_counts(frame, title_parts, user_parts):
+    """Reduce one chunk of search_history to (day, title) and (day, user_id) counts"""
+    frame['day'] = frame['search_date'].astype(str).str.slice(0, 10)
+    frame['title'] = (frame['movie_title'].fillna('').str.strip().str.lower()
+                      .str.replace(r'\s+', ' ', regex=True))
+    title_parts.append(frame.groupby(['day', 'title']).size())
+    users = frame.dropna(subset=['user_id'])
+    user_parts.append(users.groupby(['day', users['user_id'].astype('int64')]).size())
+
+
+def default_range(days):
+    end = date.today()
+    return (end - timedelta(days=days - 1)).isoformat(), end.isoformat()
+
+
+def top_searches(conn, start_day, end_day, limit=10, period=None):
+    """Most searched titles in [start_day, end_day], overall or per day/week period"""
+    if period is None:
+        return conn.execute(
+            'SELECT title, SUM(searches) AS searches FROM search_daily_titles '
+            'WHERE day BETWEEN ? AND ? GROUP BY title ORDER BY searches DESC, title LIMIT ?',
+            (start_day, end_day, limit)
+        ).fetchall()
+
+    bucket = PERIOD_EXPRESSIONS[period]
+    return conn.execute(f'''
+        SELECT period, title, searches FROM (
+            SELECT period, title, searches,
+                   ROW_NUMBER() OVER (PARTITION BY period ORDER BY searches DESC, title) AS rank
+            FROM (
+                SELECT {bucket} AS period, title, SUM(searches) AS searches
+                FROM search_daily_titles
+                WHERE day BETWEEN ? AND ?
+                GROUP BY period, title
+            )
+        )
+        WHERE rank <= ?
+        ORDER BY period DESC, searches DESC
+    ''', (start_day, end_day, limit)).fetchall()
+
+
+def active_users(conn, start_day, end_day, period='day'):
+    """Distinct searching users per day or week"""
+    bucket = PERIOD_EXPRESSIONS[period]
+    return conn.execute(
+        f'SELECT {bucket} AS period, COUNT(DISTINCT user_id) AS users, SUM(searches) AS searches '
+        'FROM search_daily_users WHERE day BETWEEN ? AND ? GROUP BY period ORDER BY period DESC',
+        (start_day, end_day)
+    ).fetchall()
+
+
+def user_search_counts(conn, start_day, end_day, user_id=None, limit=20):
+    """Searches per user in the range, busiest first (or a single user's total)"""
+    if user_id is not None:
+        return conn.execute(
+            'SELECT user_id, SUM(searches) AS searches FROM search_daily_users '
+            'WHERE user_id = ? AND day BETWEEN ? AND ? GROUP BY user_id',
+            (user_id, start_day, end_day)
+        ).fetchall()
+    return conn.execute(
+        'SELECT user_id, SUM(searches) AS searches FROM search_daily_users '
+        'WHERE day BETWEEN ? AND ? GROUP BY user_id ORDER BY searches DESC LIMIT ?',
+        (start_day, end_day, limit)
+    ).fetchall()
+
+
+def _print_rows(headers, rows):
+    if not rows:
+        print("  (No data)")
+        return
+    widths = [max(len(str(h)), *(len(str(row[i])) for row in rows)) + 2 for i, h in enumerate(headers)]
+    print("".join(f"{str(h):<{widths[i]}}" for i, h in enumerate(headers)))
+    print("-" * sum(widths))
+    for row in rows:
+        print("".join(f"{str(cell):<{widths[i]}}" for i, cell in enumerate(row)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='CineScope search analytics')
+    parser.add_argument('command', choices=['update', 'recompute', 'top', 'active', 'users'])
+    parser.add_argument('--days', type=int, default=7, help='report window ending today')
+    parser.add_argument('--period', choices=sorted(PERIOD_EXPRESSIONS), help='break the report down by day or week')
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--user-id', type=int)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(Config.DATABASE_PATH)
+    try:
+        if args.command == 'update':
+            processed = update_all_rollups(conn)
+            print(f"✅ Folded {processed} new searches into the rollups")
+        elif args.command == 'recompute':
+            try:
+                events = recompute_rollups(conn)
+            except RuntimeError as e:
+                print(f"❌ {e}")
+            else:
+                print(f"✅ Rollups rebuilt from {events} searches")
+        else:
+            # Reports only read the rollups; bring them up to date first
+            update_all_rollups(conn)
+            start_day, end_day = default_range(args.days)
+            print(f"📊 {start_day} .. {end_day}")
+            if args.command == 'top':
+                rows = top_searches(conn, start_day, end_day, args.limit, args.period)
+                _print_rows(['period', 'title', 'searches'] if args.period else ['title', 'searches'], rows)
+            elif args.command == 'active':
+                _print_rows(['period', 'users', 'searches'], active_users(conn, start_day, end_day, args.period or 'day'))
+            else:
+                _print_rows(['user_id', 'searches'], user_search_counts(conn, start_day, end_day, args.user_id, args.limit))
+    finally:
+        conn.close()
@@ -1,35 +1,131 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash
+from flask import Flask, Blueprint, current_app, render_template, request, redirect, url_for, session, jsonify, flash, send_file, Response
 import sqlite3
-import requests
 import os
 import json
 import re
-from werkzeug.security import generate_password_hash, check_password_hash
+import time
+from contextlib import contextmanager
 from config import Config
+import assets
+import posters
+import password_hasher
+from password_hasher import HashingBusy
+import catalog_snapshot
+import for_you
+import title_resolver
+import chat_sessions
+import background_tasks
+import cache
+import watchlist_import
+import repository
+import movie_index
+import tracing
+import trending
+import db_stats
+from repository import UsernameTaken
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from http_client import get_http_session
+from movie_record import MovieRecord
 
-app = Flask(__name__)
-app.config.from_object(Config)
-app.secret_key = app.config['SECRET_KEY']
+bp = Blueprint('cinescope', __name__)
 
-# OpenRouter AI Configuration
-OPENROUTER_AVAILABLE = False
-if app.config['OPENROUTER_API_KEY']:
-    OPENROUTER_AVAILABLE = True
-    OPENROUTER_MODEL = app.config.get('OPENROUTER_MODEL', 'openai/gpt-3.5-turbo')
-    print(f"✅ OpenRouter AI configured with model: {OPENROUTER_MODEL}")
-else:
-    print("⚠️  OPENROUTER_API_KEY not configured in .env file")
+OMDB_URL = "http://www.omdbapi.com/"
+
+# Application factory
+class StartupTimer:
+    """Records how long each startup phase takes"""
+    
+    def __init__(self):
+        self.phases = []
+        self._started = time.perf_counter()
+    
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, round((time.perf_counter() - start) * 1000, 2)))
+    
+    @property
+    def total_ms(self):
+        return round((time.perf_counter() - self._started) * 1000, 2)
+
+def create_app(config_object=Config, **overrides):
+    """Build a configured CineScope app.
+
+    Only cheap, per-process setup happens here; the schema is migrated once
+    per database (tracked by PRAGMA user_version) and expensive subsystems
+    are created lazily on first use or by warm_up().
+    """
+    timer = StartupTimer()
+    
+    with timer.phase('config'):
+        app = Flask(__name__)
+        app.config.from_object(config_object)
+        app.config.update(overrides)
+        app.secret_key = app.config['SECRET_KEY']
+        app.config['OPENROUTER_AVAILABLE'] = bool(app.config['OPENROUTER_API_KEY'])
+    
+    with timer.phase('extensions'):
+        tracing.init_app(app)
+        db_stats.init_app(app)
+        app.register_blueprint(bp)
+        assets.init_app(app)
+        password_hasher.init_app(app)
+        for_you.init_app(app, get_db_connection)
+        background_tasks.init_app(app)
+        repository.init_app(app)
+        watchlist_import.init_app(app, get_db_connection)
+        movie_index.init_app(app, get_db_connection, lambda imdb_id: omdb_get(i=imdb_id, plot='short'), search_omdb_title)
+        trending.init_app(app, get_db_connection)
+    
+    with timer.phase('database'):
+        with app.app_context():
+            init_db()
+    
+    if app.config.get('EAGER_INIT'):
+        with timer.phase('warm_up'):
+            warm_up(app)
+    
+    app.extensions['startup_timings'] = {'phases': dict(timer.phases), 'total_ms': timer.total_ms}
+    report_startup(app)
+    return app
+
+def warm_up(app):
+    """Create lazily-initialized subsystems ahead of the first request (gunicorn preload hook)"""
+    with app.app_context():
+        get_http_session()
+        catalog_snapshot.get_catalog()
+        posters.get_poster_cache()
+        cache.get_cache()
+
+def report_startup(app):
+    timings = app.extensions['startup_timings']
+    phases = ', '.join(f"{name} {ms:.1f}ms" for name, ms in timings['phases'].items())
+    budget = app.config['STARTUP_BUDGET_MS']
+    status = "✅" if timings['total_ms'] <= budget else "⚠️  over budget:"
+    print(f"{status} App started in {timings['total_ms']:.1f}ms (budget {budget}ms) — {phases}")
+    shards = app.extensions['repository'].shard_count
+    if shards != app.config['USER_DATA_SHARDS']:
+        print(f"⚠️  USER_DATA_SHARDS is {app.config['USER_DATA_SHARDS']} but user data is split into {shards} shard(s); "
+              f"run `python repository.py rebalance --shards {app.config['USER_DATA_SHARDS']}` with the app stopped")
+    if app.config['OPENROUTER_AVAILABLE']:
+        print(f"✅ OpenRouter AI configured with model: {app.config['OPENROUTER_MODEL']}")
+    else:
+        print("⚠️  OPENROUTER_API_KEY not configured in .env file")
+
+def openrouter_available():
+    return current_app.config['OPENROUTER_AVAILABLE']
 
 # SQLite database connection
 def get_db_connection():
-    conn = sqlite3.connect(app.config['DATABASE_PATH'])
+    conn = sqlite3.connect(current_app.config['DATABASE_PATH'], factory=db_stats.connection_factory())
     conn.row_factory = sqlite3.Row
     return conn
 
-# Initialize database
-def init_db():
-    conn = get_db_connection()
-    
+# Schema migrations, applied in order; PRAGMA user_version records how many have run
+def migration_initial_schema(conn):
     conn.execute('''
         CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -59,84 +155,213 @@ def init_db():
             FOREIGN KEY (user_id) REFERENCES users (id)
         )
     ''')
-    
-    conn.commit()
-    conn.close()
-    print("✅ Database initialized successfully!")
+
+def migration_keyset_indexes(conn):
+    # Keyset pagination indexes for /api/history and /api/favorites
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_search_history_user_date ON search_history (user_id, search_date, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_favorites_user_date ON favorites (user_id, added_date, id)')
+
+def migration_for_you_feed(conn):
+    # Taste profiles and precomputed "For You" feeds
+    for_you.init_for_you(conn)
+
+def migration_title_resolutions(conn):
+    # Normalized query -> IMDb id cache, including known misses
+    title_resolver.init_title_cache(conn)
+
+def migration_chat_sessions(conn):
+    # Server-side DIRECTOR conversation state
+    chat_sessions.init_chat_sessions(conn)
+
+def migration_import_jobs(conn):
+    # Progress of bulk watchlist imports
+    watchlist_import.init_import_jobs(conn)
+
+def migration_storage_layout(conn):
+    # Number of shard files favorites/search_history are split across
+    repository.init_storage_layout(conn, current_app.config['USER_DATA_SHARDS'])
+
+def migration_movie_index(conn):
+    # Typed movie metadata and genre/language/people link tables behind /discover
+    movie_index.init_movie_index(conn)
+
+def migration_history_movie_ids(conn):
+    # The IMDb id each search resolved to, so history pages can join movie metadata
+    repository.add_history_movie_id(conn)
+
+def migration_trending(conn):
+    # Checkpoint of the streaming search counts behind /trending
+    trending.init_trending(conn)
+
+def migration_profile_generation(conn):
+    # Lets a For You refresh notice the profile was marked stale or reset while it ran
+    for_you.add_profile_generation(conn)
+
+def migration_title_resolution_keys(conn):
+    # Resolutions are now keyed with their leading article, and earlier rows may hold a
+    # spelling correction as the answer to the raw query: let them be resolved again
+    conn.execute('DELETE FROM title_resolutions')
+
+MIGRATIONS = [
+    migration_initial_schema,
+    migration_keyset_indexes,
+    migration_for_you_feed,
+    migration_title_resolutions,
+    migration_chat_sessions,
+    migration_import_jobs,
+    migration_storage_layout,
+    migration_movie_index,
+    migration_history_movie_ids,
+    migration_trending,
+    migration_title_resolution_keys,
+    migration_profile_generation,
+]
+
+# Initialize database
+def init_db():
+    """Apply pending migrations; a no-op once the database is current.
+
+    BEGIN IMMEDIATE serializes workers starting at the same time, and the
+    version is re-read under that lock so each migration runs exactly once.
+    """
+    conn = get_db_connection()
+    try:
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version >= len(MIGRATIONS):
+            return
+        if version == 0:
+            # Only takes effect before the first table exists; older databases are
+            # converted once with `python retention.py enable-vacuum`
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.isolation_level = None
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            for migration in MIGRATIONS[version:]:
+                migration(conn)
+            conn.execute(f'PRAGMA user_version = {len(MIGRATIONS)}')
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        print(f"✅ Database migrated from version {version} to {len(MIGRATIONS)}")
+    finally:
+        conn.close()
+
+def get_page_limit(default=20, maximum=100):
+    try:
+        limit = int(request.args.get('limit', default))
+    except ValueError:
+        limit = default
+    return max(1, min(limit, maximum))
 
 # OMDB API function
-def search_omdb_api(movie_title):
-    api_key = app.config['OMDB_API_KEY']
-    
-    # First search by title to get movie ID
-    search_url = f"http://www.omdbapi.com/?apikey={api_key}&s={movie_title}"
-    
+def fetch_movie_record(movie_title):
+    """Resolve a free-text title to a MovieRecord, or None.
+
+    The title goes through title_resolver first (resolution cache, catalog
+    and fuzzy matching), so only genuinely new queries spend an OMDB search.
+    """
+    conn = get_db_connection()
     try:
-        # Search for the movie
-        search_response = requests.get(search_url)
-        search_data = search_response.json()
-        
-        if search_data.get('Response') == 'True' and search_data.get('Search'):
-            # Get the first movie result
-            first_movie = search_data['Search'][0]
-            movie_id = first_movie['imdbID']
-            
-            # Now get detailed information using the ID
-            detail_url = f"http://www.omdbapi.com/?apikey={api_key}&i={movie_id}&plot=short"
-            detail_response = requests.get(detail_url)
-            movie_data = detail_response.json()
-            
-            if movie_data.get('Response') == 'True':
-                return format_movie_data(movie_data)
-            else:
-                return None
-        else:
-            return None
-            
+        imdb_id = title_resolver.resolve(conn, movie_title, search_omdb_title)
     except Exception as e:
         print(f"OMDB API Error: {e}")
         return None
+    finally:
+        conn.close()
+    return fetch_movie_by_id(imdb_id) if imdb_id else None
 
-def format_movie_data(movie_data):
-    """Format OMDB data for our app"""
-    return {
-        'title': movie_data.get('Title', 'N/A'),
-        'poster': movie_data.get('Poster') if movie_data.get('Poster') and movie_data.get('Poster') != 'N/A' else 'https://via.placeholder.com/300x450/667eea/ffffff?text=No+Poster+Available',
-        'genre': movie_data.get('Genre', 'N/A'),
-        'summary': movie_data.get('Plot', 'No summary available.'),
-        'rating': f"{movie_data.get('imdbRating', 'N/A')}/10",
-        'language': movie_data.get('Language', 'N/A'),
-        'runtime': movie_data.get('Runtime', 'N/A'),
-        'year': movie_data.get('Year', 'N/A'),
-        'director': movie_data.get('Director', 'N/A'),
-        'actors': movie_data.get('Actors', 'N/A'),
-        'box_office': movie_data.get('BoxOffice', 'N/A'),
-        'imdb_id': movie_data.get('imdbID', 'N/A')
-    }
-
-def get_advanced_recommendations(movie_data, page=1, exclude_titles=None):
-    """Get personalized movie recommendations based on multiple factors"""
-    if exclude_titles is None:
-        exclude_titles = []
+def fetch_movie_by_id(imdb_id):
+    """Detailed MovieRecord for an IMDb id, or None"""
+    try:
+        movie_data = omdb_get(i=imdb_id, plot='short')
+        if movie_data.get('Response') == 'True':
+            return omdb_record(movie_data)
+    except Exception as e:
+        print(f"OMDB API Error: {e}")
+    return None
+
+def omdb_get(**params):
+    """One OMDB request, answered from the shared cache when any worker has made it recently.
+
+    params are URL-encoded, never pasted into the URL; only successful
+    responses are cached.
+    """
+    return cache.get_cache().get_or_compute(
+        'omdb', params,
+        lambda: get_http_session().get(
+            OMDB_URL, params={**params, 'apikey': current_app.config['OMDB_API_KEY']}, timeout=5
+        ).json(),
+        current_app.config['CACHE_TTL_OMDB'],
+        cache_if=lambda data: data.get('Response') == 'True'
+    )
+
+def search_omdb_title(query):
+    """First OMDB search hit for query as (imdb_id, title).
+
+    title_resolver.NOT_FOUND when OMDB says there is no match; None for
+    anything else (request limit, bad key) so the miss isn't cached.
+    """
+    search_data = omdb_get(s=query)
+    if search_data.get('Response') == 'True' and search_data.get('Search'):
+        first_movie = search_data['Search'][0]
+        return first_movie['imdbID'], first_movie.get('Title', query)
+    error = (search_data.get('Error') or '').lower()
+    if 'not found' in error or 'too many results' in error:
+        return title_resolver.NOT_FOUND
+    return None
+
+def search_omdb_api(movie_title):
+    """Movie details as the JSON dict the frontend expects, or None"""
+    record = fetch_movie_record(movie_title)
+    return record.to_api_dict() if record else None
+
+def omdb_record(movie_data):
+    """Parse an OMDB detail response once into a MovieRecord (and queue it for the movie index)"""
+    posters.remember_poster_source(movie_data.get('imdbID'), movie_data.get('Poster'))
+    movie_index.remember(movie_data)
+    return MovieRecord.from_omdb(movie_data)
+
+def get_advanced_recommendations(original, page=1, exclude_titles=None):
+    """One page of recommendations as (cards, has_more), shared through the cache.
+
+    original is a MovieRecord, or the movie JSON dict posted back by the browser.
+    Empty results are not cached, so a failed OMDB round is retried next time.
+    """
+    if not isinstance(original, MovieRecord):
+        # Rebuild posted movies from OMDB (a cache hit right after the search), trusting the client's copy only as a fallback
+        imdb_id = original.get('imdb_id')
+        record = fetch_movie_by_id(imdb_id) if isinstance(imdb_id, str) and posters.is_valid_imdb_id(imdb_id) else None
+        original = record or MovieRecord.from_api_dict(original)
+    exclude_titles = list(exclude_titles or [])
+    if not original.imdb_id:
+        return compute_advanced_recommendations(original, page, exclude_titles)
     
+    recommendations, has_more = cache.get_cache().get_or_compute(
+        'recommendations', [original.imdb_id, page, sorted(set(exclude_titles))],
+        lambda: compute_advanced_recommendations(original, page, exclude_titles),
+        current_app.config['CACHE_TTL_RECOMMENDATIONS'],
+        cache_if=lambda result: bool(result[0])
+    )
+    return recommendations, has_more
+
+def compute_advanced_recommendations(original, page, exclude_titles):
+    """Get personalized movie recommendations based on multiple factors"""
     # Exclude the current movie
-    if movie_data.get('title'):
-        exclude_titles.append(movie_data['title'])
+    if original.title and original.title != 'N/A':
+        exclude_titles.append(original.title)
     
-    api_key = app.config['OMDB_API_KEY']
     recommendations = []
     all_candidates = []
     
     try:
         # Strategy 1: Search by Genre (multiple genres if available)
-        genre = movie_data.get('genre', '')
-        if genre and genre != 'N/A':
-            genres = [g.strip() for g in genre.split(',')]
-            for gen in genres[:2]:  # Try first 2 genres
+        if original.genres:
+            for gen in original.genre_names[:2]:  # Try first 2 genres
                 try:
-                    url = f"http://www.omdbapi.com/?apikey={api_key}&s={gen}&type=movie&page={page}"
-                    response = requests.get(url, timeout=5)
-                    data = response.json()
+                    with tracing.span('recommendations.search', inherit={'cinescope.strategy': 'genre'}):
+                        data = omdb_get(s=gen, type='movie', page=page)
                     if data.get('Response') == 'True':
                         for movie in data['Search']:
                             if movie.get('Title') not in exclude_titles:
@@ -154,14 +379,12 @@ def get_advanced_recommendations(movie_data, page=1, exclude_titles=None):
                     continue
         
         # Strategy 2: Search by Director
-        director = movie_data.get('director', '')
-        if director and director != 'N/A' and len(director.split(',')) <= 2:
+        if original.directors and len(original.directors) <= 2:
             # Get first director name
-            first_director = director.split(',')[0].strip().split()[0]  # First name
+            first_director = original.director_names[0].split()[0]  # First name
             try:
-                url = f"http://www.omdbapi.com/?apikey={api_key}&s={first_director}&type=movie&page={min(page, 2)}"
-                response = requests.get(url, timeout=5)
-                data = response.json()
+                with tracing.span('recommendations.search', inherit={'cinescope.strategy': 'director'}):
+                    data = omdb_get(s=first_director, type='movie', page=min(page, 2))
                 if data.get('Response') == 'True':
                     for movie in data['Search']:
                         if movie.get('Title') not in exclude_titles:
@@ -179,14 +402,12 @@ def get_advanced_recommendations(movie_data, page=1, exclude_titles=None):
                 pass
         
         # Strategy 3: Search by Lead Actor (first actor mentioned)
-        actors = movie_data.get('actors', '')
-        if actors and actors != 'N/A':
+        if original.actors:
             # Get first actor's first name
-            first_actor = actors.split(',')[0].strip().split()[0]
+            first_actor = original.actor_names[0].split()[0]
             try:
-                url = f"http://www.omdbapi.com/?apikey={api_key}&s={first_actor}&type=movie&page={min(page, 2)}"
-                response = requests.get(url, timeout=5)
-                data = response.json()
+                with tracing.span('recommendations.search', inherit={'cinescope.strategy': 'actor'}):
+                    data = omdb_get(s=first_actor, type='movie', page=min(page, 2))
                 if data.get('Response') == 'True':
                     for movie in data['Search']:
                         if movie.get('Title') not in exclude_titles:
@@ -204,15 +425,13 @@ def get_advanced_recommendations(movie_data, page=1, exclude_titles=None):
                 pass
         
         # Strategy 4: Search by Year (similar time period - ±5 years)
-        year = movie_data.get('year', '')
-        if year and year != 'N/A' and year.isdigit():
-            year_int = int(year)
+        if original.year and not original.year_label:
+            year = year_int = original.year
             # Try searching for movies in similar time period using year
             try:
                 # Use year as search term (may find movies released that year)
-                url = f"http://www.omdbapi.com/?apikey={api_key}&s={year}&type=movie&page={min(page, 2)}"
-                response = requests.get(url, timeout=5)
-                data = response.json()
+                with tracing.span('recommendations.search', inherit={'cinescope.strategy': 'year'}):
+                    data = omdb_get(s=year, type='movie', page=min(page, 2))
                 if data.get('Response') == 'True':
                     for movie in data['Search']:
                         movie_year = movie.get('Year', '')
@@ -247,50 +466,28 @@ def get_advanced_recommendations(movie_data, page=1, exclude_titles=None):
                 unique_candidates.append(candidate)
         
         # Get detailed information for top candidates (limit to 15 for performance)
-        detailed_recs = []
+        candidates = []
         for candidate in unique_candidates[:15]:
             try:
                 imdb_id = candidate.get('imdb_id')
                 if imdb_id:
-                    detail_url = f"http://www.omdbapi.com/?apikey={api_key}&i={imdb_id}&plot=short"
-                    detail_response = requests.get(detail_url, timeout=5)
-                    detail_data = detail_response.json()
+                    with tracing.span('recommendations.details', inherit={'cinescope.strategy': candidate['source']}):
+                        detail_data = omdb_get(i=imdb_id, plot='short')
                     
                     if detail_data.get('Response') == 'True':
-                        # Calculate relevance score
-                        relevance_score = calculate_relevance_score(movie_data, detail_data)
-                        
-                        # Handle poster URL properly
-                        poster_url = detail_data.get('Poster', candidate.get('poster', ''))
-                        if not poster_url or poster_url == 'N/A' or poster_url.lower() in ['none', 'null']:
-                            poster_url = 'https://via.placeholder.com/300x450/667eea/ffffff?text=No+Poster'
-                        
-                        detailed_recs.append({
-                            'title': detail_data.get('Title', candidate['title']),
-                            'poster': poster_url,
-                            'year': detail_data.get('Year', candidate.get('year', 'N/A')),
-                            'rating': f"{detail_data.get('imdbRating', 'N/A')}/10",
-                            'genre': detail_data.get('Genre', 'N/A'),
-                            'director': detail_data.get('Director', 'N/A'),
-                            'imdb_id': detail_data.get('imdbID', ''),
-                            'relevance_score': relevance_score,
-                            'source': candidate.get('source', 'genre')
-                        })
+                        candidates.append(omdb_record(detail_data))
             except:
                 continue
         
-        # Sort by relevance score
-        detailed_recs.sort(key=lambda x: x.get('relevance_score', 0), reverse=True)
+        # Score and sort by relevance
+        with tracing.span('recommendations.score', **{'cinescope.candidates': len(candidates)}):
+            detailed_recs = [(calculate_relevance_score(original, record), record) for record in candidates]
+            detailed_recs.sort(key=lambda x: x[0], reverse=True)
         
         # Return 3 movies for current page
         start_idx = (page - 1) * 3
         end_idx = start_idx + 3
-        recommendations = detailed_recs[start_idx:end_idx]
-        
-        # Clean up recommendations data
-        for rec in recommendations:
-            rec.pop('relevance_score', None)
-            rec.pop('source', None)
+        recommendations = [record.to_card_dict() for _, record in detailed_recs[start_idx:end_idx]]
         
         return recommendations, len(detailed_recs) > end_idx  # Return has_more flag
         
@@ -299,48 +496,31 @@ def get_advanced_recommendations(movie_data, page=1, exclude_titles=None):
         return [], False
 
 def calculate_relevance_score(original_movie, candidate_movie):
-    """Calculate how relevant a candidate movie is to the original"""
+    """Calculate how relevant a candidate MovieRecord is to the original"""
     score = 0
     
     # Genre match (40 points)
-    original_genres = set(g.strip().lower() for g in original_movie.get('genre', '').split(','))
-    candidate_genres = set(g.strip().lower() for g in candidate_movie.get('Genre', '').split(','))
-    genre_match = len(original_genres.intersection(candidate_genres))
-    score += genre_match * 20
+    score += len(set(original_movie.genres).intersection(candidate_movie.genres)) * 20
     
     # Director match (30 points)
-    original_director = original_movie.get('director', '').lower()
-    candidate_director = candidate_movie.get('Director', '').lower()
-    if original_director and candidate_director and original_director != 'n/a':
-        if any(d in candidate_director for d in original_director.split(',')[0].split()[:2]):
-            score += 30
+    if set(original_movie.directors).intersection(candidate_movie.directors):
+        score += 30
     
     # Actor match (20 points)
-    original_actors = set(a.strip().lower() for a in original_movie.get('actors', '').split(','))
-    candidate_actors = set(a.strip().lower() for a in candidate_movie.get('Actors', '').split(','))
-    actor_match = len(original_actors.intersection(candidate_actors))
-    score += actor_match * 10
+    score += len(set(original_movie.actors).intersection(candidate_movie.actors)) * 10
     
     # Year proximity (10 points) - closer years score higher
-    try:
-        orig_year = int(original_movie.get('year', '0'))
-        cand_year = int(candidate_movie.get('Year', '0'))
-        if orig_year and cand_year:
-            year_diff = abs(orig_year - cand_year)
-            if year_diff <= 5:
-                score += (6 - year_diff) * 2  # Max 10 points
-    except:
-        pass
+    if original_movie.year and candidate_movie.year:
+        year_diff = abs(original_movie.year - candidate_movie.year)
+        if year_diff <= 5:
+            score += (6 - year_diff) * 2  # Max 10 points
     
     # Rating bonus (10 points) - higher rated movies get bonus
-    try:
-        rating = float(candidate_movie.get('imdbRating', '0'))
-        if rating >= 8.0:
-            score += 10
-        elif rating >= 7.0:
-            score += 5
-    except:
-        pass
+    rating = candidate_movie.rating or 0
+    if rating >= 8.0:
+        score += 10
+    elif rating >= 7.0:
+        score += 5
     
     return score
 
@@ -349,17 +529,40 @@ def get_recommendations(genre):
     # This is kept for backward compatibility but will use advanced recommendations
     return []
 
-def identify_movie_from_description(description):
-    """Use OpenRouter AI to identify movie from plot/description"""
-    if not OPENROUTER_AVAILABLE:
+def identify_movie_from_description(description, chat_state=None):
+    """Use OpenRouter AI to identify movie from plot/description.
+
+    chat_state (a chat_sessions.ChatState) adds a compact summary of the
+    conversation so far, so follow-up answers refine earlier candidates.
+    Opening messages don't depend on any conversation, so their AI answers
+    are cached by model and normalized description.
+    """
+    if openrouter_available() and not (chat_state and chat_state.turns):
+        return cache.get_cache().get_or_compute(
+            'identify', [current_app.config['OPENROUTER_MODEL'], title_resolver.normalize_query(description)],
+            lambda: identify_movie_uncached(description),
+            current_app.config['CACHE_TTL_IDENTIFY'],
+            cache_if=lambda result: bool(result) and result.get('source', '').startswith('ai')
+        )
+    return identify_movie_uncached(description, chat_state)
+
+def identify_movie_uncached(description, chat_state=None):
+    """Ask OpenRouter (or the keyword fallback) directly"""
+    # Keyword matching sees everything the user said, not just this message
+    fallback_description = f"{chat_state.user_text()} {description}" if chat_state else description
+    context = chat_sessions.format_context(chat_state)
+    if context:
+        context = f"\n{context}\n"
+    
+    if not openrouter_available():
         # Fallback: Try to identify from keywords
-        return identify_movie_fallback(description)
+        return identify_movie_fallback(fallback_description)
     
     try:
         prompt = f"""You are a professional movie identification assistant. A user is describing a movie they remember but can't recall the title. 
 
 User's description: "{description}"
-
+{context}
 Based on this description, identify the most likely movie title(s). Consider:
 - Plot elements, storylines, themes
 - Character names, actor names mentioned
@@ -391,8 +594,8 @@ Examples:
 Now analyze the description and respond with ONLY the JSON object, no additional text:"""
 
         # Call OpenRouter API
-        api_key = app.config['OPENROUTER_API_KEY']
-        model = app.config.get('OPENROUTER_MODEL', 'openai/gpt-3.5-turbo')
+        api_key = current_app.config['OPENROUTER_API_KEY']
+        model = current_app.config.get('OPENROUTER_MODEL', 'openai/gpt-3.5-turbo')
         
         headers = {
             "Authorization": f"Bearer {api_key}",
@@ -417,8 +620,8 @@ Now analyze the description and respond with ONLY the JSON object, no additional
             "max_tokens": 500
         }
         
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
+        response = get_http_session().post(
+            current_app.config['OPENROUTER_API_URL'],
             headers=headers,
             json=payload,
             timeout=30
@@ -426,7 +629,7 @@ Now analyze the description and respond with ONLY the JSON object, no additional
         
         if response.status_code != 200:
             print(f"OpenRouter API error: {response.status_code} - {response.text}")
-            return identify_movie_fallback(description)
+            return identify_movie_fallback(fallback_description)
         
         response_data = response.json()
         response_text = response_data['choices'][0]['message']['content'].strip()
@@ -436,10 +639,14 @@ Now analyze the description and respond with ONLY the JSON object, no additional
         response_text = re.sub(r'```\s*', '', response_text)
         response_text = response_text.strip()
         
+        # Token usage is reported alongside the answer (used by director_bench.py)
+        usage = response_data.get('usage') or {}
+        
         # Try to extract JSON object (handle nested braces)
         try:
             # First, try parsing the entire response
             result = json.loads(response_text)
+            result.update(source='ai', usage=usage)
             return result
         except json.JSONDecodeError:
             # Try to find JSON object boundaries
@@ -448,6 +655,7 @@ Now analyze the description and respond with ONLY the JSON object, no additional
             if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
                 json_str = response_text[start_idx:end_idx+1]
                 result = json.loads(json_str)
+                result.update(source='ai_extracted', usage=usage)
                 return result
             else:
                 raise
@@ -468,18 +676,20 @@ Now analyze the description and respond with ONLY the JSON object, no additional
                 "movie_titles": movie_titles[:3],
                 "confidence": "medium",
                 "needs_clarification": False,
-                "clarifying_question": ""
+                "clarifying_question": "",
+                "source": "ai_text",
+                "usage": usage
             }
         
         # Use fallback
-        return identify_movie_fallback(description)
+        return identify_movie_fallback(fallback_description)
         
     except Exception as e:
         print(f"OpenRouter AI error: {e}")
         import traceback
         traceback.print_exc()
         # Try fallback identification
-        return identify_movie_fallback(description)
+        return identify_movie_fallback(fallback_description)
 
 def identify_movie_fallback(description):
     """Fallback movie identification using keyword matching"""
@@ -493,7 +703,8 @@ def identify_movie_fallback(description):
             "movie_titles": ["Titanic"],
             "confidence": "high",
             "needs_clarification": False,
-            "clarifying_question": ""
+            "clarifying_question": "",
+            "source": "fallback"
         }
     
     # KALKI 2898 AD
@@ -503,7 +714,8 @@ def identify_movie_fallback(description):
             "movie_titles": ["KALKI 2898 AD"],
             "confidence": "high",
             "needs_clarification": False,
-            "clarifying_question": ""
+            "clarifying_question": "",
+            "source": "fallback"
         }
     
     # Inception
@@ -513,7 +725,8 @@ def identify_movie_fallback(description):
             "movie_titles": ["Inception"],
             "confidence": "high",
             "needs_clarification": False,
-            "clarifying_question": ""
+            "clarifying_question": "",
+            "source": "fallback"
         }
     
     # Avatar
@@ -522,7 +735,8 @@ def identify_movie_fallback(description):
             "movie_titles": ["Avatar"],
             "confidence": "high",
             "needs_clarification": False,
-            "clarifying_question": ""
+            "clarifying_question": "",
+            "source": "fallback"
         }
     
     # The Matrix
@@ -532,7 +746,8 @@ def identify_movie_fallback(description):
             "movie_titles": ["The Matrix"],
             "confidence": "high",
             "needs_clarification": False,
-            "clarifying_question": ""
+            "clarifying_question": "",
+            "source": "fallback"
         }
     
     # Interstellar
@@ -542,18 +757,19 @@ def identify_movie_fallback(description):
             "movie_titles": ["Interstellar"],
             "confidence": "high",
             "needs_clarification": False,
-            "clarifying_question": ""
+            "clarifying_question": "",
+            "source": "fallback"
         }
     
     # Return None if no match found
     return None
 
 # Routes
-@app.route('/')
+@bp.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         username = request.form.get('username', '').strip()
@@ -578,27 +794,29 @@ def register():
             flash('❌ Username can only contain letters, numbers, underscores, and hyphens.')
             return render_template('register.html')
         
-        conn = get_db_connection()
+        if not password_hasher.allow_auth_attempt(request.remote_addr):
+            flash('❌ Too many attempts. Please wait a minute and try again.')
+            return render_template('register.html'), 429
+        
+        # Hash the password in the hashing pool, off the request thread
         try:
-            # Hash the password
-            hashed_password = generate_password_hash(password)
-            conn.execute(
-                'INSERT INTO users (username, password) VALUES (?, ?)',
-                (username, hashed_password)
-            )
-            conn.commit()
+            hashed_password = password_hasher.get_password_hasher().hash(password)
+        except HashingBusy:
+            flash('⏳ The server is busy right now. Please try again in a moment.')
+            return render_template('register.html'), 503
+        
+        try:
+            repository.get_repository().create_user(username, hashed_password)
             flash('🎉 Registration successful! Please login.')
-            return redirect(url_for('login'))
-        except sqlite3.IntegrityError:
+            return redirect(url_for('.login'))
+        except UsernameTaken:
             flash('❌ Username already exists! Please choose another.')
         except Exception as e:
             flash(f'❌ An error occurred: {str(e)}')
-        finally:
-            conn.close()
     
     return render_template('register.html')
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form.get('username', '').strip()
@@ -608,37 +826,41 @@ def login():
             flash('❌ Please enter both username and password.')
             return render_template('login.html')
         
-        conn = get_db_connection()
-        user = conn.execute(
-            'SELECT * FROM users WHERE username = ?',
-            (username,)
-        ).fetchone()
-        conn.close()
+        # Throttle before any hashing so a burst can't monopolize the hashing pool
+        if not password_hasher.allow_auth_attempt(request.remote_addr, username):
+            flash('❌ Too many login attempts. Please wait a minute and try again.')
+            return render_template('login.html'), 429
+        
+        hasher = password_hasher.get_password_hasher()
+        user = repository.get_repository().find_user(username)
         
         if user:
             # Check if password is hashed (new format) or plaintext (old format for migration)
             if user['password'].startswith('pbkdf2:') or user['password'].startswith('scrypt:') or user['password'].startswith('$2b$'):
                 # Hashed password
-                if check_password_hash(user['password'], password):
+                try:
+                    password_ok = hasher.verify(user['password'], password)
+                except HashingBusy:
+                    flash('⏳ The server is busy right now. Please try again in a moment.')
+                    return render_template('login.html'), 503
+                if password_ok:
                     session['user_id'] = user['id']
                     session['username'] = user['username']
                     # Initialize save_history if not set (default to True)
                     if 'save_history' not in session:
                         session['save_history'] = True
                     flash('✅ Login successful!')
-                    return redirect(url_for('main'))
+                    return redirect(url_for('.main'))
             else:
                 # Plaintext password (legacy) - check directly and upgrade if correct
                 if user['password'] == password:
-                    # Upgrade to hashed password
-                    conn = get_db_connection()
-                    hashed = generate_password_hash(password)
-                    conn.execute(
-                        'UPDATE users SET password = ? WHERE id = ?',
-                        (hashed, user['id'])
-                    )
-                    conn.commit()
-                    conn.close()
+                    # Upgrade to hashed password (skipped under load; retried on the next login)
+                    try:
+                        hashed = hasher.hash(password)
+                    except HashingBusy:
+                        hashed = None
+                    if hashed:
+                        repository.get_repository().update_password(user['id'], hashed)
                     
                     session['user_id'] = user['id']
                     session['username'] = user['username']
@@ -646,19 +868,19 @@ def login():
                     if 'save_history' not in session:
                         session['save_history'] = True
                     flash('✅ Login successful!')
-                    return redirect(url_for('main'))
+                    return redirect(url_for('.main'))
         
         flash('❌ Invalid username or password!')
     
     return render_template('login.html')
 
-@app.route('/main')
+@bp.route('/main')
 def main():
     if 'user_id' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
     return render_template('main.html')
 
-@app.route('/search')
+@bp.route('/search')
 def search_movie():
     if 'user_id' not in session:
         return jsonify({'error': 'Not logged in'}), 401
@@ -667,65 +889,237 @@ def search_movie():
     if not movie_title:
         return jsonify({'error': 'No movie title provided'}), 400
     
-    # Save search history only if history is enabled
-    if session.get('save_history', True):  # Default to True
-        conn = get_db_connection()
-        conn.execute(
-            'INSERT INTO search_history (user_id, movie_title) VALUES (?, ?)',
-            (session['user_id'], movie_title)
-        )
-        conn.commit()
-        conn.close()
-    
     # Search OMDB API for real movie data
-    movie_data = search_omdb_api(movie_title)
+    record = fetch_movie_record(movie_title)
+    
+    # Save search history only if history is enabled (background revalidation
+    # of a result the browser already has cached is not a new search)
+    if not request.args.get('revalidate'):
+        if session.get('save_history', True):  # Default to True
+            record_search(session['user_id'], movie_title, record.imdb_id if record else None)
+        if record:
+            # Anonymous per-movie count, kept whether or not the user saves history
+            trending.record_search(record.imdb_id, record.title)
     
-    if movie_data:
-        # Get advanced personalized recommendations (first page)
-        recommendations, has_more = get_advanced_recommendations(movie_data, page=1)
+    if record:
+        movie_data = record.to_api_dict()
+        
+        # Recommendations cost up to ~20 more OMDB calls: start them in the
+        # background now and let the client collect them from /search/recommendations
+        start_recommendations(record)
         
         # Check if movie is in favorites
-        is_favorite = False
-        if 'user_id' in session:
-            conn = get_db_connection()
-            favorite = conn.execute(
-                'SELECT id FROM favorites WHERE user_id = ? AND movie_id = ?',
-                (session['user_id'], movie_data.get('imdb_id', ''))
-            ).fetchone()
-            conn.close()
-            is_favorite = favorite is not None
-            movie_data['is_favorite'] = is_favorite
+        movie_data['is_favorite'] = repository.get_repository().is_favorite(
+            session['user_id'], movie_data.get('imdb_id', '')
+        )
         
         return jsonify({
             'movie': movie_data,
-            'recommendations': recommendations,
-            'has_more_recommendations': has_more,
-            'recommendation_page': 1
+            'recommendations': [],
+            'has_more_recommendations': False,
+            'recommendation_page': 1,
+            'recommendations_pending': True
         })
     else:
         return jsonify({
             'error': f'Movie "{movie_title}" not found. Try another title.'
         }), 404
 
-@app.route('/history')
+def record_search(user_id, movie_title, movie_id=None):
+    """Append to the user's history and flag their feed for refresh"""
+    repository.get_repository().add_search(user_id, movie_title, movie_id)
+    conn = get_db_connection()
+    try:
+        for_you.mark_stale(conn, user_id)
+        conn.commit()
+    finally:
+        conn.close()
+    for_you.schedule_refresh(user_id)
+
+def start_recommendations(record):
+    """First recommendations page for a movie, computed once per worker in the background"""
+    return background_tasks.get_task_registry().submit(
+        ('recommendations', record.imdb_id), get_advanced_recommendations, record, page=1
+    )
+
+@bp.route('/search/recommendations')
+def search_recommendations():
+    """Second half of /search: the recommendations it started in the background"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    imdb_id = request.args.get('imdb_id', '')
+    if not posters.is_valid_imdb_id(imdb_id):
+        return jsonify({'error': 'Invalid movie id'}), 400
+    
+    future = background_tasks.get_task_registry().get(('recommendations', imdb_id))
+    if future is None:
+        # The search ran on another worker, or long enough ago to have expired
+        record = fetch_movie_by_id(imdb_id)
+        if record is None:
+            return jsonify({'error': 'Movie not found'}), 404
+        future = start_recommendations(record)
+    
+    try:
+        recommendations, has_more = future.result(timeout=current_app.config['RECOMMENDATIONS_TIMEOUT'])
+    except FutureTimeoutError:
+        return jsonify({'error': 'Recommendations are taking too long'}), 504
+    except Exception as e:
+        # The search itself succeeded; show it without recommendations rather than fail
+        print(f"Recommendations error for {imdb_id}: {e}")
+        recommendations, has_more = [], False
+    
+    return jsonify({
+        'recommendations': recommendations,
+        'has_more_recommendations': has_more,
+        'recommendation_page': 1
+    })
+
+@bp.route('/suggest')
+def suggest_titles():
+    """Title autocomplete served from the local catalog snapshot (no OMDB calls)"""
+    prefix = request.args.get('q', '').strip()
+    catalog = catalog_snapshot.get_catalog()
+    if not prefix or catalog is None:
+        return jsonify({'suggestions': []})
+    
+    return jsonify({
+        'suggestions': [
+            {'title': movie['Title'], 'year': movie['Year'], 'imdb_id': movie['imdbID']}
+            for movie in catalog.prefix_search(prefix, limit=8)
+        ]
+    })
+
+@bp.route('/discover')
+def discover_movies():
+    """Browse the local movie index by genre, language, person and rating/year/runtime range (no OMDB calls).
+
+    Repeat genre/language to require several; sort is rating (default),
+    year, runtime, votes or title, and pages are keyset-paginated.
+    """
+    try:
+        filters = movie_index.parse_filters(request.args)
+        conn = get_db_connection()
+        try:
+            rows, next_cursor = movie_index.discover(conn, filters, request.args.get('cursor'), get_page_limit())
+        finally:
+            conn.close()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'items': [
+            {
+                'title': row['title'],
+                'poster': posters.poster_url(row['imdb_id'], 'thumb'),
+                'year': row['year'],
+                'rating': row['rating'],
+                'runtime': row['runtime'],
+                'votes': row['votes'],
+                'box_office': row['box_office'],
+                'genre': row['genre'] or 'N/A',
+                'imdb_id': row['imdb_id']
+            }
+            for row in rows
+        ],
+        'next_cursor': next_cursor
+    })
+
+@bp.route('/trending')
+def trending_movies():
+    """Most searched movies lately, from this worker's in-memory counts (no OMDB calls)"""
+    limit = get_page_limit(default=10, maximum=current_app.config['TRENDING_SIZE'])
+    return jsonify({
+        'items': [
+            {
+                'title': title,
+                'poster': posters.poster_url(imdb_id, 'thumb'),
+                'imdb_id': imdb_id,
+                'score': score
+            }
+            for imdb_id, title, score in trending.get_trending().top(limit)
+        ]
+    })
+
+@bp.route('/for_you')
+def for_you_feed():
+    """Precomputed personalized feed; refreshed in the background, never on this request"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    conn = get_db_connection()
+    try:
+        rows = for_you.fetch_feed(conn, session['user_id'], get_page_limit(default=12, maximum=current_app.config['FOR_YOU_SIZE']))
+    finally:
+        conn.close()
+    
+    return jsonify({
+        'items': [
+            {
+                'title': row['title'],
+                'year': row['year'] or 'N/A',
+                'genre': row['genre'] or 'N/A',
+                'rating': f"{row['rating'] or 'N/A'}/10",
+                'reason': row['reason'],
+                'imdb_id': row['imdb_id'],
+                'poster': posters.poster_url(row['imdb_id'], 'thumb')
+            }
+            for row in rows
+        ]
+    })
+
+@bp.route('/history')
 def search_history():
     if 'user_id' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
     
     # Initialize save_history in session if not set (default to True)
     if 'save_history' not in session:
         session['save_history'] = True
     
-    conn = get_db_connection()
-    history = conn.execute(
-        'SELECT movie_title, search_date FROM search_history WHERE user_id = ? ORDER BY search_date DESC LIMIT 20',
-        (session['user_id'],)
-    ).fetchall()
-    conn.close()
+    # Rows are loaded page by page from /api/history
+    return render_template('history.html', save_history_enabled=session.get('save_history', True))
+
+@bp.route('/api/history')
+def api_history():
+    """Keyset-paginated search history, newest first, with movie metadata where indexed"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    try:
+        rows, next_cursor = repository.get_repository().history_page(
+            session['user_id'], request.args.get('cursor'), get_page_limit()
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    return render_template('history.html', history=history, save_history_enabled=session.get('save_history', True))
+    return jsonify({
+        'items': enriched_items(session['user_id'], rows, ('id', 'search_date', 'movie_title', 'movie_id')),
+        'next_cursor': next_cursor
+    })
+
+def enriched_items(user_id, rows, fields):
+    """Page rows as JSON with a 'movie' object from the movie index (None until indexed).
+
+    Whatever the page could not enrich is queued for the background
+    backfill; nothing is fetched from OMDB while the page is served.
+    """
+    items = []
+    missing_ids = []
+    unlinked_titles = []
+    for row in rows:
+        item = {field: row[field] for field in fields}
+        item['movie'] = movie_index.metadata_dict(row['movie_id'], row) if row['movie_id'] else None
+        if item['movie'] is None:
+            if row['movie_id']:
+                missing_ids.append(row['movie_id'])
+            else:
+                unlinked_titles.append((user_id, row['movie_title']))
+        items.append(item)
+    movie_index.schedule_backfill(missing_ids, unlinked_titles)
+    return items
 
-@app.route('/toggle_history', methods=['POST'])
+@bp.route('/toggle_history', methods=['POST'])
 def toggle_history():
     """Toggle search history saving on/off"""
     if 'user_id' not in session:
@@ -742,7 +1136,7 @@ def toggle_history():
         'message': f'Search history saving is now {"ON" if enable else "OFF"}'
     })
 
-@app.route('/get_recommendations', methods=['POST'])
+@bp.route('/get_recommendations', methods=['POST'])
 def get_recommendations_route():
     """Get next page of personalized recommendations"""
     if 'user_id' not in session:
@@ -771,21 +1165,33 @@ def get_recommendations_route():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/favorites')
+@bp.route('/favorites')
 def favorites():
     if 'user_id' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
     
-    conn = get_db_connection()
-    favorites_list = conn.execute(
-        'SELECT id, movie_id, movie_title, added_date FROM favorites WHERE user_id = ? ORDER BY added_date DESC',
-        (session['user_id'],)
-    ).fetchall()
-    conn.close()
+    # Cards are loaded page by page from /api/favorites
+    return render_template('favorites.html')
+
+@bp.route('/api/favorites')
+def api_favorites():
+    """Keyset-paginated favorites, most recently added first, with movie metadata where indexed"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    try:
+        rows, next_cursor = repository.get_repository().favorites_page(
+            session['user_id'], request.args.get('cursor'), get_page_limit()
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    return render_template('favorites.html', favorites=favorites_list)
+    return jsonify({
+        'items': enriched_items(session['user_id'], rows, ('id', 'added_date', 'movie_id', 'movie_title')),
+        'next_cursor': next_cursor
+    })
 
-@app.route('/add_favorite', methods=['POST'])
+@bp.route('/add_favorite', methods=['POST'])
 def add_favorite():
     if 'user_id' not in session:
         return jsonify({'error': 'Not logged in'}), 401
@@ -797,29 +1203,67 @@ def add_favorite():
     if not movie_id or not movie_title:
         return jsonify({'error': 'Missing movie data'}), 400
     
-    conn = get_db_connection()
     try:
-        # Check if already favorited
-        existing = conn.execute(
-            'SELECT id FROM favorites WHERE user_id = ? AND movie_id = ?',
-            (session['user_id'], movie_id)
-        ).fetchone()
-        
-        if existing:
+        if not repository.get_repository().add_favorite(session['user_id'], movie_id, movie_title):
             return jsonify({'message': 'Movie already in favorites'}), 200
         
-        conn.execute(
-            'INSERT INTO favorites (user_id, movie_id, movie_title) VALUES (?, ?, ?)',
-            (session['user_id'], movie_id, movie_title)
-        )
-        conn.commit()
+        conn = get_db_connection()
+        try:
+            for_you.mark_stale(conn, session['user_id'])
+            conn.commit()
+        finally:
+            conn.close()
+        for_you.schedule_refresh(session['user_id'])
         return jsonify({'message': 'Added to favorites'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+@bp.route('/import_watchlist', methods=['POST'])
+def import_watchlist():
+    """Start a bulk import of a CSV list export into favorites; poll the returned job_id"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    if request.content_length and request.content_length > current_app.config['IMPORT_MAX_BYTES']:
+        return jsonify({'error': 'File is too large'}), 413
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+    
+    try:
+        entries, duplicates = watchlist_import.parse_watchlist(stream, current_app.config['IMPORT_MAX_TITLES'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not entries:
+        return jsonify({'error': 'No titles found in the file'}), 400
+    
+    conn = get_db_connection()
+    try:
+        if watchlist_import.has_active_job(conn, session['user_id']):
+            return jsonify({'error': 'An import is already running'}), 409
+        job_id = watchlist_import.get_importer().start(
+            conn, session['user_id'], entries, duplicates, search_omdb_title, fetch_movie_by_id
+        )
+    finally:
+        conn.close()
+    
+    return jsonify({'job_id': job_id, 'total': len(entries), 'duplicates': duplicates}), 202
+
+@bp.route('/import_watchlist/<job_id>')
+def import_watchlist_status(job_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    conn = get_db_connection()
+    try:
+        status = watchlist_import.job_status(conn, job_id, session['user_id'])
     finally:
         conn.close()
+    
+    if status is None:
+        return jsonify({'error': 'Import not found'}), 404
+    return jsonify(status)
 
-@app.route('/remove_favorite', methods=['POST'])
+@bp.route('/remove_favorite', methods=['POST'])
 def remove_favorite():
     if 'user_id' not in session:
         return jsonify({'error': 'Not logged in'}), 401
@@ -831,46 +1275,88 @@ def remove_favorite():
     if not favorite_id and not movie_id:
         return jsonify({'error': 'Missing favorite data'}), 400
     
-    conn = get_db_connection()
     try:
-        if favorite_id:
-            conn.execute(
-                'DELETE FROM favorites WHERE id = ? AND user_id = ?',
-                (favorite_id, session['user_id'])
-            )
-        else:
-            conn.execute(
-                'DELETE FROM favorites WHERE movie_id = ? AND user_id = ?',
-                (movie_id, session['user_id'])
-            )
-        conn.commit()
+        repository.get_repository().remove_favorite(session['user_id'], favorite_id, movie_id)
+        # Profiles only accumulate, so a removal means refolding from scratch
+        conn = get_db_connection()
+        try:
+            for_you.mark_stale(conn, session['user_id'], rebuild=True)
+            conn.commit()
+        finally:
+            conn.close()
+        for_you.schedule_refresh(session['user_id'])
         return jsonify({'message': 'Removed from favorites'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        conn.close()
 
-@app.route('/check_favorite/<movie_id>')
+@bp.route('/check_favorite/<movie_id>')
 def check_favorite(movie_id):
     if 'user_id' not in session:
         return jsonify({'is_favorite': False})
     
+    return jsonify({'is_favorite': repository.get_repository().is_favorite(session['user_id'], movie_id)})
+
+@bp.route('/poster/<imdb_id>')
+def poster(imdb_id):
+    """Serve a cached, resized poster; unknown or missing posters get a local placeholder"""
+    size = request.args.get('size', posters.DEFAULT_SIZE)
+    if size not in posters.POSTER_SIZES:
+        size = posters.DEFAULT_SIZE
+    
+    cached = None
+    if posters.is_valid_imdb_id(imdb_id):
+        cached = posters.load_poster(imdb_id, size, resolve_source=lambda: lookup_poster_source(imdb_id))
+    
+    if cached:
+        path, content_type = cached
+        response = send_file(path, mimetype=content_type, conditional=True)
+    else:
+        response = Response(posters.placeholder_svg(size), mimetype='image/svg+xml')
+    response.cache_control.no_cache = None
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config['POSTER_MAX_AGE']
+    return response
+
+def lookup_poster_source(imdb_id):
+    """Poster URL from the movie index, or from OMDB for a movie we have not seen yet.
+
+    /poster is public, so ids OMDB has no poster for (unknown, or "N/A")
+    are remembered for POSTER_MISSING_TTL; cycling through them can't turn
+    every request into an OMDB call. Failed lookups are not remembered.
+    """
     conn = get_db_connection()
-    favorite = conn.execute(
-        'SELECT id FROM favorites WHERE user_id = ? AND movie_id = ?',
-        (session['user_id'], movie_id)
-    ).fetchone()
-    conn.close()
+    try:
+        row = conn.execute('SELECT poster FROM movies WHERE imdb_id = ?', (imdb_id,)).fetchone()
+    finally:
+        conn.close()
+    if row and row['poster']:
+        return row['poster']
+    
+    def fetch_source():
+        try:
+            data = omdb_get(i=imdb_id)
+        except Exception as e:
+            print(f"OMDB poster lookup error: {e}")
+            return None
+        if data.get('Response') == 'True':
+            poster = data.get('Poster')
+            return poster if poster and poster != 'N/A' else ''
+        # An unknown id is a miss to remember; an invalid key or exhausted quota is not
+        error = (data.get('Error') or '').lower()
+        return '' if 'not found' in error or 'incorrect imdb id' in error else None
     
-    return jsonify({'is_favorite': favorite is not None})
+    return cache.get_cache().get_or_compute(
+        'poster_missing', imdb_id, fetch_source, current_app.config['POSTER_MISSING_TTL'],
+        cache_if=lambda source: source == ''
+    ) or None
 
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
     session.clear()
     flash('👋 You have been logged out.')
-    return redirect(url_for('index'))
+    return redirect(url_for('.index'))
 
-@app.route('/director_chat', methods=['POST'])
+@bp.route('/director_chat', methods=['POST'])
 def director_chat():
     """DIRECTOR AI Chatbot endpoint"""
     if 'user_id' not in session:
@@ -881,21 +1367,42 @@ def director_chat():
     
     data = request.get_json()
     user_message = data.get('message', '').strip()
-    conversation_history = data.get('history', [])
     
     if not user_message:
         return jsonify({'error': 'No message provided'}), 400
     
+    # Conversation state lives server-side; the client only sends its chat_id
+    ttl = current_app.config['CHAT_SESSION_TTL']
+    conn = get_db_connection()
     try:
-        # Identify movie from description
-        identification = identify_movie_from_description(user_message)
+        chat_state = (chat_sessions.load_session(conn, data.get('chat_id'), session['user_id'], ttl)
+                      or chat_sessions.create_session(conn, session['user_id'], ttl))
+    finally:
+        conn.close()
+    
+    def reply(payload, candidates=None):
+        """Record this exchange in the chat session and answer with its chat_id"""
+        conn = get_db_connection()
+        try:
+            chat_sessions.record_turn(
+                conn, chat_state, user_message, payload['message'], candidates,
+                current_app.config['CHAT_WINDOW_MESSAGES'], current_app.config['CHAT_SUMMARY_CHARS']
+            )
+        finally:
+            conn.close()
+        payload['chat_id'] = chat_state.id
+        return jsonify(payload)
+    
+    try:
+        # Identify movie from description, in the context of the conversation so far
+        identification = identify_movie_from_description(user_message, chat_state)
         
         if not identification:
             fallback_msg = ""
-            if not OPENROUTER_AVAILABLE:
+            if not openrouter_available():
                 fallback_msg = " (Using basic keyword matching - configure OPENROUTER_API_KEY for better results)"
             
-            return jsonify({
+            return reply({
                 'type': 'text',
                 'message': f"I'm having trouble identifying that movie based on the description. Could you provide more details? For example: What genre is it? What year was it released? Any specific actors or scenes you remember?{fallback_msg}",
                 'suggestions': []
@@ -907,11 +1414,11 @@ def director_chat():
         clarifying_question = identification.get('clarifying_question', '')
         
         if needs_clarification:
-            return jsonify({
+            return reply({
                 'type': 'text',
                 'message': clarifying_question or "Could you provide more details to help me identify the movie?",
                 'suggestions': []
-            })
+            }, movie_titles)
         
         # Try to find movies using OMDB
         found_movies = []
@@ -921,15 +1428,9 @@ def director_chat():
             movie_data = search_omdb_api(title)
             if movie_data:
                 # Check if already in favorites
-                is_favorite = False
-                conn = get_db_connection()
-                favorite = conn.execute(
-                    'SELECT id FROM favorites WHERE user_id = ? AND movie_id = ?',
-                    (session['user_id'], movie_data.get('imdb_id', ''))
-                ).fetchone()
-                conn.close()
-                is_favorite = favorite is not None
-                movie_data['is_favorite'] = is_favorite
+                movie_data['is_favorite'] = repository.get_repository().is_favorite(
+                    session['user_id'], movie_data.get('imdb_id', '')
+                )
                 found_movies.append(movie_data)
             else:
                 not_found_titles.append(title)
@@ -942,47 +1443,43 @@ def director_chat():
                 
                 # Save to search history only if history is enabled
                 if session.get('save_history', True):  # Default to True
-                    conn = get_db_connection()
-                    conn.execute(
-                        'INSERT INTO search_history (user_id, movie_title) VALUES (?, ?)',
-                        (session['user_id'], movie['title'])
-                    )
-                    conn.commit()
-                    conn.close()
+                    record_search(session['user_id'], movie['title'], movie.get('imdb_id'))
+                trending.record_search(movie.get('imdb_id'), movie['title'])
                 
-                return jsonify({
+                return reply({
                     'type': 'movie_found',
                     'message': f"🎬 I believe you're looking for **{movie['title']}**! Here are the details:",
                     'movie': movie,
                     'confidence': confidence
-                })
+                }, [movie['title']])
             else:
                 # Multiple matches found
-                return jsonify({
+                return reply({
                     'type': 'multiple_movies',
                     'message': f"I found {len(found_movies)} possible matches based on your description. Here they are:",
                     'movies': found_movies,
                     'confidence': confidence
-                })
+                }, [m['title'] for m in found_movies])
         else:
             # Movies not found in OMDB but we have titles
             suggestions = [{'title': title, 'action': 'search'} for title in movie_titles]
-            return jsonify({
+            return reply({
                 'type': 'suggestions',
                 'message': f"Based on your description, you might be looking for one of these movies: {', '.join(movie_titles)}. However, I couldn't find detailed information in our database. Would you like to search for one of these titles?",
                 'suggestions': suggestions,
                 'confidence': confidence
-            })
+            }, movie_titles)
             
     except Exception as e:
         print(f"DIRECTOR chat error: {e}")
         return jsonify({
             'type': 'error',
             'message': "I encountered an error processing your request. Please try rephrasing your description or provide more details about the movie.",
-            'suggestions': []
+            'suggestions': [],
+            'chat_id': chat_state.id
         }), 500
 
-@app.route('/test-api')
+@bp.route('/test-api')
 def test_api():
     """Test route to check if OMDB API is working"""
     test_movie = search_omdb_api("Avatar")
@@ -997,11 +1494,41 @@ def test_api():
             'error': 'Make sure you have a valid OMDB API key in your .env file'
         })
 
+@bp.route('/admin/db_stats')
+def admin_db_stats():
+    """Per-statement SQLite timings of every worker, plus the latest slow queries"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    if session.get('username') not in current_app.config['ADMIN_USERNAMES']:
+        return jsonify({'error': 'Forbidden'}), 403
+    collector = db_stats.get_collector()
+    if collector is None:
+        return jsonify({'error': 'Statement statistics are disabled (DB_STATS)'}), 404
+    
+    sort = request.args.get('sort', 'total_ms')
+    if sort not in db_stats.SORT_KEYS:
+        return jsonify({'error': f"sort must be one of {', '.join(db_stats.SORT_KEYS)}"}), 400
+    limit = get_page_limit(default=50, maximum=500)
+    return jsonify({
+        'slow_query_ms': collector.slow_ms,
+        'statements': collector.report(sort, limit),
+        'slow_queries': db_stats.read_slow_log(collector.slow_log, limit)
+    })
+
+@bp.route('/health')
+def health():
+    """Liveness probe with this worker's startup timings"""
+    return jsonify({
+        'status': 'ok',
+        'pid': os.getpid(),
+        'startup': current_app.extensions.get('startup_timings')
+    })
+
 if __name__ == '__main__':
-    init_db()
+    app = create_app()
     print("🚀 Starting CineScope with OMDB API...")
     print("📝 Visit http://localhost:5000 to use the app")
     print("🔍 Test API: http://localhost:5000/test-api")
-    print("🤖 OpenRouter AI: " + ("✅ Configured" if OPENROUTER_AVAILABLE else "⚠️  Not configured"))
+    print("🤖 OpenRouter AI: " + ("✅ Configured" if app.config['OPENROUTER_AVAILABLE'] else "⚠️  Not configured"))
     # Set debug=False for production deployment
     app.run(debug=False, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,278 @@
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+
+from flask import current_app, request, send_from_directory
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MANIFEST_NAME = 'manifest.json'
+
+# Quoted strings are copied through untouched so data URIs and content values survive minification
+CSS_STRING_RE = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')')
+CSS_COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+
+
+def minify_css(source):
+    """Strip comments and redundant whitespace from a stylesheet"""
+    parts = CSS_STRING_RE.split(CSS_COMMENT_RE.sub('', source))
+    for i in range(0, len(parts), 2):
+        chunk = re.sub(r'\s+', ' ', parts[i])
+        chunk = re.sub(r'\s*([{};,>])\s*', r'\1', chunk)
+        parts[i] = chunk.replace(';}', '}')
+    return ''.join(parts).strip()
+
+
+# What can precede a regex literal; after anything else a slash is division
+JS_REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+JS_REGEX_KEYWORDS = {'return', 'typeof', 'case', 'in', 'of', 'delete', 'void', 'throw', 'new', 'else', 'do',
+                     'instanceof', 'yield', 'await'}
+JS_WORD_RE = re.compile(r'[\w$]+')
+
+
+def _skip_js_regex(line, i):
+    """Index just past the regex literal starting at line[i] (a '/'), flags included"""
+    in_class = False
+    i += 1
+    while i < len(line):
+        ch = line[i]
+        if ch == '\\':
+            i += 1
+        elif ch == '[':
+            in_class = True
+        elif ch == ']':
+            in_class = False
+        elif ch == '/' and not in_class:
+            match = JS_WORD_RE.match(line, i + 1)
+            return match.end() if match else i + 1
+        i += 1
+    return i
+
+
+def _scan_js_line(line, stack):
+    """Advance the lexer state over one line of JS.
+
+    stack holds what the line ends inside of: 'template' (a backtick
+    literal), '{' (a ${...} expression or a brace within one) or 'comment'
+    (a block comment). Quoted strings and regex literals end with their
+    line; a slash starts a regex wherever an expression can start.
+    """
+    quote = None
+    prev = ''  # last token outside literals; a line may start an expression
+    i = 0
+    while i < len(line):
+        ch = line[i]
+        top = stack[-1] if stack else None
+        if top == 'comment':
+            if line.startswith('*/', i):
+                stack.pop()
+                i += 1
+        elif top == 'template':
+            if ch == '\\':
+                i += 1
+            elif ch == '`':
+                stack.pop()
+                prev = '`'
+            elif line.startswith('${', i):
+                stack.append('{')
+                prev = '{'
+                i += 1
+        elif quote:
+            if ch == '\\':
+                i += 1
+            elif ch == quote:
+                quote = None
+                prev = ch
+        elif ch in '\'"':
+            quote = ch
+        elif ch == '`':
+            stack.append('template')
+        elif line.startswith('//', i):
+            break
+        elif line.startswith('/*', i):
+            stack.append('comment')
+            i += 1
+        elif ch == '/' and (not prev or prev in JS_REGEX_PRECEDERS or prev in JS_REGEX_KEYWORDS):
+            i = _skip_js_regex(line, i)
+            prev = '/'
+            continue
+        elif JS_WORD_RE.match(ch):
+            end = JS_WORD_RE.match(line, i).end()
+            prev = line[i:end]
+            i = end
+            continue
+        elif not ch.isspace():
+            if ch == '{' and top == '{':
+                stack.append('{')
+            elif ch == '}' and top == '{':
+                stack.pop()
+            prev = ch
+        i += 1
+
+
+def minify_js(source):
+    """Conservative JS minifier: drops indentation, blank lines and whole-line comments.
+
+    Line breaks are kept so automatic semicolon insertion behaves exactly as
+    in the original file. Lines inside a multi-line template literal are
+    part of a string and are copied through untouched. If the lexer ends
+    the file inside a literal or comment it has misread something, and the
+    source is returned as is.
+    """
+    lines = []
+    stack = []
+    for line in source.splitlines():
+        in_template = bool(stack) and stack[-1] == 'template'
+        _scan_js_line(line, stack)
+        if in_template:
+            lines.append(line)
+            continue
+        # Whitespace at the end of a line that opens a template literal belongs to the string
+        line = line.lstrip() if stack and stack[-1] == 'template' else line.strip()
+        if not line or line.startswith('//'):
+            continue
+        lines.append(line)
+    if stack:
+        return source
+    return '\n'.join(lines) + '\n'
+
+
+MINIFIERS = {
+    '.css': minify_css,
+    '.js': minify_js,
+}
+
+
+def build_assets(static_folder, build_dir='dist'):
+    """Minify, fingerprint and precompress every CSS/JS file under static_folder"""
+    output_root = os.path.join(static_folder, build_dir)
+    manifest = {}
+
+    for root, dirs, files in os.walk(static_folder):
+        # Never re-process our own output
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != output_root]
+        for name in sorted(files):
+            stem, ext = os.path.splitext(name)
+            if ext not in MINIFIERS:
+                continue
+
+            source_path = os.path.join(root, name)
+            logical_name = os.path.relpath(source_path, static_folder).replace(os.sep, '/')
+            with open(source_path, encoding='utf-8') as f:
+                content = MINIFIERS[ext](f.read()).encode('utf-8')
+
+            digest = hashlib.sha256(content).hexdigest()[:10]
+            hashed_name = posixpath.join(build_dir, posixpath.dirname(logical_name), f"{stem}.{digest}{ext}")
+            target = os.path.join(static_folder, *hashed_name.split('/'))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+
+            with open(target, 'wb') as f:
+                f.write(content)
+            with open(target + '.gz', 'wb') as f:
+                f.write(gzip.compress(content, compresslevel=9, mtime=0))
+            if brotli is not None:
+                with open(target + '.br', 'wb') as f:
+                    f.write(brotli.compress(content, quality=11))
+
+            manifest[logical_name] = hashed_name
+
+    os.makedirs(output_root, exist_ok=True)
+    manifest_path = os.path.join(output_root, MANIFEST_NAME)
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+    return manifest
+
+
+def load_manifest(static_folder, build_dir='dist'):
+    """Load the asset manifest; an empty manifest means assets are served as-is"""
+    try:
+        with open(os.path.join(static_folder, build_dir, MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def init_app(app):
+    """Wire fingerprinted static URLs, precompressed static serving and JSON compression into app"""
+    manifest = load_manifest(app.static_folder, app.config['ASSET_BUILD_DIR'])
+    fingerprinted = set(manifest.values())
+    app.extensions['asset_manifest'] = manifest
+
+    @app.url_defaults
+    def fingerprint_static_urls(endpoint, values):
+        # url_for('static', filename='css/style.css') -> dist/css/style.<hash>.css
+        if endpoint == 'static' and values.get('filename') in manifest:
+            values['filename'] = manifest[values['filename']]
+
+    static_view = app.view_functions['static']
+
+    def serve_static(filename):
+        if filename not in fingerprinted:
+            return static_view(filename=filename)
+
+        response = None
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if request.accept_encodings[encoding] and os.path.exists(os.path.join(app.static_folder, filename + suffix)):
+                response = send_from_directory(
+                    app.static_folder, filename + suffix,
+                    mimetype=mimetypes.guess_type(filename)[0]
+                )
+                response.headers['Content-Encoding'] = encoding
+                break
+        if response is None:
+            response = static_view(filename=filename)
+
+        # Content hash is in the name, so the file can never change under this URL
+        response.vary.add('Accept-Encoding')
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = app.config['ASSET_MAX_AGE']
+        response.cache_control.immutable = True
+        return response
+
+    app.view_functions['static'] = serve_static
+
+    @app.after_request
+    def compress_json_response(response):
+        if (response.mimetype != 'application/json'
+                or response.direct_passthrough
+                or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or not request.accept_encodings['gzip']):
+            return response
+
+        data = response.get_data()
+        if len(data) < current_app.config['COMPRESS_MIN_SIZE']:
+            return response
+
+        response.set_data(gzip.compress(data, compresslevel=current_app.config['COMPRESS_LEVEL']))
+        response.headers['Content-Encoding'] = 'gzip'
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+if __name__ == '__main__':
+    from config import Config
+
+    parser = argparse.ArgumentParser(description='CineScope static asset pipeline')
+    parser.add_argument('command', choices=['build'])
+    parser.add_argument('--static-folder', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
+    args = parser.parse_args()
+
+    built = build_assets(args.static_folder, Config.ASSET_BUILD_DIR)
+    for logical_name, hashed_name in built.items():
+        print(f"  - {logical_name} -> {hashed_name}")
+    if brotli is None:
+        print("⚠️  'brotli' package not installed. Only gzip variants were written.")
+        print("💡 Install with: pip install brotli")
+    print(f"✅ Built {len(built)} assets into {os.path.join(args.static_folder, Config.ASSET_BUILD_DIR)}")
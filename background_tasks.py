@@ -0,0 +1,131 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+import tracing
+
+
+class PerProcessExecutor:
+    """An executor built lazily in each worker process.
+
+    Pool threads and processes don't survive fork (gunicorn preload), so a
+    pool inherited from the parent is replaced on first use in the child.
+    factory() builds the pool.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._executor = None
+        self._owner_pid = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._executor is None or self._owner_pid != os.getpid():
+                self._executor = self.factory()
+                self._owner_pid = os.getpid()
+            return self._executor
+
+    def discard(self, executor):
+        """Drop a pool that stopped working (e.g. a dead worker process); the next get() builds a new one"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._owner_pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def _failed(future):
+    # A failed task is never reused, so the next request makes a fresh attempt
+    return future.done() and future.exception() is not None
+
+
+class TaskRegistry:
+    """Keyed background work shared by the requests of one worker process.
+
+    A request starts a task under a key (e.g. an IMDb id) and returns at
+    once; a follow-up request collects the result by the same key.
+    Submitting a key that is already running or recently finished reuses
+    that task (unless it failed), so concurrent searches for one movie do
+    the work once.
+    Finished results are kept for ttl seconds. Long unkeyed jobs (spawn)
+    run on a separate pool of job_workers threads, so an import can't hold
+    up the short tasks requests are waiting on.
+    """
+
+    def __init__(self, app, workers=4, ttl=120, job_workers=2):
+        self.app = app
+        self.workers = workers
+        self.job_workers = job_workers
+        self.ttl = ttl
+        self._tasks = {}
+        self._pool = PerProcessExecutor(
+            lambda: ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='background')
+        )
+        self._job_pool = PerProcessExecutor(
+            lambda: ThreadPoolExecutor(max_workers=self.job_workers, thread_name_prefix='background-job')
+        )
+        self._owner_pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._owner_pid != os.getpid():
+            # Tasks started in the parent before a fork never finish here
+            self._tasks = {}
+            self._owner_pid = os.getpid()
+        return self._pool.get()
+
+    def _run(self, fn, args, kwargs, trace_parent):
+        # A task outlives the request that started it, so it is traced as its own local root
+        with self.app.app_context(), tracing.root_span(f"task {fn.__name__}", trace_parent, kind='internal'):
+            return fn(*args, **kwargs)
+
+    def _expire(self, now):
+        for key in [k for k, (future, started) in self._tasks.items() if future.done() and started < now - self.ttl]:
+            del self._tasks[key]
+
+    def submit(self, key, fn, *args, **kwargs):
+        """Start fn(*args, **kwargs) under key unless a live task already has it; returns the future"""
+        now = time.monotonic()
+        with self._lock:
+            executor = self._get_executor()
+            self._expire(now)
+            task = self._tasks.get(key)
+            if task is not None and not _failed(task[0]):
+                return task[0]
+            future = executor.submit(self._run, fn, args, kwargs, tracing.current_parent())
+            self._tasks[key] = (future, now)
+            return future
+
+    def spawn(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on the job pool without a key (long jobs that report progress elsewhere)"""
+        return self._job_pool.get().submit(self._run, fn, args, kwargs, tracing.current_parent())
+
+    def get(self, key):
+        """The future for key, or None if it was never started here, has expired or failed"""
+        with self._lock:
+            if self._owner_pid != os.getpid():
+                return None
+            task = self._tasks.get(key)
+            return task[0] if task and not _failed(task[0]) else None
+
+
+def init_app(app):
+    app.extensions['background_tasks'] = TaskRegistry(
+        app,
+        workers=app.config['BACKGROUND_WORKERS'],
+        ttl=app.config['BACKGROUND_RESULT_TTL'],
+        job_workers=app.config['BACKGROUND_JOB_WORKERS']
+    )
+
+
+def get_task_registry():
+    return current_app.extensions['background_tasks']
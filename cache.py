@@ -0,0 +1,547 @@
+import argparse
+import hashlib
+import json
+import os
+import socket
+import socketserver
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+from flask import current_app
+
+# Bump a namespace's version whenever the shape of what it caches changes;
+# old entries are then simply never read again and age out
+NAMESPACE_VERSIONS = {
+    'omdb': 1,
+    'identify': 1,
+    'recommendations': 1,
+    'poster_missing': 1,
+}
+
+# Values are JSON; payloads larger than this are zlib-compressed
+COMPRESS_THRESHOLD = 1024
+FORMAT_JSON = b'j'
+FORMAT_ZLIB = b'z'
+
+LOCK_POLL_INTERVAL = 0.05
+ERROR_REPORT_INTERVAL = 60  # seconds; an unreachable backend is logged once per interval, not per call
+
+
+def encode_value(value):
+    data = json.dumps(value, separators=(',', ':')).encode('utf-8')
+    if len(data) > COMPRESS_THRESHOLD:
+        return FORMAT_ZLIB + zlib.compress(data)
+    return FORMAT_JSON + data
+
+
+def decode_value(blob):
+    """Inverse of encode_value; raises ValueError for anything it didn't write"""
+    blob = bytes(blob)
+    if blob[:1] == FORMAT_ZLIB:
+        return json.loads(zlib.decompress(blob[1:]))
+    if blob[:1] == FORMAT_JSON:
+        return json.loads(blob[1:])
+    raise ValueError('Unknown cache value format')
+
+
+class NullBackend:
+    """Caches nothing (benchmarks, or CACHE_BACKEND=none)"""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def add(self, key, value, ttl):
+        return True
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+
+class MemoryBackend:
+    """In-process LRU; every worker process has its own"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def add(self, key, value, ttl):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.time():
+                return False
+            self._entries[key] = (time.time() + ttl, value)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteBackend:
+    """Shared cache in a SQLite file, for all workers on one host (or a shared volume).
+
+    Kept out of the main database so cache writes never queue behind user
+    data. Connections are per thread and per process; expired rows are
+    purged a batch at a time every PURGE_EVERY writes.
+    """
+
+    PURGE_EVERY = 1000
+    PURGE_BATCH = 500
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._conn()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                expires_at REAL NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_cache_entries_expires ON cache_entries (expires_at)')
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            'SELECT value FROM cache_entries WHERE key = ? AND expires_at > ?', (key, time.time())
+        ).fetchone()
+        return bytes(row[0]) if row else None
+
+    def _write(self, sql, params):
+        conn = self._conn()
+        with conn:
+            changed = conn.execute(sql, params).rowcount
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            with conn:
+                conn.execute(
+                    'DELETE FROM cache_entries WHERE key IN '
+                    '(SELECT key FROM cache_entries WHERE expires_at <= ? LIMIT ?)',
+                    (time.time(), self.PURGE_BATCH)
+                )
+        return changed
+
+    def set(self, key, value, ttl):
+        self._write(
+            'INSERT INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at',
+            (key, value, time.time() + ttl)
+        )
+
+    def add(self, key, value, ttl):
+        now = time.time()
+        return self._write(
+            'INSERT INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at '
+            'WHERE cache_entries.expires_at <= ?',
+            (key, value, now + ttl, now)
+        ) == 1
+
+    def delete(self, key):
+        self._write('DELETE FROM cache_entries WHERE key = ?', (key,))
+
+    def clear(self):
+        self._write('DELETE FROM cache_entries', ())
+
+
+class RespError(Exception):
+    pass
+
+
+class RespBackend:
+    """Shared cache on a Redis-protocol server (Redis, Valkey, KeyDB, ...).
+
+    Speaks just enough RESP for GET / SET PX [NX] / DEL over one socket per
+    thread and process, so no client library is needed. url is
+    redis://[:password@]host[:port][/db].
+    """
+
+    def __init__(self, url, timeout=1.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or '127.0.0.1'
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._local.sock = sock
+        self._local.reader = sock.makefile('rb')
+        self._local.pid = os.getpid()
+        if self.password:
+            self._roundtrip('AUTH', self.password)
+        if self.db:
+            self._roundtrip('SELECT', self.db)
+
+    def _disconnect(self):
+        sock = getattr(self._local, 'sock', None)
+        self._local.sock = None
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def _roundtrip(self, *args):
+        parts = [f'*{len(args)}\r\n'.encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode('utf-8')
+            parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        self._local.sock.sendall(b''.join(parts))
+        return self._read_reply()
+
+    def _read_reply(self):
+        line = self._local.reader.readline()
+        if not line.endswith(b'\r\n'):
+            raise ConnectionError('Connection closed by cache server')
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload.decode()
+        if kind == b'-':
+            raise RespError(payload.decode())
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._local.reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            count = int(payload)
+            return None if count < 0 else [self._read_reply() for _ in range(count)]
+        raise RespError(f'Unexpected reply {line!r}')
+
+    def command(self, *args):
+        """Send one command, reconnecting once if the pooled socket went stale"""
+        for attempt in (1, 2):
+            if getattr(self._local, 'sock', None) is None or self._local.pid != os.getpid():
+                self._connect()
+            try:
+                return self._roundtrip(*args)
+            except (OSError, ConnectionError):
+                self._disconnect()
+                if attempt == 2:
+                    raise
+
+    def get(self, key):
+        return self.command('GET', key)
+
+    def set(self, key, value, ttl):
+        self.command('SET', key, value, 'PX', int(ttl * 1000))
+
+    def add(self, key, value, ttl):
+        return self.command('SET', key, value, 'PX', int(ttl * 1000), 'NX') == 'OK'
+
+    def delete(self, key):
+        self.command('DEL', key)
+
+    def clear(self):
+        self.command('FLUSHDB')
+
+
+class _Flight:
+    """One in-process computation that concurrent callers of a key wait on"""
+
+    __slots__ = ('event', 'value', 'ok')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.ok = False
+
+
+class Cache:
+    """Namespaced, versioned JSON cache over an interchangeable backend.
+
+    get_or_compute() protects against stampedes twice over: callers in one
+    process share a single computation per key, and across processes and
+    nodes a short lease key (SET NX) lets one caller compute while the rest
+    poll for its result, falling back to computing themselves after
+    lock_timeout. Backend failures degrade to cache misses, never to errors.
+    """
+
+    def __init__(self, backend, prefix='cinescope', lock_timeout=30.0):
+        self.backend = backend
+        self.prefix = prefix
+        self.lock_timeout = lock_timeout
+        self.stats = {'hits': 0, 'misses': 0, 'computes': 0, 'waits': 0, 'errors': 0}
+        self._flights = {}
+        self._last_error_report = 0.0
+        self._lock = threading.Lock()
+
+    def make_key(self, namespace, key):
+        digest = hashlib.sha1(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+        return f'{self.prefix}:{namespace}:v{NAMESPACE_VERSIONS[namespace]}:{digest}'
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _error(self, action, error):
+        now = time.monotonic()
+        with self._lock:
+            self.stats['errors'] += 1
+            if now - self._last_error_report < ERROR_REPORT_INTERVAL:
+                return
+            self._last_error_report = now
+        print(f"⚠️  Cache {action} error ({type(self.backend).__name__}): {error}")
+
+    def _get(self, full_key):
+        try:
+            blob = self.backend.get(full_key)
+            return (True, decode_value(blob)) if blob is not None else (False, None)
+        except Exception as e:
+            self._error('read', e)
+            return False, None
+
+    def _set(self, full_key, value, ttl):
+        try:
+            self.backend.set(full_key, encode_value(value), ttl)
+        except Exception as e:
+            self._error('write', e)
+
+    def get(self, namespace, key):
+        """(hit, value)"""
+        hit, value = self._get(self.make_key(namespace, key))
+        self._count('hits' if hit else 'misses')
+        return hit, value
+
+    def set(self, namespace, key, value, ttl):
+        self._set(self.make_key(namespace, key), value, ttl)
+
+    def delete(self, namespace, key):
+        try:
+            self.backend.delete(self.make_key(namespace, key))
+        except Exception as e:
+            self._error('delete', e)
+
+    def get_or_compute(self, namespace, key, compute, ttl, cache_if=None):
+        """Cached value for key, or compute() stored for ttl seconds when cache_if(value) allows"""
+        full_key = self.make_key(namespace, key)
+        hit, value = self._get(full_key)
+        if hit:
+            self._count('hits')
+            return value
+        self._count('misses')
+
+        with self._lock:
+            flight = self._flights.get(full_key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[full_key] = _Flight()
+        if not leader:
+            self._count('waits')
+            if flight.event.wait(self.lock_timeout) and flight.ok:
+                return flight.value
+            return compute()
+
+        try:
+            value = self._compute_shared(full_key, compute, ttl, cache_if)
+            flight.value, flight.ok = value, True
+            return value
+        finally:
+            with self._lock:
+                self._flights.pop(full_key, None)
+            flight.event.set()
+
+    def _compute_shared(self, full_key, compute, ttl, cache_if):
+        lock_key = full_key + ':lock'
+        try:
+            leased = self.backend.add(lock_key, b'1', self.lock_timeout)
+        except Exception as e:
+            # Backend unreachable: nobody can publish a result to wait for
+            self._error('lock', e)
+            leased = None
+        if leased is False:
+            # Another process or node is computing this key; wait for its result
+            self._count('waits')
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(LOCK_POLL_INTERVAL)
+                hit, value = self._get(full_key)
+                if hit:
+                    return value
+
+        self._count('computes')
+        try:
+            value = compute()
+            if cache_if is None or cache_if(value):
+                self._set(full_key, value, ttl)
+            return value
+        finally:
+            if leased:
+                try:
+                    self.backend.delete(lock_key)
+                except Exception:
+                    pass
+
+
+def create_backend(config):
+    kind = config['CACHE_BACKEND']
+    if kind == 'memory':
+        return MemoryBackend(config['CACHE_MAX_ENTRIES'])
+    if kind == 'sqlite':
+        return SQLiteBackend(config['CACHE_SQLITE_PATH'])
+    if kind in ('redis', 'resp'):
+        return RespBackend(config['CACHE_URL'])
+    if kind == 'none':
+        return NullBackend()
+    raise ValueError(f'Unknown CACHE_BACKEND {kind!r}')
+
+
+def get_cache():
+    """Per-app cache, built from config on first use"""
+    cache = current_app.extensions.get('cache')
+    if cache is None:
+        config = current_app.config
+        cache = Cache(create_backend(config), config['CACHE_PREFIX'], config['CACHE_LOCK_TIMEOUT'])
+        current_app.extensions['cache'] = cache
+    return cache
+
+
+class RespStandIn:
+    """In-memory server speaking the RESP subset RespBackend uses, for tests and local runs"""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.data = {}  # key -> (value, expires_at or None)
+        self._lock = threading.Lock()
+        standin = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    count = int(line[1:-2])
+                    args = []
+                    for _ in range(count):
+                        length = int(self.rfile.readline()[1:-2])
+                        args.append(self.rfile.read(length + 2)[:-2])
+                    self.wfile.write(standin.execute(args))
+
+        class Server(socketserver.ThreadingTCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+            request_queue_size = 128
+
+        self._server = Server((host, port), Handler)
+        self.address = self._server.server_address
+
+    @property
+    def url(self):
+        return f'redis://{self.address[0]}:{self.address[1]}/0'
+
+    def _live(self, key, now):
+        entry = self.data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= now:
+            del self.data[key]
+            return None
+        return entry
+
+    def execute(self, args):
+        command = args[0].upper()
+        now = time.time()
+        with self._lock:
+            if command == b'PING':
+                return b'+PONG\r\n'
+            if command in (b'AUTH', b'SELECT'):
+                return b'+OK\r\n'
+            if command == b'GET':
+                entry = self._live(args[1], now)
+                return b'$-1\r\n' if entry is None else b'$%d\r\n%s\r\n' % (len(entry[0]), entry[0])
+            if command == b'SET':
+                options = [a.upper() for a in args[3:]]
+                expires_at = None
+                if b'PX' in options:
+                    expires_at = now + int(args[3 + options.index(b'PX') + 1]) / 1000
+                if b'NX' in options and self._live(args[1], now) is not None:
+                    return b'$-1\r\n'
+                self.data[args[1]] = (args[2], expires_at)
+                return b'+OK\r\n'
+            if command == b'DEL':
+                return b':%d\r\n' % sum(self.data.pop(key, None) is not None for key in args[1:])
+            if command == b'FLUSHDB':
+                self.data.clear()
+                return b'+OK\r\n'
+            if command == b'DBSIZE':
+                return b':%d\r\n' % len(self.data)
+        return b'-ERR unknown command\r\n'
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='CineScope shared cache tools')
+    parser.add_argument('command', choices=['clear', 'standin'],
+                        help='clear empties the configured backend; standin serves an in-memory RESP server')
+    parser.add_argument('--port', type=int, default=6379)
+    args = parser.parse_args()
+
+    if args.command == 'standin':
+        standin = RespStandIn(port=args.port).start()
+        print(f"🗄️  RESP stand-in listening on {standin.url} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            standin.stop()
+    else:
+        from config import Config
+        create_backend(vars(Config)).clear()
+        print(f"✅ Cleared the {Config.CACHE_BACKEND} cache")
@@ -0,0 +1,347 @@
+import argparse
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import time
+from array import array
+
+from flask import current_app
+
+# File layout (little-endian):
+#   header          HEADER struct below
+#   string offsets  u32 x (n_strings + 1) into the string blob
+#   string blob     UTF-8 bytes of every distinct string, stored once
+#   movies          MOVIE struct x n_movies, fixed width
+#   links           u32 string ids; each movie owns genres, then directors, then actors
+#   title index     u32 movie indexes sorted by normalized title (prefix search)
+#   id index        u32 movie indexes sorted by numeric IMDb id (point lookup)
+MAGIC = b'CSCATLG\0'
+VERSION = 1
+HEADER = struct.Struct('<8sIIII6Q')
+MOVIE = struct.Struct('<7I6H')
+NO_STRING = 0xFFFFFFFF
+NO_RATING = 0xFFFF
+
+
+def normalize_title(title):
+    return re.sub(r'\s+', ' ', (title or '').strip().casefold())
+
+
+def _split_names(value):
+    if not value or value == 'N/A':
+        return []
+    return [part.strip() for part in value.split(',') if part.strip()]
+
+
+def _parse_int(value):
+    match = re.search(r'\d+', value or '')
+    return int(match.group()) if match else 0
+
+
+def _parse_rating(value):
+    try:
+        return int(round(float(value) * 10))
+    except (TypeError, ValueError):
+        return NO_RATING
+
+
+def _imdb_number(imdb_id):
+    if imdb_id and imdb_id.startswith('tt') and imdb_id[2:].isdigit():
+        return int(imdb_id[2:])
+    return 0
+
+
+def build_snapshot(records, path):
+    """Write OMDB-style movie dicts to a snapshot file, atomically replacing path.
+
+    The new file is fully written and fsynced under a temporary name and then
+    renamed over the old one, so readers only ever see a complete snapshot.
+    Returns the number of movies written.
+    """
+    strings = {}
+    string_list = []
+
+    def intern(value):
+        if value is None or value == '' or value == 'N/A':
+            return NO_STRING
+        sid = strings.get(value)
+        if sid is None:
+            sid = strings[value] = len(string_list)
+            string_list.append(value)
+        return sid
+
+    movies = bytearray()
+    links = array('I')
+    sort_keys = []
+    id_keys = []
+    seen = set()
+
+    for record in records:
+        imdb_num = _imdb_number(record.get('imdbID'))
+        if not imdb_num or imdb_num in seen:
+            continue
+        seen.add(imdb_num)
+
+        genres = [intern(g) for g in _split_names(record.get('Genre'))]
+        directors = [intern(d) for d in _split_names(record.get('Director'))]
+        actors = [intern(a) for a in _split_names(record.get('Actors'))]
+        links_offset = len(links)
+        links.extend(genres + directors + actors)
+
+        title = record.get('Title') or ''
+        norm = normalize_title(title)
+        index = len(sort_keys)
+        sort_keys.append((norm, index))
+        id_keys.append((imdb_num, index))
+
+        movies += MOVIE.pack(
+            imdb_num,
+            intern(title),
+            intern(norm),
+            intern(record.get('Language')),
+            intern(record.get('Plot')),
+            intern(record.get('Poster')),
+            links_offset,
+            _parse_int(record.get('Year')) & 0xFFFF,
+            _parse_int(record.get('Runtime')) & 0xFFFF,
+            _parse_rating(record.get('imdbRating')),
+            len(genres),
+            len(directors),
+            len(actors),
+        )
+
+    title_index = array('I', (i for _, i in sorted(sort_keys)))
+    id_index = array('I', (i for _, i in sorted(id_keys)))
+
+    blob = bytearray()
+    string_offsets = array('I', [0])
+    for value in string_list:
+        blob += value.encode('utf-8')
+        string_offsets.append(len(blob))
+
+    for arr in (links, title_index, id_index, string_offsets):
+        if sys.byteorder != 'little':
+            arr.byteswap()
+
+    sections = [string_offsets.tobytes(), bytes(blob), bytes(movies),
+                links.tobytes(), title_index.tobytes(), id_index.tobytes()]
+    offsets = []
+    position = HEADER.size
+    for section in sections:
+        position += -position % 8  # keep every section 8-byte aligned
+        offsets.append(position)
+        position += len(section)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(id_keys), len(string_list), len(links), *offsets))
+        for offset, section in zip(offsets, sections):
+            f.write(b'\0' * (offset - f.tell()))
+            f.write(section)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(id_keys)
+
+
+class CatalogSnapshot:
+    """Read-only view over a snapshot file via mmap.
+
+    Nothing is parsed up front: opening is O(1), and every worker mapping the
+    same file shares its pages through the OS page cache.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            st = os.fstat(f.fileno())
+        self.identity = (st.st_ino, st.st_mtime_ns, st.st_size)
+
+        (magic, version, self.movie_count, self.string_count, link_count,
+         strings_at, blob_at, movies_at, links_at, titles_at, ids_at) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a CineScope catalog snapshot (v{VERSION})")
+
+        view = memoryview(self._mm)
+        self._string_offsets = self._u32(view, strings_at, self.string_count + 1)
+        self._blob = view[blob_at:blob_at + self._string_offsets[-1]] if self.string_count else view[0:0]
+        self._movies_at = movies_at
+        self._links = self._u32(view, links_at, link_count)
+        self._title_index = self._u32(view, titles_at, self.movie_count)
+        self._id_index = self._u32(view, ids_at, self.movie_count)
+
+    @staticmethod
+    def _u32(view, offset, count):
+        chunk = view[offset:offset + 4 * count]
+        if sys.byteorder == 'little':
+            return chunk.cast('I')
+        swapped = array('I', chunk.tobytes())
+        swapped.byteswap()
+        return swapped
+
+    def __len__(self):
+        return self.movie_count
+
+    def string(self, sid):
+        if sid == NO_STRING:
+            return None
+        return bytes(self._blob[self._string_offsets[sid]:self._string_offsets[sid + 1]]).decode('utf-8')
+
+    def _raw(self, index):
+        return MOVIE.unpack_from(self._mm, self._movies_at + index * MOVIE.size)
+
+    def _norm_title(self, index):
+        return self.string(self._raw(index)[2]) or ''
+
+    def movie(self, index):
+        """Decode one movie into the OMDB-style dict the rest of the app understands"""
+        (imdb_num, title, _, language, plot, poster, links_at, year, runtime,
+         rating, n_genres, n_directors, n_actors) = self._raw(index)
+        names = [self.string(sid) for sid in self._links[links_at:links_at + n_genres + n_directors + n_actors]]
+        return {
+            'imdbID': f"tt{imdb_num:07d}",
+            'Title': self.string(title),
+            'Year': str(year) if year else 'N/A',
+            'Runtime': f"{runtime} min" if runtime else 'N/A',
+            'imdbRating': f"{rating / 10:.1f}" if rating != NO_RATING else 'N/A',
+            'Genre': ', '.join(names[:n_genres]) or 'N/A',
+            'Director': ', '.join(names[n_genres:n_genres + n_directors]) or 'N/A',
+            'Actors': ', '.join(names[n_genres + n_directors:]) or 'N/A',
+            'Language': self.string(language) or 'N/A',
+            'Plot': self.string(plot) or 'N/A',
+            'Poster': self.string(poster) or 'N/A',
+        }
+
+    def get(self, imdb_id):
+        """Point lookup by IMDb id (binary search over the id index)"""
+        target = _imdb_number(imdb_id)
+        lo, hi = 0, self.movie_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._raw(self._id_index[mid])[0] < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.movie_count and self._raw(self._id_index[lo])[0] == target:
+            return self.movie(self._id_index[lo])
+        return None
+
+    def prefix_search(self, prefix, limit=10):
+        """Movies whose normalized title starts with prefix, in title order"""
+        prefix = normalize_title(prefix)
+        if not prefix:
+            return []
+        lo, hi = 0, self.movie_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._norm_title(self._title_index[mid]) < prefix:
+                lo = mid + 1
+            else:
+                hi = mid
+        results = []
+        while lo < self.movie_count and len(results) < limit:
+            index = self._title_index[lo]
+            if not self._norm_title(index).startswith(prefix):
+                break
+            results.append(self.movie(index))
+            lo += 1
+        return results
+
+    def titles(self):
+        for index in range(self.movie_count):
+            yield self.string(self._raw(index)[1])
+
+    def entries(self):
+        """(imdb_id, title) for every movie, without decoding the rest of the record"""
+        for index in range(self.movie_count):
+            raw = self._raw(index)
+            yield f"tt{raw[0]:07d}", self.string(raw[1])
+
+
+class SnapshotHandle:
+    """Hands out the current snapshot and hot-swaps it when the file is replaced.
+
+    The path is stat()ed at most once per check_interval seconds. A swapped-out
+    snapshot is not closed explicitly; it is unmapped once the last request
+    still holding it lets go.
+    """
+
+    def __init__(self, path, check_interval=5.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return self._snapshot
+        with self._lock:
+            self._checked_at = now
+            try:
+                st = os.stat(self.path)
+            except OSError:
+                self._snapshot = None
+                return None
+            identity = (st.st_ino, st.st_mtime_ns, st.st_size)
+            if self._snapshot is None or self._snapshot.identity != identity:
+                try:
+                    self._snapshot = CatalogSnapshot(self.path)
+                except (OSError, ValueError) as e:
+                    print(f"Catalog snapshot error: {e}")
+            return self._snapshot
+
+
+def get_catalog():
+    """Current catalog snapshot for this app, or None when no snapshot has been built"""
+    handle = current_app.extensions.get('catalog_snapshot')
+    if handle is None:
+        handle = SnapshotHandle(current_app.config['CATALOG_SNAPSHOT_PATH'],
+                                current_app.config['CATALOG_SNAPSHOT_CHECK_INTERVAL'])
+        current_app.extensions['catalog_snapshot'] = handle
+    return handle.get()
+
+
+def _read_jsonl(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+if __name__ == '__main__':
+    from config import Config
+
+    # Every subcommand takes --path after its name (`build --path X ...`)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--path', default=Config.CATALOG_SNAPSHOT_PATH, help='snapshot file')
+    parser = argparse.ArgumentParser(description='Build or inspect the CineScope catalog snapshot')
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', parents=[common], help='build a snapshot from OMDB detail records')
+    build.add_argument('--from-jsonl', required=True, metavar='PATH', help='one OMDB JSON record per line')
+    sub.add_parser('info', parents=[common])
+    suggest = sub.add_parser('suggest', parents=[common])
+    suggest.add_argument('prefix')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        start = time.perf_counter()
+        count = build_snapshot(_read_jsonl(args.from_jsonl), args.path)
+        print(f"✅ Wrote {count} movies to {args.path} in {time.perf_counter() - start:.2f}s")
+    else:
+        start = time.perf_counter()
+        snapshot = CatalogSnapshot(args.path)
+        opened_ms = (time.perf_counter() - start) * 1000
+        if args.command == 'info':
+            print(f"📦 {args.path}: {len(snapshot)} movies, {snapshot.string_count} strings, "
+                  f"{os.path.getsize(args.path)} bytes, opened in {opened_ms:.2f} ms")
+        else:
+            for movie in snapshot.prefix_search(args.prefix):
+                print(f"  - {movie['Title']} ({movie['Year']}) {movie['imdbID']}")
@@ -0,0 +1,164 @@
+import json
+import secrets
+import time
+
+# Longest user message / reply kept verbatim in the window or the summary
+MAX_MESSAGE_CHARS = 300
+MAX_SUMMARY_ITEM_CHARS = 160
+MAX_CANDIDATES = 5
+
+
+def init_chat_sessions(conn):
+    """Create the DIRECTOR chat state tables (idempotent)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS chat_sessions (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            summary TEXT NOT NULL DEFAULT '',
+            candidates TEXT NOT NULL DEFAULT '[]',
+            turns INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_chat_sessions_updated ON chat_sessions (updated_at)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS chat_messages (
+            session_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            PRIMARY KEY (session_id, seq)
+        ) WITHOUT ROWID
+    ''')
+
+
+class ChatState:
+    """One conversation: a compact summary, the recent window and the live candidates"""
+
+    __slots__ = ('id', 'user_id', 'summary', 'candidates', 'turns', 'messages')
+
+    def __init__(self, id, user_id, summary='', candidates=None, turns=0, messages=None):
+        self.id = id
+        self.user_id = user_id
+        self.summary = summary
+        self.candidates = candidates or []
+        self.turns = turns
+        self.messages = messages or []  # [(seq, role, content)], oldest first
+
+    def user_text(self):
+        """Everything the user has said that is still in the window, oldest first"""
+        return ' '.join(content for _, role, content in self.messages if role == 'user')
+
+
+def load_session(conn, chat_id, user_id, ttl):
+    """The user's live session with this id, or None (unknown, someone else's, or expired)"""
+    if not chat_id:
+        return None
+    row = conn.execute(
+        'SELECT id, user_id, summary, candidates, turns FROM chat_sessions '
+        'WHERE id = ? AND user_id = ? AND updated_at >= ?',
+        (chat_id, user_id, time.time() - ttl)
+    ).fetchone()
+    if row is None:
+        return None
+    return ChatState(row[0], row[1], row[2], json.loads(row[3]), row[4], _load_messages(conn, chat_id))
+
+
+def _load_messages(conn, chat_id):
+    return [tuple(m) for m in conn.execute(
+        'SELECT seq, role, content FROM chat_messages WHERE session_id = ? ORDER BY seq',
+        (chat_id,)
+    )]
+
+
+def create_session(conn, user_id, ttl):
+    """Start a new conversation, purging expired ones while we're at it"""
+    cutoff = time.time() - ttl
+    conn.execute(
+        'DELETE FROM chat_messages WHERE session_id IN (SELECT id FROM chat_sessions WHERE updated_at < ?)',
+        (cutoff,)
+    )
+    conn.execute('DELETE FROM chat_sessions WHERE updated_at < ?', (cutoff,))
+    state = ChatState(secrets.token_urlsafe(16), user_id)
+    conn.execute(
+        'INSERT INTO chat_sessions (id, user_id, updated_at) VALUES (?, ?, ?)',
+        (state.id, user_id, time.time())
+    )
+    conn.commit()
+    return state
+
+
+def _clip(text, limit):
+    text = ' '.join((text or '').split())
+    return text if len(text) <= limit else text[:limit - 1] + '…'
+
+
+def record_turn(conn, state, user_message, reply, candidates, window, summary_chars):
+    """Append one exchange and compact everything older than the last `window` messages.
+
+    Messages that fall out of the window are folded into the summary (user
+    messages only; the assistant's answers are captured by the candidate
+    list), and the summary keeps its most recent summary_chars characters,
+    so stored state and prompts stay bounded however long the chat runs.
+    """
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # Another turn of this chat may have been recorded since state was loaded: build on
+        # what is stored now, so both turns are kept and their seq numbers don't collide
+        row = conn.execute('SELECT summary, turns FROM chat_sessions WHERE id = ?', (state.id,)).fetchone()
+        if row is not None:
+            state.summary, state.turns = row[0], row[1]
+            state.messages = _load_messages(conn, state.id)
+
+        next_seq = state.messages[-1][0] + 1 if state.messages else 0
+        new_messages = [
+            (next_seq, 'user', _clip(user_message, MAX_MESSAGE_CHARS)),
+            (next_seq + 1, 'assistant', _clip(reply, MAX_MESSAGE_CHARS)),
+        ]
+        state.messages.extend(new_messages)
+
+        evicted = state.messages[:-window] if len(state.messages) > window else []
+        state.messages = state.messages[len(evicted):]
+        for _, role, content in evicted:
+            if role == 'user':
+                item = _clip(content, MAX_SUMMARY_ITEM_CHARS)
+                state.summary = f"{state.summary} | {item}" if state.summary else item
+        if len(state.summary) > summary_chars:
+            state.summary = '…' + state.summary[-(summary_chars - 1):]
+
+        if candidates:
+            state.candidates = list(dict.fromkeys(candidates))[:MAX_CANDIDATES]
+        state.turns += 1
+
+        conn.executemany(
+            'INSERT INTO chat_messages (session_id, seq, role, content) VALUES (?, ?, ?, ?)',
+            [(state.id, seq, role, content) for seq, role, content in new_messages]
+        )
+        if evicted:
+            conn.execute(
+                'DELETE FROM chat_messages WHERE session_id = ? AND seq <= ?',
+                (state.id, evicted[-1][0])
+            )
+        conn.execute(
+            'UPDATE chat_sessions SET summary = ?, candidates = ?, turns = ?, updated_at = ? WHERE id = ?',
+            (state.summary, json.dumps(state.candidates), state.turns, time.time(), state.id)
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def format_context(state):
+    """Prompt section describing the conversation so far ('' for a fresh chat)"""
+    if state is None or not state.turns:
+        return ''
+    lines = ["Conversation so far (the new message may answer your earlier question; refine your earlier candidates rather than starting over):"]
+    if state.summary:
+        lines.append(f"- Earlier, the user said: {state.summary}")
+    for _, role, content in state.messages:
+        lines.append(f"- {'User' if role == 'user' else 'You'}: {content}")
+    if state.candidates:
+        lines.append(f"- Candidates you already suggested: {', '.join(state.candidates)}")
+    return '\n'.join(lines)
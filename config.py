@@ -16,9 +16,157 @@ class Config:
     # OpenRouter Model (default: gpt-3.5-turbo, but can use others like claude, gemini, etc.)
     OPENROUTER_MODEL = os.getenv('OPENROUTER_MODEL', 'openai/gpt-3.5-turbo')
     
+    # Chat completions endpoint (point at a local stand-in for benchmarks)
+    OPENROUTER_API_URL = os.getenv('OPENROUTER_API_URL', 'https://openrouter.ai/api/v1/chat/completions')
+    
     # Flask
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-123')
     
+    # Startup: warn when create_app() exceeds the budget; EAGER_INIT builds lazy subsystems up front
+    STARTUP_BUDGET_MS = int(os.getenv('STARTUP_BUDGET_MS', '500'))
+    EAGER_INIT = os.getenv('EAGER_INIT', '').lower() in ('1', 'true', 'yes')
+    
+    # Tracing: 'none', 'file' (OTLP/JSON lines in TRACE_FILE, for a collector's otlpjsonfile
+    # receiver or `python tracing.py show`) or 'otlp' (OTLP/HTTP JSON to TRACE_OTLP_ENDPOINT).
+    # Traces are kept when slower than TRACE_SLOW_MS, failed, or sampled by the caller's
+    # traceparent, plus TRACE_SAMPLE_RATE of the rest
+    TRACE_EXPORTER = os.getenv('TRACE_EXPORTER', 'none')
+    TRACE_FILE = os.getenv('TRACE_FILE', 'traces.jsonl')
+    TRACE_OTLP_ENDPOINT = os.getenv('TRACE_OTLP_ENDPOINT', 'http://127.0.0.1:4318/v1/traces')
+    TRACE_SERVICE_NAME = os.getenv('TRACE_SERVICE_NAME', 'cinescope')
+    TRACE_SLOW_MS = int(os.getenv('TRACE_SLOW_MS', '1000'))
+    TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0.01'))
+    TRACE_MAX_SPANS = 2000  # per request or task; a bulk loop can't grow a trace without bound
+    
+    # SQLite statement statistics: every app connection times its statements (and how long
+    # they waited for a lock), aggregated by normalized SQL and merged across workers into
+    # DB_STATS_PATH every DB_STATS_FLUSH_INTERVAL seconds. Statements slower than
+    # DB_SLOW_QUERY_MS are appended to DB_SLOW_QUERY_LOG with their route. See /admin/db_stats
+    # (for ADMIN_USERNAMES, comma-separated) or `python db_stats.py show`
+    DB_STATS = os.getenv('DB_STATS', 'true').lower() in ('1', 'true', 'yes')
+    DB_STATS_PATH = os.getenv('DB_STATS_PATH', 'db_stats.db')
+    DB_STATS_FLUSH_INTERVAL = 30
+    DB_SLOW_QUERY_MS = float(os.getenv('DB_SLOW_QUERY_MS', '100'))
+    DB_SLOW_QUERY_LOG = os.getenv('DB_SLOW_QUERY_LOG', 'slow_queries.jsonl')
+    ADMIN_USERNAMES = [name.strip() for name in os.getenv('ADMIN_USERNAMES', '').split(',') if name.strip()]
+    
+    # Keep-alive connections per upstream host (OMDB, OpenRouter, poster CDN)
+    HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '20'))
+    
+    # Static assets (run `python assets.py build` before deploying)
+    ASSET_BUILD_DIR = 'dist'
+    ASSET_MAX_AGE = 31536000  # one year; fingerprinted files never change
+    
+    # Gzip dynamic JSON responses larger than this many bytes
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))
+    COMPRESS_LEVEL = 6
+    
+    # Poster proxy cache (resized variants of OMDB posters)
+    POSTER_CACHE_DIR = os.getenv('POSTER_CACHE_DIR', 'poster_cache')
+    POSTER_CACHE_MAX_BYTES = int(os.getenv('POSTER_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+    POSTER_MAX_AGE = 7 * 24 * 3600
+    POSTER_MISSING_TTL = int(os.getenv('POSTER_MISSING_TTL', str(24 * 3600)))  # ids OMDB has no poster for
+    
+    # Password hashing runs in its own process pool so login bursts can't starve /search
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '2'))  # 0 = hash inline
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', '16'))
+    PASSWORD_HASH_TIMEOUT = 10
+    
+    # Authentication attempts allowed per LOGIN_THROTTLE_WINDOW seconds
+    LOGIN_ATTEMPTS_PER_IP = int(os.getenv('LOGIN_ATTEMPTS_PER_IP', '30'))
+    LOGIN_ATTEMPTS_PER_USERNAME = int(os.getenv('LOGIN_ATTEMPTS_PER_USERNAME', '10'))
+    LOGIN_THROTTLE_WINDOW = 60
+    
+    # Read-only movie catalog snapshot, mmap'ed and shared by all workers
+    # (build with `python catalog_snapshot.py build --from-jsonl movies.jsonl`)
+    CATALOG_SNAPSHOT_PATH = os.getenv('CATALOG_SNAPSHOT_PATH', 'catalog.snap')
+    CATALOG_SNAPSHOT_CHECK_INTERVAL = 5  # seconds between checks for a rebuilt snapshot
+    
+    # Background work started by a request and collected by a follow-up one
+    # (first page of /search recommendations)
+    BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', '4'))
+    BACKGROUND_RESULT_TTL = 120  # seconds a finished result waits to be collected
+    # Long jobs (watchlist imports, the metadata backfill) get their own threads
+    # so they never queue ahead of the short tasks above
+    BACKGROUND_JOB_WORKERS = int(os.getenv('BACKGROUND_JOB_WORKERS', '2'))
+    RECOMMENDATIONS_TIMEOUT = 25
+    
+    # Shared cache for OMDB responses, DIRECTOR identifications and recommendation lists:
+    # 'memory' (per process), 'sqlite' (all workers on a host), 'redis' (the whole fleet;
+    # any Redis-protocol server) or 'none'. Entries live for the CACHE_TTL_* seconds.
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memory')
+    CACHE_URL = os.getenv('CACHE_URL', 'redis://127.0.0.1:6379/0')
+    CACHE_SQLITE_PATH = os.getenv('CACHE_SQLITE_PATH', 'cache.db')
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '10000'))
+    CACHE_PREFIX = os.getenv('CACHE_PREFIX', 'cinescope')
+    CACHE_LOCK_TIMEOUT = 30  # longest a caller waits for another to compute the same key
+    CACHE_TTL_OMDB = 24 * 3600
+    CACHE_TTL_IDENTIFY = 7 * 24 * 3600
+    CACHE_TTL_RECOMMENDATIONS = 6 * 3600
+    
+    # search_history retention (run `python retention.py run` from cron): searches kept per
+    # user and maximum age in days (0 disables either limit; older searches survive only in
+    # the analytics rollups), rows deleted per transaction, and incremental vacuum pacing
+    HISTORY_KEEP_PER_USER = int(os.getenv('HISTORY_KEEP_PER_USER', '500'))
+    HISTORY_KEEP_DAYS = int(os.getenv('HISTORY_KEEP_DAYS', '365'))
+    RETENTION_BATCH_SIZE = 500
+    VACUUM_STEP_PAGES = 256
+    VACUUM_MAX_STEPS = 400
+    
+    # User data sharding: favorites and search_history are split by user across this many
+    # SQLite files ({stem}/{index} are filled in from DATABASE_PATH; 1 keeps everything in
+    # the main database). Changing the count needs `python repository.py rebalance --shards N`
+    USER_DATA_SHARDS = int(os.getenv('USER_DATA_SHARDS', '1'))
+    SHARD_PATH_TEMPLATE = os.getenv('SHARD_PATH_TEMPLATE', '{stem}.shard{index}.db')
+    
+    # Bulk watchlist import: upload limits, parallel title lookups, OMDB calls per second
+    # (per worker process) and favorites written per transaction
+    IMPORT_MAX_BYTES = 5 * 1024 * 1024
+    IMPORT_MAX_TITLES = int(os.getenv('IMPORT_MAX_TITLES', '5000'))
+    IMPORT_CONCURRENCY = int(os.getenv('IMPORT_CONCURRENCY', '4'))
+    IMPORT_OMDB_RATE = float(os.getenv('IMPORT_OMDB_RATE', '10'))
+    IMPORT_BATCH_SIZE = 50
+    IMPORT_JOB_TTL = 7 * 24 * 3600
+    
+    # DIRECTOR chat: messages kept verbatim per conversation (older ones are summarized),
+    # summary size cap, and how long an idle conversation is kept
+    CHAT_WINDOW_MESSAGES = int(os.getenv('CHAT_WINDOW_MESSAGES', '6'))
+    CHAT_SUMMARY_CHARS = 600
+    CHAT_SESSION_TTL = int(os.getenv('CHAT_SESSION_TTL', str(24 * 3600)))
+    
+    # Title resolution: how long a query OMDB could not find is remembered, and
+    # how many typos per word the fuzzy matcher corrects
+    TITLE_NEGATIVE_CACHE_TTL = int(os.getenv('TITLE_NEGATIVE_CACHE_TTL', str(24 * 3600)))
+    TITLE_FUZZY_MAX_DISTANCE = 2
+    
+    # Movie index behind /discover: every OMDB detail response is parsed into typed
+    # columns; a worker rewrites a movie it has already indexed at most this often.
+    # Seed it with `python movie_index.py ingest --from-catalog`
+    MOVIE_INDEX_REFRESH = int(os.getenv('MOVIE_INDEX_REFRESH', str(24 * 3600)))
+    
+    # Background backfill of movie metadata the favorites/history pages could not show:
+    # movies per batch and OMDB calls per second (per worker process); run
+    # `python movie_index.py backfill` once to index everything already saved
+    MOVIE_BACKFILL_BATCH = 20
+    MOVIE_BACKFILL_RATE = float(os.getenv('MOVIE_BACKFILL_RATE', '2'))
+    
+    # /trending: movies ranked by recent searches and DIRECTOR matches. Counts decay by half
+    # every TRENDING_HALF_LIFE seconds (applied once per bucket); each worker merges its
+    # counts into the shared checkpoint in the main database every CHECKPOINT_INTERVAL seconds
+    TRENDING_SIZE = int(os.getenv('TRENDING_SIZE', '20'))
+    TRENDING_HALF_LIFE = int(os.getenv('TRENDING_HALF_LIFE', str(6 * 3600)))
+    TRENDING_BUCKET_SECONDS = 300
+    TRENDING_CHECKPOINT_INTERVAL = int(os.getenv('TRENDING_CHECKPOINT_INTERVAL', '60'))
+    TRENDING_SKETCH_WIDTH = 2048
+    TRENDING_SKETCH_DEPTH = 4
+    
+    # "For You" feed: stored size, OMDB detail lookups per refresh when there is no
+    # catalog snapshot, and whether workers refresh feeds themselves (otherwise run
+    # `python for_you.py refresh` periodically)
+    FOR_YOU_SIZE = int(os.getenv('FOR_YOU_SIZE', '24'))
+    FOR_YOU_CANDIDATE_DETAILS = int(os.getenv('FOR_YOU_CANDIDATE_DETAILS', '15'))
+    FOR_YOU_BACKGROUND_REFRESH = os.getenv('FOR_YOU_BACKGROUND_REFRESH', 'true').lower() in ('1', 'true', 'yes')
+    
     @property
     def is_omdb_configured(self):
         return self.OMDB_API_KEY and self.OMDB_API_KEY != 'your_actual_api_key_here'
@@ -0,0 +1,19 @@
+import pytest
+
+from app import create_app
+
+
+@pytest.fixture
+def app(tmp_path):
+    """App on a fresh, migrated database with no network-facing subsystems running"""
+    app = create_app(
+        DATABASE_PATH=str(tmp_path / 'cinescope.db'),
+        SECRET_KEY='test',
+        PASSWORD_HASH_WORKERS=0,
+        CACHE_BACKEND='none',
+        FOR_YOU_BACKGROUND_REFRESH=False,
+        DB_STATS=False,
+        CATALOG_SNAPSHOT_PATH=str(tmp_path / 'missing-catalog.json'),
+    )
+    with app.app_context():
+        yield app
@@ -0,0 +1,669 @@
+import argparse
+import os
+import random
+import re
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+import weakref
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+
+from config import Config
+from view_db import open_readonly, quote_identifier, list_tables
+
+try:
+    from tabulate import tabulate
+except ImportError:
+    tabulate = None
+
+# Statements the workload issues that are not worth planning or timing
+SKIPPED_PREFIXES = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE', 'CREATE', 'ALTER', 'DROP')
+# Per-connection setup replayed before the statements that followed it on the same connection
+SETUP_PREFIXES = ('ATTACH', 'PRAGMA')
+
+BENCH_PASSWORD = 'advisor-password'
+GENRES = ('Drama', 'Comedy', 'Action', 'Thriller', 'Romance', 'Crime', 'Horror', 'Adventure', 'Sci-Fi',
+          'Animation', 'Mystery', 'Fantasy', 'Family', 'Documentary', 'Biography', 'War', 'History',
+          'Music', 'Western', 'Sport')
+LANGUAGES = ('English', 'French', 'Spanish', 'German', 'Japanese', 'Korean', 'Italian', 'Hindi',
+             'Mandarin', 'Portuguese')
+TITLE_WORDS = ('Dark', 'Last', 'Silent', 'Red', 'Lost', 'Night', 'River', 'City', 'Dream', 'Star', 'Road',
+               'Winter', 'Ghost', 'Iron', 'Glass', 'House', 'King', 'Shadow', 'Summer', 'Empire')
+INSERT_BATCH = 10000
+SCALE_FLAG_RATIO = 0.5  # p50 growing by half the data growth or more counts as scaling with the data
+MIN_FLAGGED_MS = 0.1  # below this, growth is timer noise
+
+
+# Synthetic dataset
+def _zipf_cum_weights(count, skew=1.0, offset=10):
+    """Cumulative weights for random.choices: a few hot items, a long tail"""
+    return list(accumulate(1.0 / (rank + offset) ** skew for rank in range(count)))
+
+
+def _timestamps(count, days):
+    """count increasing 'YYYY-MM-DD HH:MM:SS' stamps spread over the last days"""
+    start = datetime.now(timezone.utc) - timedelta(days=days)
+    step = days * 86400 / max(count, 1)
+    for i in range(count):
+        yield (start + timedelta(seconds=i * step)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def synthetic_movies(count, seed=1):
+    """OMDB-style detail records for movie_index.ingest"""
+    rng = random.Random(seed)
+    people = [f'Person {i}' for i in range(max(50, count // 2))]
+    for i in range(count):
+        yield {
+            'imdbID': f'tt{9000000 + i}',
+            'Title': f'{rng.choice(TITLE_WORDS)} {rng.choice(TITLE_WORDS)} {i}',
+            'Year': str(rng.randint(1950, 2024)),
+            'Runtime': f'{rng.randint(75, 190)} min',
+            'imdbRating': f'{rng.uniform(3, 9.5):.1f}',
+            'imdbVotes': f'{int(rng.paretovariate(1.2) * 500):,}',
+            'BoxOffice': f'${rng.randint(0, 400000000):,}',
+            'Rated': rng.choice(('G', 'PG', 'PG-13', 'R')),
+            'Plot': 'Synthetic movie for db_advisor.py.',
+            'Poster': 'N/A',
+            'Genre': ', '.join(rng.sample(GENRES, rng.randint(1, 3))),
+            'Language': ', '.join(rng.sample(LANGUAGES, rng.randint(1, 2))),
+            'Director': rng.choice(people),
+            'Writer': ', '.join(rng.sample(people, 2)),
+            'Actors': ', '.join(rng.sample(people, 4)),
+        }
+
+
+def make_app(db_path, shards):
+    """A CineScope app on db_path that never calls OMDB or starts background refreshes"""
+    from app import create_app
+    return create_app(
+        DATABASE_PATH=db_path, USER_DATA_SHARDS=shards, SECRET_KEY='db-advisor', OMDB_API_KEY=None, CACHE_BACKEND='none',
+        FOR_YOU_BACKGROUND_REFRESH=False, PASSWORD_HASH_WORKERS=0, TRACE_EXPORTER='none', DB_STATS=False,
+        CATALOG_SNAPSHOT_PATH=os.path.join(os.path.dirname(db_path), 'no-catalog.snap'),
+        POSTER_CACHE_DIR=os.path.join(os.path.dirname(db_path), 'posters'),
+        LOGIN_ATTEMPTS_PER_IP=1000, LOGIN_ATTEMPTS_PER_USERNAME=1000
+    )
+
+
+def build_base(db_path, shards, movies):
+    """Migrated schema plus the movie index and title resolutions, shared by every scale"""
+    import movie_index
+    import title_resolver
+
+    app = make_app(db_path, shards)
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            movie_index.ingest(conn, synthetic_movies(movies))
+            conn.executemany(
+                'INSERT OR IGNORE INTO title_resolutions (query, imdb_id, resolved_at) VALUES (?, ?, ?)',
+                [(title_resolver.normalize_query(title, strip_article=False), imdb_id, time.time())
+                 for imdb_id, title in conn.execute('SELECT imdb_id, title FROM movies')]
+            )
+    finally:
+        conn.close()
+    return app
+
+
+def populate(app, users, searches, favorites, feed_share=0.2, seed=2):
+    """Add users with Zipf-distributed history and favorites; returns a heavy (90th percentile) user.
+
+    Rows are generated in global time order and routed to each user's
+    shard, so one user's rows are interleaved with everyone else's on disk
+    the way they are in production.
+    """
+    import password_hasher
+    import repository
+
+    rng = random.Random(seed)
+    with app.app_context():
+        password = password_hasher.get_password_hasher().hash(BENCH_PASSWORD)
+        repo = repository.get_repository()
+        main = sqlite3.connect(app.config['DATABASE_PATH'])
+        try:
+            movies = main.execute('SELECT imdb_id, title FROM movies ORDER BY id').fetchall()
+            first_id = (main.execute('SELECT MAX(id) FROM users').fetchone()[0] or 0) + 1
+            with main:
+                main.executemany('INSERT INTO users (username, password) VALUES (?, ?)',
+                                 ((f'user{first_id + i}', password) for i in range(users)))
+            user_ids = list(range(first_id, first_id + users))
+            user_weights = _zipf_cum_weights(users, skew=0.8)
+            movie_weights = _zipf_cum_weights(len(movies))
+
+            shards = [repo.connect_shard(index) for index in range(repo.shard_count)]
+            counts = dict.fromkeys(user_ids, 0)
+            try:
+                for table, total, columns in (
+                    ('search_history', users * searches, '(user_id, movie_title, movie_id, search_date)'),
+                    ('favorites', users * favorites, '(user_id, movie_title, movie_id, added_date)'),
+                ):
+                    sql = f'INSERT INTO {table} {columns} VALUES (?, ?, ?, ?)'
+                    buffers = [[] for _ in shards]
+                    stamps = _timestamps(total, 365)
+                    for done in range(0, total, INSERT_BATCH):
+                        size = min(INSERT_BATCH, total - done)
+                        picked_users = rng.choices(user_ids, cum_weights=user_weights, k=size)
+                        picked_movies = rng.choices(movies, cum_weights=movie_weights, k=size)
+                        for user_id, (imdb_id, title), stamp in zip(picked_users, picked_movies, stamps):
+                            buffers[repo.shard_index(user_id)].append((user_id, title, imdb_id, stamp))
+                            if table == 'search_history':
+                                counts[user_id] += 1
+                        for conn, rows in zip(shards, buffers):
+                            with conn:
+                                conn.executemany(sql, rows)
+                            rows.clear()
+                        print(f"  {table}: {done + size}/{total}", end='\r')
+                    print()
+            finally:
+                for conn in shards:
+                    conn.close()
+
+            feed_users = [user_id for user_id in user_ids if rng.random() < feed_share]
+            size = app.config['FOR_YOU_SIZE']
+            with main:
+                main.executemany('INSERT INTO user_taste_profiles (user_id, stale) VALUES (?, 0)',
+                                 ((user_id,) for user_id in feed_users))
+                main.executemany(
+                    'INSERT INTO user_recommendations (user_id, rank, imdb_id, title, year, genre, rating, reason, score) '
+                    "VALUES (?, ?, ?, ?, '2001', 'Drama', '7.5', 'Because you like Drama', ?)",
+                    ((user_id, rank, *rng.choice(movies), 1.0 / (rank + 1))
+                     for user_id in feed_users for rank in range(size))
+                )
+        finally:
+            main.close()
+
+    ranked = sorted(counts, key=counts.get)
+    return f'user{ranked[int(len(ranked) * 0.9)]}'
+
+
+# Workload capture
+class CapturedStatement:
+    __slots__ = ('sql', 'db_name', 'params', 'setup', 'routes', 'calls')
+
+    def __init__(self, sql, db_name, params, setup):
+        self.sql = sql
+        self.db_name = db_name
+        self.params = params
+        self.setup = setup
+        self.routes = []
+        self.calls = 0
+
+
+class StatementCapture:
+    """tracing.recording_statements callback collecting each distinct statement with the route that ran it"""
+
+    def __init__(self):
+        self.route = None
+        self.statements = {}
+        self._setup = weakref.WeakKeyDictionary()  # connection -> ATTACH/PRAGMA run on it so far
+
+    def __call__(self, conn, sql, params):
+        text = re.sub(r'\s+', ' ', sql).strip()
+        keyword = text.split(' ', 1)[0].upper()
+        if keyword in SETUP_PREFIXES:
+            self._setup.setdefault(conn, []).append((text, _first_row(params)))
+            return
+        if keyword in SKIPPED_PREFIXES or self.route is None:
+            return
+        key = (conn.db_name, text)
+        statement = self.statements.get(key)
+        if statement is None:
+            statement = self.statements[key] = CapturedStatement(
+                text, conn.db_name, _first_row(params), tuple(self._setup.get(conn, ()))
+            )
+        statement.calls += 1
+        if self.route not in statement.routes:
+            statement.routes.append(self.route)
+
+
+def _first_row(params):
+    """Parameters for one execution; executemany passes a list of rows (generators are left alone)"""
+    if isinstance(params, list) and params and isinstance(params[0], (list, tuple, dict)):
+        return tuple(params[0])
+    if isinstance(params, (list, tuple, dict)):
+        return params
+    return None
+
+
+def run_workload(app, username, capture):
+    """Drive the request paths that touch SQLite as one logged-in user.
+
+    Everything goes through the real routes except /search, whose OMDB
+    call is skipped: its title resolution and history insert run directly.
+    The user registered on the way is deleted afterwards, so replaying the
+    registration insert does not hit the unique username.
+    """
+    import app as webapp
+    import title_resolver
+
+    client = app.test_client()
+    new_user = f'advisor{time.time_ns() % 10 ** 12}'
+    with app.app_context():
+        conn = webapp.get_db_connection()
+        try:
+            user_id = conn.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone()[0]
+            imdb_id, title = conn.execute(
+                'SELECT imdb_id, title FROM movies ORDER BY id DESC LIMIT 1'
+            ).fetchone()
+            person = conn.execute('SELECT name FROM people ORDER BY id LIMIT 1').fetchone()[0]
+        finally:
+            conn.close()
+
+    def search():
+        with app.test_request_context('/search'):
+            conn = webapp.get_db_connection()
+            try:
+                title_resolver.resolve(conn, title, lambda query: None)
+                title_resolver.resolve(conn, 'no such movie anywhere', lambda query: None)
+                conn.commit()
+            finally:
+                conn.close()
+            webapp.record_search(user_id, title, imdb_id)
+
+    def paged(route):
+        first = client.get(route).get_json() or {}
+        if first.get('next_cursor'):
+            client.get(f"{route}{'&' if '?' in route else '?'}cursor={first['next_cursor']}")
+        return first
+
+    steps = [
+        ('POST /register', lambda: client.post('/register', data={
+            'username': new_user, 'password': BENCH_PASSWORD, 'confirm_password': BENCH_PASSWORD})),
+        ('POST /login', lambda: client.post('/login', data={'username': username, 'password': BENCH_PASSWORD})),
+        ('GET /search', search),
+        ('GET /api/history', lambda: paged('/api/history')),
+        ('POST /add_favorite', lambda: client.post('/add_favorite', json={'movie_id': imdb_id, 'movie_title': title})),
+        ('GET /check_favorite', lambda: client.get(f'/check_favorite/{imdb_id}')),
+        ('GET /api/favorites', lambda: paged('/api/favorites')),
+        ('POST /remove_favorite', lambda: client.post('/remove_favorite', json={'movie_id': imdb_id})),
+        ('GET /for_you', lambda: client.get('/for_you')),
+        ('GET /discover', lambda: paged('/discover')),
+        ('GET /discover?genre', lambda: paged('/discover?genre=Drama&genre=Thriller&sort=year')),
+        ('GET /discover?language', lambda: paged('/discover?language=French&min_rating=7')),
+        ('GET /discover?person', lambda: paged(f'/discover?person={person}&sort=votes')),
+        ('GET /discover?runtime', lambda: paged('/discover?max_runtime=100&sort=runtime&order=asc')),
+        ('GET /import_watchlist/<id>', lambda: client.get('/import_watchlist/unknown-job')),
+    ]
+    for route, step in steps:
+        capture.route = route
+        response = step()
+        if response is not None and getattr(response, 'status_code', 200) >= 500:
+            print(f"⚠️  {route} returned {response.status_code}")
+    capture.route = None
+
+    conn = sqlite3.connect(app.config['DATABASE_PATH'])
+    try:
+        with conn:
+            conn.execute('DELETE FROM users WHERE username = ?', (new_user,))
+    finally:
+        conn.close()
+
+
+def capture_workload(app, username):
+    """Distinct statements from a second workload pass (the first warms caches and creates shard schemas)"""
+    import tracing
+
+    run_workload(app, username, StatementCapture())
+    capture = StatementCapture()
+    with tracing.recording_statements(capture):
+        run_workload(app, username, capture)
+    return list(capture.statements.values())
+
+
+# Query plans
+def query_plan(conn, statement):
+    """EXPLAIN QUERY PLAN lines, indented by depth"""
+    rows = conn.execute(f'EXPLAIN QUERY PLAN {statement.sql}', statement.params or ()).fetchall()
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node_id] + detail)
+    return lines
+
+
+def _aliases(sql):
+    """{name used in plans: table} for the tables a statement reads"""
+    aliases = {}
+    for table, alias in re.findall(r'\b(?:FROM|JOIN|UPDATE|INTO)\s+(?:\w+\.)?(\w+)(?:\s+(?:AS\s+)?(\w+))?', sql, re.I):
+        aliases[table] = table
+        if alias and alias.upper() not in ('WHERE', 'ON', 'SET', 'LEFT', 'JOIN', 'INNER', 'ORDER', 'GROUP',
+                                           'LIMIT', 'VALUES', 'SELECT', 'USING', 'AS', 'DEFAULT'):
+            aliases[alias] = table
+    return aliases
+
+
+def _columns(conn, table):
+    try:
+        return [row[1] for row in conn.execute(f'PRAGMA table_info({quote_identifier(table)})')]
+    except sqlite3.Error:
+        return []
+
+
+def _referenced(sql, columns):
+    return [column for column in columns if re.search(rf'(?<![\w.]){column}\b|\.{column}\b', sql)]
+
+
+def suggest_index(conn, table, sql, prefix=(), cover=True):
+    """CREATE INDEX for the statement's use of table: filtered columns, then sort columns, then (cover) the rest"""
+    columns = _columns(conn, table)
+    referenced = _referenced(sql, columns)
+    filtered = [column for column in columns
+                if re.search(rf'\b{column}\s*(=|<|>|IN\b|IS\b|BETWEEN\b)', sql, re.I)]
+    order_by = re.search(r'ORDER BY (.*?)(?: LIMIT|$)', sql, re.I)
+    ordered = [column for column in columns if order_by and re.search(rf'\b{column}\b', order_by.group(1))]
+    key = list(prefix)
+    for column in [*filtered, *ordered, *(referenced if cover else ())]:
+        if column not in key and column != 'id':
+            key.append(column)
+    if not key or len(key) > 5:
+        return None
+    return f"CREATE INDEX idx_{table}_{'_'.join(key[:3])} ON {table} ({', '.join(key)});"
+
+
+def _unique_lookup(conn, table, index, detail):
+    """True when the search pins every column of a unique index, i.e. reads at most one row"""
+    unique = {row[1]: row[2] for row in conn.execute(f'PRAGMA index_list({quote_identifier(table)})')}
+    if not unique.get(index):
+        return False
+    columns = [row[2] for row in conn.execute(f'PRAGMA index_info({quote_identifier(index)})')]
+    return all(f'{column}=?' in detail for column in columns)
+
+
+def review_plan(conn, statement, plan):
+    """[(level, message)] findings for one plan; level is '❌', '⚠️ ' or '💡'"""
+    findings = []
+    aliases = _aliases(statement.sql)
+    for line in plan:
+        detail = line.strip()
+        scan = re.match(r'SCAN (\w+)(?: USING (COVERING )?INDEX (\w+))?', detail)
+        search = re.match(r'SEARCH (\w+) USING (COVERING )?INDEX (\w+)', detail)
+        if scan and detail.startswith('SCAN CONSTANT ROW'):
+            continue
+        if scan and not scan.group(3):
+            table = aliases.get(scan.group(1), scan.group(1))
+            findings.append(('❌', f'full table scan of {table}'))
+            suggestion = suggest_index(conn, table, statement.sql)
+            if suggestion:
+                findings.append(('💡', suggestion))
+        elif scan:
+            findings.append(('⚠️ ', f'reads all of index {scan.group(3)} ({detail})'))
+        elif search:
+            table = aliases.get(search.group(1), search.group(1))
+            constraint = re.search(r'\((.*)\)', detail)
+            used = set(re.findall(r'(\w+)[=<>]', constraint.group(1))) if constraint else set()
+            # Under an alias only alias.column counts; otherwise the column may be another table's
+            qualifier = rf'\b{search.group(1)}\.' if search.group(1) != table else r'(?<![\w.])'
+            unused = [column for column in _columns(conn, table) if column not in used
+                      and re.search(rf'{qualifier}{column}\s*=\s*\?', statement.sql)]
+            if unused and not _unique_lookup(conn, table, search.group(3), detail):
+                findings.append(('⚠️ ', f'{search.group(3)} narrows {table} by {", ".join(sorted(used))} only; '
+                                        f'{", ".join(unused)} is checked row by row'))
+                suggestion = suggest_index(conn, table, statement.sql, [*sorted(used), *unused], cover=False)
+                if suggestion:
+                    findings.append(('💡', suggestion))
+            elif not search.group(2) and not search.group(3).startswith('sqlite_autoindex'):
+                index_columns = [row[2] for row in conn.execute(f'PRAGMA index_info({quote_identifier(search.group(3))})')]
+                missing = [c for c in _referenced(statement.sql, _columns(conn, table))
+                           if c not in index_columns and c != 'id']
+                suggestion = suggest_index(conn, table, statement.sql, index_columns) if 0 < len(missing) <= 3 else None
+                if suggestion:
+                    findings.append(('⚠️ ', f'{search.group(3)} does not cover {", ".join(missing)}: '
+                                            f'each match also reads the {table} row'))
+                    findings.append(('💡', suggestion))
+        if 'AUTOMATIC' in detail:
+            findings.append(('❌', f'SQLite builds a temporary index on every run ({detail})'))
+        if 'USE TEMP B-TREE' in detail:
+            findings.append(('⚠️ ', f'sorts in a temporary b-tree ({detail})'))
+    return findings
+
+
+def _shorten(text, width):
+    return text if len(text) <= width else text[:width - 1] + '…'
+
+
+def print_plans(db_dir, statements):
+    print("🔎 Query plans")
+    print("=" * 70)
+    flagged = 0
+    for number, statement in enumerate(statements, 1):
+        conn = sqlite3.connect(os.path.join(db_dir, statement.db_name))
+        try:
+            for sql, params in statement.setup:
+                conn.execute(sql, params or ())
+            plan = query_plan(conn, statement)
+            findings = review_plan(conn, statement, plan)
+        except sqlite3.Error as e:
+            plan, findings = [], [('❌', f'could not plan: {e}')]
+        finally:
+            conn.close()
+        flagged += any(level != '💡' for level, _ in findings)
+        print(f"\n[{number}] {', '.join(statement.routes)} — {statement.db_name}")
+        print(f"    {_shorten(statement.sql, 300)}")
+        for line in plan:
+            print(f"      {line}")
+        for level, message in findings:
+            print(f"    {level} {message}")
+    print(f"\n{flagged} of {len(statements)} statements have plan findings")
+
+
+# Benchmark
+def replay(db_dir, statement, repeat):
+    """Sorted run times (ms) of one statement, each run rolled back so writes leave no trace"""
+    conn = sqlite3.connect(os.path.join(db_dir, statement.db_name), isolation_level=None)
+    try:
+        for sql, params in statement.setup:
+            conn.execute(sql, params or ())
+        timings = []
+        for run in range(repeat + 1):
+            conn.execute('BEGIN')
+            try:
+                started = time.perf_counter()
+                conn.execute(statement.sql, statement.params or ()).fetchall()
+                if run:  # the first run only warms the page cache
+                    timings.append((time.perf_counter() - started) * 1000)
+            finally:
+                conn.execute('ROLLBACK')
+        return sorted(timings)
+    finally:
+        conn.close()
+
+
+def benchmark(db_dir, statements, repeat):
+    """{(db_name, sql): (p50, p95) or error string}"""
+    results = {}
+    for statement in statements:
+        key = (statement.db_name, statement.sql)
+        try:
+            timings = replay(db_dir, statement, repeat)
+            results[key] = (statistics.median(timings), timings[min(len(timings) - 1, int(len(timings) * 0.95))])
+        except sqlite3.Error as e:
+            results[key] = str(e)
+    return results
+
+
+def _print_table(rows, headers):
+    if tabulate is not None:
+        print(tabulate(rows, headers=headers, tablefmt='simple'))
+        return
+    widths = [max(len(str(cell)) for cell in column) for column in zip(headers, *rows)]
+    for row in [headers, ['-' * width for width in widths], *rows]:
+        print('  '.join(f'{str(cell):<{width}}' for cell, width in zip(row, widths)))
+
+
+def print_scaling(scales, statements, results):
+    """One row per statement: p50 at every scale, flagged when it grows with the data"""
+    print("\n📈 Statement timings (p50 / p95 ms)")
+    print("=" * 70)
+    rows = []
+    for number, statement in enumerate(statements, 1):
+        key = (statement.db_name, statement.sql)
+        cells = []
+        medians = []
+        for users, _ in scales:
+            result = results[users].get(key)
+            if isinstance(result, tuple):
+                cells.append(f'{result[0]:.2f} / {result[1]:.2f}')
+                medians.append(result[0])
+            else:
+                cells.append('n/a' if result is None else _shorten(f'error: {result}', 30))
+        flag = ''
+        if len(medians) == len(scales) > 1 and medians[-1] >= MIN_FLAGGED_MS:
+            growth = medians[-1] / max(medians[0], 0.01)
+            data_growth = scales[-1][0] / scales[0][0]
+            if growth >= data_growth * SCALE_FLAG_RATIO:
+                flag = f'❌ ×{growth:.0f}'
+            elif growth >= 3:
+                flag = f'⚠️  ×{growth:.1f}'
+        rows.append([number, _shorten(statement.routes[0], 24), _shorten(statement.sql, 60), *cells, flag])
+    _print_table(rows, ['#', 'route', 'statement', *[f'{users} users' for users, _ in scales], 'growth'])
+    print(f"\n❌ marks statements whose time grows about as fast as the data (×{SCALE_FLAG_RATIO:g} or more of it)")
+
+
+# Sizes of the real database
+def migration_status(conn):
+    """(applied, known) migrations; the app applies the rest when it next starts"""
+    from app import MIGRATIONS
+    return conn.execute('PRAGMA user_version').fetchone()[0], len(MIGRATIONS)
+
+
+def storage_report(conn):
+    """Per b-tree: kind, table, pages, bytes, fill and fragmentation, from the dbstat virtual table.
+
+    Fill is the used share of each page; fragmentation is the share of
+    consecutive leaf pages (in key order) that are not adjacent in the file,
+    i.e. range reads that turn into seeks. VACUUM rewrites both.
+    """
+    kinds = {row[0]: (row[1], row[2]) for row in conn.execute(
+        "SELECT name, type, tbl_name FROM sqlite_master WHERE type IN ('table', 'index')"
+    )}
+    report = {}
+    previous = {}
+    for name, pageno, pagetype, ncell, unused, pgsize in conn.execute(
+        'SELECT name, pageno, pagetype, ncell, unused, pgsize FROM dbstat ORDER BY name, path'
+    ):
+        entry = report.setdefault(name, {'pages': 0, 'bytes': 0, 'unused': 0, 'cells': 0, 'leaves': 0, 'jumps': 0})
+        entry['pages'] += 1
+        entry['bytes'] += pgsize
+        entry['unused'] += unused
+        if pagetype == 'leaf' or (pagetype == 'internal' and kinds.get(name, ('',))[0] == 'index'):
+            entry['cells'] += ncell  # index entries live in interior pages too
+        if pagetype == 'leaf':
+            entry['leaves'] += 1
+            if name in previous and pageno != previous[name] + 1:
+                entry['jumps'] += 1
+            previous[name] = pageno
+    rows = []
+    for name, entry in sorted(report.items(), key=lambda item: -item[1]['bytes']):
+        kind, table = kinds.get(name, ('internal', name))
+        fill = 1 - entry['unused'] / entry['bytes'] if entry['bytes'] else 0
+        fragmentation = entry['jumps'] / (entry['leaves'] - 1) if entry['leaves'] > 1 else 0
+        rows.append([name, kind, table, entry['cells'], entry['pages'], entry['bytes'] // 1024,
+                     f'{fill:.0%}', f'{fragmentation:.0%}'])
+    return rows
+
+
+def print_sizes(db_path):
+    if not os.path.exists(db_path):
+        print("❌ Database file not found!")
+        return
+    print(f"🗂️  Storage report: {db_path}")
+    print("=" * 70)
+    conn = open_readonly(db_path)
+    try:
+        applied, known = migration_status(conn)
+        if applied < known:
+            print(f"⚠️  Schema is at migration {applied} of {known}: the missing indexes and tables "
+                  "are created the next time the app starts")
+        page_size, page_count, freelist = (conn.execute(f'PRAGMA {name}').fetchone()[0]
+                                           for name in ('page_size', 'page_count', 'freelist_count'))
+        vacuum_mode = ('none', 'full', 'incremental')[conn.execute('PRAGMA auto_vacuum').fetchone()[0]]
+        print(f"Pages: {page_count} × {page_size} bytes, {freelist} free "
+              f"({freelist / max(page_count, 1):.0%}), auto_vacuum={vacuum_mode}")
+
+        print("\n🔗 Indexes per table:")
+        for table in list_tables(conn.cursor()):
+            indexes = [row[1] for row in conn.execute(f'PRAGMA index_list({quote_identifier(table)})')]
+            print(f"  - {table}: {', '.join(indexes) if indexes else '(none)'}")
+
+        print()
+        try:
+            _print_table(storage_report(conn),
+                         ['b-tree', 'type', 'table', 'entries', 'pages', 'KiB', 'fill', 'fragmented'])
+        except sqlite3.OperationalError as e:
+            print(f"⚠️  Per-table sizes need SQLite built with the dbstat virtual table ({e})")
+    finally:
+        conn.close()
+    if freelist > page_count * 0.2:
+        print("\n💡 Over 20% of the file is free pages: `python retention.py run` reclaims them incrementally")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query plans, storage and scaling report for the CineScope schema")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    sizes = sub.add_parser('sizes', help="table/index sizes, page fill and fragmentation of a database")
+    sizes.add_argument('--db', default=Config.DATABASE_PATH)
+
+    for name, help_text in (('explain', "EXPLAIN QUERY PLAN of every statement the request paths issue"),
+                            ('bench', "time those statements on synthetic data at several scales")):
+        command = sub.add_parser(name, help=help_text)
+        command.add_argument('--users', type=int, default=1000, help="synthetic users at scale 1")
+        command.add_argument('--searches', type=int, default=50, help="searches per user (average)")
+        command.add_argument('--favorites', type=int, default=10, help="favorites per user (average)")
+        command.add_argument('--movies', type=int, default=20000, help="movies in the index (same at every scale)")
+        command.add_argument('--shards', type=int, default=Config.USER_DATA_SHARDS)
+        command.add_argument('--keep', metavar='DIR', help="build the datasets in DIR and keep them")
+    sub.choices['bench'].add_argument('--scale', type=int, nargs='+', default=[1, 10, 100])
+    sub.choices['bench'].add_argument('--repeat', type=int, default=50, help="runs per statement")
+    args = parser.parse_args()
+
+    if args.command == 'sizes':
+        print_sizes(args.db)
+        return
+
+    root = args.keep or tempfile.mkdtemp(prefix='db_advisor_')
+    os.makedirs(root, exist_ok=True)
+    try:
+        started = time.perf_counter()
+        base_dir = os.path.join(root, 'base')
+        os.makedirs(base_dir, exist_ok=True)
+        build_base(os.path.join(base_dir, 'cineScope.db'), args.shards, args.movies)
+        print(f"📦 Movie index with {args.movies} movies built in {time.perf_counter() - started:.1f}s")
+
+        scales = [(args.users * factor, factor) for factor in (args.scale if args.command == 'bench' else [1])]
+        statements = None
+        results = {}
+        for users, factor in scales:
+            scale_dir = os.path.join(root, f'x{factor}')
+            shutil.rmtree(scale_dir, ignore_errors=True)
+            shutil.copytree(base_dir, scale_dir)
+            db_path = os.path.join(scale_dir, 'cineScope.db')
+            app = make_app(db_path, args.shards)
+            started = time.perf_counter()
+            print(f"\n📦 ×{factor}: {users} users, ~{users * args.searches} searches, ~{users * args.favorites} favorites")
+            username = populate(app, users, args.searches, args.favorites)
+            print(f"   built in {time.perf_counter() - started:.1f}s; workload runs as {username} (90th percentile)")
+            captured = capture_workload(app, username)
+            if statements is None:
+                statements = captured
+                print(f"   captured {len(statements)} distinct statements")
+            if args.command == 'bench':
+                results[users] = benchmark(scale_dir, captured, args.repeat)
+            last_dir = scale_dir
+
+        print()
+        print_plans(last_dir, statements)
+        if args.command == 'bench':
+            print_scaling(scales, statements, results)
+        print()
+        print_sizes(os.path.join(last_dir, 'cineScope.db'))
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
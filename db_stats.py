@@ -0,0 +1,402 @@
+import argparse
+import atexit
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from functools import partial
+
+from flask import has_request_context, request
+
+import tracing
+
+# Upper bounds (ms) of the latency histogram kept per statement; one more bucket holds the rest
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+MAX_STATEMENTS = 2000  # distinct statements tracked per process; the rest are counted as OTHER
+OTHER = '(other statements)'
+NORMALIZE_CACHE_SIZE = 4096
+SLOW_LOG_TAIL_BYTES = 256 * 1024  # read from the end of the slow-query log for the admin page
+SORT_KEYS = ('total_ms', 'mean_ms', 'p95_ms', 'max_ms', 'lock_wait_ms', 'calls', 'errors', 'slow')
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\bX'[0-9A-Fa-f]*'|(?<![\w.])-?\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_normalized = {}
+
+_collector = None
+
+
+def normalize_sql(sql):
+    """SQL with whitespace collapsed and literals replaced by ?, so one query shape is one entry"""
+    text = _normalized.get(sql)
+    if text is None:
+        text = _IN_LISTS.sub('(?, ...)', _LITERALS.sub('?', ' '.join(sql.split())))
+        if len(_normalized) >= NORMALIZE_CACHE_SIZE:
+            _normalized.clear()
+        _normalized[sql] = text
+    return text
+
+
+def _is_busy(error):
+    return getattr(error, 'sqlite_errorcode', None) in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED) \
+        or str(error).startswith('database is locked')
+
+
+class StatementStats:
+    __slots__ = ('calls', 'errors', 'slow', 'total_ms', 'max_ms', 'lock_wait_ms', 'lock_waits', 'buckets')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.slow = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.lock_wait_ms = 0.0
+        self.lock_waits = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def add(self, elapsed_ms, lock_wait_ms, failed, slow):
+        self.calls += 1
+        self.errors += failed
+        self.slow += slow
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        if lock_wait_ms:
+            self.lock_wait_ms += lock_wait_ms
+            self.lock_waits += 1
+        index = 0
+        while index < len(LATENCY_BUCKETS_MS) and elapsed_ms > LATENCY_BUCKETS_MS[index]:
+            index += 1
+        self.buckets[index] += 1
+
+
+def percentile(buckets, fraction):
+    """Upper bound (ms) of the histogram bucket holding the given fraction of calls"""
+    wanted = sum(buckets) * fraction
+    seen = 0
+    for index, count in enumerate(buckets):
+        seen += count
+        if count and seen >= wanted:
+            return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else None
+    return None
+
+
+class StatsCollector:
+    """Per-process statement statistics, merged across workers into one SQLite file.
+
+    Every statement run through a StatsConnection is timed and added to an
+    in-memory entry for its normalized SQL. Every flush_interval seconds
+    (and at exit) a worker adds what it collected since its last flush to
+    the shared file, so the admin page sees all workers. Statements slower
+    than slow_ms are also appended to the slow-query log as they happen,
+    with the route (or background thread) that ran them.
+    """
+
+    def __init__(self, path, flush_interval, slow_ms, slow_log):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.slow_ms = slow_ms
+        self.slow_log = slow_log
+        self._pending = {}  # (db_name, sql) -> StatementStats since the last flush
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flushed_at = time.time()
+        atexit.register(self.flush)
+
+    def record(self, db_name, sql, elapsed_ms, lock_wait_ms, failed):
+        text = normalize_sql(sql)
+        slow = elapsed_ms >= self.slow_ms
+        with self._lock:
+            key = (db_name, text)
+            stats = self._pending.get(key)
+            if stats is None:
+                if len(self._pending) >= MAX_STATEMENTS:
+                    key = (db_name, OTHER)
+                    stats = self._pending.get(key)
+                if stats is None:
+                    stats = self._pending[key] = StatementStats()
+            stats.add(elapsed_ms, lock_wait_ms, failed, slow)
+        if slow:
+            self._log_slow(db_name, text, elapsed_ms, lock_wait_ms, failed)
+        if time.time() - self._flushed_at >= self.flush_interval:
+            self.flush(blocking=False)
+
+    def _log_slow(self, db_name, sql, elapsed_ms, lock_wait_ms, failed):
+        if has_request_context():
+            rule = request.url_rule.rule if request.url_rule is not None else request.path
+            route = f"{request.method} {rule}"
+        else:
+            route = threading.current_thread().name
+        span = tracing.current_span()
+        entry = {
+            'time': round(time.time(), 3), 'pid': os.getpid(), 'route': route, 'db': db_name,
+            'duration_ms': round(elapsed_ms, 2), 'lock_wait_ms': round(lock_wait_ms, 2),
+            'failed': bool(failed), 'sql': sql[:2000], 'trace_id': span.trace_id if span is not None else None
+        }
+        try:
+            # One O_APPEND write per entry, so lines from several workers don't interleave
+            fd = os.open(self.slow_log, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, (json.dumps(entry) + '\n').encode('utf-8'))
+            finally:
+                os.close(fd)
+        except OSError as e:
+            print(f"Slow query log error: {e}")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS statement_stats (
+                db_name TEXT NOT NULL,
+                sql TEXT NOT NULL,
+                calls INTEGER NOT NULL,
+                errors INTEGER NOT NULL,
+                slow INTEGER NOT NULL,
+                total_ms REAL NOT NULL,
+                max_ms REAL NOT NULL,
+                lock_wait_ms REAL NOT NULL,
+                lock_waits INTEGER NOT NULL,
+                buckets TEXT NOT NULL,
+                first_seen REAL NOT NULL,
+                last_seen REAL NOT NULL,
+                PRIMARY KEY (db_name, sql)
+            ) WITHOUT ROWID
+        ''')
+        return conn
+
+    def flush(self, blocking=True):
+        """Add this process's statistics since the last flush to the shared file"""
+        if not self._flush_lock.acquire(blocking=blocking):
+            return  # another thread is already flushing
+        try:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._flushed_at = time.time()
+            if not pending:
+                return
+            now = time.time()
+            conn = self._connect()
+            try:
+                with conn:
+                    # Take the write lock before reading: a deferred transaction lets two
+                    # workers read the same buckets and the second write drops the first
+                    conn.execute('BEGIN IMMEDIATE')
+                    existing = {
+                        (row[0], row[1]): json.loads(row[2]) for row in conn.execute(
+                            'SELECT db_name, sql, buckets FROM statement_stats'
+                        )
+                    }
+                    for (db_name, sql), stats in pending.items():
+                        buckets = existing.get((db_name, sql))
+                        if buckets is not None and len(buckets) == len(stats.buckets):
+                            stats.buckets = [a + b for a, b in zip(buckets, stats.buckets)]
+                        conn.execute(
+                            'INSERT INTO statement_stats (db_name, sql, calls, errors, slow, total_ms, max_ms, '
+                            'lock_wait_ms, lock_waits, buckets, first_seen, last_seen) '
+                            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(db_name, sql) DO UPDATE SET '
+                            'calls = calls + excluded.calls, errors = errors + excluded.errors, '
+                            'slow = slow + excluded.slow, total_ms = total_ms + excluded.total_ms, '
+                            'max_ms = MAX(max_ms, excluded.max_ms), lock_wait_ms = lock_wait_ms + excluded.lock_wait_ms, '
+                            'lock_waits = lock_waits + excluded.lock_waits, buckets = excluded.buckets, '
+                            'last_seen = excluded.last_seen',
+                            (db_name, sql, stats.calls, stats.errors, stats.slow, stats.total_ms, stats.max_ms,
+                             stats.lock_wait_ms, stats.lock_waits, json.dumps(stats.buckets), now, now)
+                        )
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Statement stats flush error: {e}")
+        finally:
+            self._flush_lock.release()
+
+    def report(self, sort='total_ms', limit=50):
+        """Statistics of every worker (this one flushed first), heaviest first by sort"""
+        self.flush()
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                'SELECT db_name, sql, calls, errors, slow, total_ms, max_ms, lock_wait_ms, lock_waits, buckets, '
+                'first_seen, last_seen FROM statement_stats'
+            ).fetchall()
+        finally:
+            conn.close()
+        statements = []
+        for (db_name, sql, calls, errors, slow, total_ms, max_ms, lock_wait_ms, lock_waits, buckets,
+             first_seen, last_seen) in rows:
+            buckets = json.loads(buckets)
+            statements.append({
+                'db': db_name, 'sql': sql, 'calls': calls, 'errors': errors, 'slow': slow,
+                'total_ms': round(total_ms, 2), 'mean_ms': round(total_ms / calls, 3) if calls else 0,
+                'p50_ms': percentile(buckets, 0.5), 'p95_ms': percentile(buckets, 0.95),
+                'max_ms': round(max_ms, 2), 'lock_wait_ms': round(lock_wait_ms, 2), 'lock_waits': lock_waits,
+                'first_seen': first_seen, 'last_seen': last_seen
+            })
+        # A percentile of None lies beyond the last bucket: slower than any bounded one
+        statements.sort(key=lambda item: float('inf') if item[sort] is None else item[sort], reverse=True)
+        return statements[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._pending = {}
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('DELETE FROM statement_stats')
+        finally:
+            conn.close()
+
+
+def read_slow_log(path, limit=50):
+    """The most recent slow-query log entries, newest first"""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - SLOW_LOG_TAIL_BYTES))
+            lines = f.read().decode('utf-8', errors='replace').splitlines()
+    except FileNotFoundError:
+        return []
+    if size > SLOW_LOG_TAIL_BYTES:
+        lines = lines[1:]  # probably cut in the middle
+    entries = []
+    for line in reversed(lines):
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            continue
+        if len(entries) >= limit:
+            break
+    return entries
+
+
+class StatsConnection(tracing.TracedConnection):
+    """TracedConnection that times every statement and measures how long it waited for a lock.
+
+    SQLite's busy handler sleeps inside the statement, where the wait can't
+    be told apart from the work. So the connection runs with busy_timeout 0:
+    a statement that finds the database locked fails at once without having
+    changed anything, and is run again under the connection's real timeout,
+    the time of that second run being the lock wait. A batch that has already
+    written rows when it meets a lock is not run again; the error propagates.
+    """
+
+    def __init__(self, database, timeout=5.0, *args, **kwargs):
+        super().__init__(database, timeout, *args, **kwargs)
+        self._busy_timeout_ms = int(timeout * 1000)
+        sqlite3.Connection.execute(self, 'PRAGMA busy_timeout = 0')
+
+    def _set_busy_timeout(self, ms):
+        sqlite3.Connection.execute(self, f'PRAGMA busy_timeout = {int(ms)}')
+
+    def _measured(self, run, sql, *args):
+        collector = _collector
+        started = time.perf_counter()
+        lock_wait = 0.0
+        failed = True
+        try:
+            changes = self.total_changes
+            try:
+                result = run(sql, *args)
+            except sqlite3.OperationalError as e:
+                if not _is_busy(e) or self.total_changes != changes:
+                    raise
+                waiting = time.perf_counter()
+                self._set_busy_timeout(self._busy_timeout_ms)
+                try:
+                    result = run(sql, *args)
+                finally:
+                    self._set_busy_timeout(0)
+                    lock_wait = time.perf_counter() - waiting
+            failed = False
+            return result
+        finally:
+            if collector is not None:
+                collector.record(self.db_name, sql, (time.perf_counter() - started) * 1000, lock_wait * 1000, failed)
+
+    def execute(self, sql, *args):
+        return self._traced(partial(self._measured, super(tracing.TracedConnection, self).execute), sql, *args)
+
+    def executemany(self, sql, params, *args):
+        if not isinstance(params, (list, tuple)):
+            params = list(params)  # a generator can't be replayed if the first run meets a lock
+        return self._traced(partial(self._measured, super(tracing.TracedConnection, self).executemany),
+                            sql, params, *args)
+
+    def executescript(self, sql):
+        # Several statements: rerunning after a partial failure isn't safe, so wait the usual way
+        self._set_busy_timeout(self._busy_timeout_ms)
+        try:
+            return super().executescript(sql)
+        finally:
+            self._set_busy_timeout(0)
+
+    def commit(self):
+        return self._measured(lambda sql: tracing.TracedConnection.commit(self), 'COMMIT')
+
+    def __exit__(self, exc_type, exc, tb):
+        # sqlite3's own __exit__ commits in C, around the lock-wait handling above
+        if exc_type is None:
+            try:
+                self.commit()
+            except Exception:
+                self.rollback()
+                raise
+        else:
+            self.rollback()
+        return False
+
+
+def connection_factory():
+    """sqlite3.connect factory for app connections: StatsConnection when statistics are on"""
+    return StatsConnection if _collector is not None else tracing.TracedConnection
+
+
+def get_collector():
+    return _collector
+
+
+def init_app(app):
+    global _collector
+    if not app.config['DB_STATS']:
+        _collector = None
+        return
+    _collector = StatsCollector(
+        app.config['DB_STATS_PATH'],
+        app.config['DB_STATS_FLUSH_INTERVAL'],
+        app.config['DB_SLOW_QUERY_MS'],
+        app.config['DB_SLOW_QUERY_LOG']
+    )
+
+
+def _print_report(statements):
+    for item in statements:
+        p95 = f"{item['p95_ms']}" if item['p95_ms'] is not None else '>5000'
+        print(f"{item['total_ms']:>12.1f} ms  {item['calls']:>9} calls  mean {item['mean_ms']:>8.3f}  "
+              f"p95 ≤{p95:>6}  lock {item['lock_wait_ms']:>9.1f} ms ({item['lock_waits']})  [{item['db']}]")
+        print(f"    {item['sql'][:200]}")
+
+
+if __name__ == '__main__':
+    from config import Config
+
+    parser = argparse.ArgumentParser(description='Show the SQLite statement statistics and slow-query log')
+    parser.add_argument('command', choices=['show', 'slow', 'reset'])
+    parser.add_argument('--path', default=Config.DB_STATS_PATH)
+    parser.add_argument('--log', default=Config.DB_SLOW_QUERY_LOG)
+    parser.add_argument('--sort', choices=SORT_KEYS, default='total_ms')
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    collector = StatsCollector(args.path, Config.DB_STATS_FLUSH_INTERVAL, Config.DB_SLOW_QUERY_MS, args.log)
+    if args.command == 'show':
+        _print_report(collector.report(args.sort, args.limit))
+    elif args.command == 'slow':
+        for entry in read_slow_log(args.log, args.limit):
+            when = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry['time']))
+            print(f"{when}  {entry['duration_ms']:>9.1f} ms (lock {entry['lock_wait_ms']} ms)  {entry['route']}  [{entry['db']}]")
+            print(f"    {entry['sql'][:200]}")
+    else:
+        collector.reset()
+        print("✅ Statement statistics cleared")
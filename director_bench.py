@@ -0,0 +1,263 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from config import Config
+from title_resolver import normalize_query
+
+# Replays need recorded model responses, which aren't committed (they're tied to
+# one model and prompt, and recording spends OpenRouter credit). Record once per
+# model/prompt change, then replay as often as you like without network access:
+#   OPENROUTER_API_KEY=... python director_bench.py record [--model M]
+#   python director_bench.py run [--model M]
+DEFAULT_CORPUS = os.path.join('benchmarks', 'director_corpus.jsonl')
+DEFAULT_RECORDINGS = os.path.join('benchmarks', 'director_recordings.jsonl')
+DESCRIPTION_RE = re.compile(r'User\'s description: "(.*?)"\n', re.DOTALL)
+
+
+def read_jsonl(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def recording_key(model, description):
+    return model, normalize_query(description)
+
+
+def prompt_fingerprint(messages):
+    """Hash of the prompt with the description blanked out, to spot stale recordings"""
+    text = json.dumps(messages, sort_keys=True)
+    return hashlib.sha256(DESCRIPTION_RE.sub('', text).encode('utf-8')).hexdigest()[:12]
+
+
+class OpenRouterStandIn:
+    """Local HTTP server speaking enough of the chat completions API for the benchmark.
+
+    Replay mode answers from recorded responses (sleeping for the recorded
+    latency times latency_scale) and returns 404 for anything unrecorded.
+    With upstream_url set it forwards to the real API instead and appends
+    every exchange to the recordings file.
+    """
+
+    def __init__(self, recordings_path, upstream_url=None, latency_scale=1.0):
+        self.recordings_path = recordings_path
+        self.upstream_url = upstream_url
+        self.latency_scale = latency_scale
+        self.recordings = {}
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        if os.path.exists(recordings_path):
+            for entry in read_jsonl(recordings_path):
+                self.recordings[recording_key(entry['model'], entry['description'])] = entry
+        self._server = None
+
+    def start(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                status, body = standin.handle(payload, self.headers.get('Authorization'))
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self._server.server_port}/api/v1/chat/completions"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def handle(self, payload, authorization):
+        messages = payload.get('messages', [])
+        match = DESCRIPTION_RE.search(messages[-1]['content'] if messages else '')
+        description = match.group(1) if match else ''
+        model = payload.get('model', '')
+        fingerprint = prompt_fingerprint(messages)
+
+        if self.upstream_url:
+            start = time.perf_counter()
+            response = requests.post(self.upstream_url, json=payload, timeout=60,
+                                     headers={'Authorization': authorization or '', 'Content-Type': 'application/json'})
+            entry = {
+                'model': model,
+                'description': description,
+                'prompt': fingerprint,
+                'latency_ms': round((time.perf_counter() - start) * 1000, 1),
+                'status': response.status_code,
+                'response': response.json(),
+            }
+            with self._lock:
+                self.recordings[recording_key(model, description)] = entry
+                with open(self.recordings_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry) + '\n')
+                self.stats['recorded'] += 1
+            return entry['status'], entry['response']
+
+        entry = self.recordings.get(recording_key(model, description))
+        with self._lock:
+            if entry is None:
+                self.stats['unrecorded'] += 1
+            elif entry.get('prompt') != fingerprint:
+                self.stats['stale_prompt'] += 1
+            else:
+                self.stats['replayed'] += 1
+        if entry is None:
+            return 404, {'error': {'message': f'No recording for model {model!r} and this description'}}
+        time.sleep(entry.get('latency_ms', 0) / 1000 * self.latency_scale)
+        return entry.get('status', 200), entry['response']
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an unsorted list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def run_corpus(app, corpus, concurrency):
+    """Identify every corpus description concurrently; one result dict per item"""
+    from app import identify_movie_from_description
+
+    def identify(item):
+        with app.app_context():
+            start = time.perf_counter()
+            try:
+                result = identify_movie_from_description(item['description'])
+                error = None
+            except Exception as e:
+                result, error = None, str(e)
+            latency_ms = (time.perf_counter() - start) * 1000
+        titles = (result or {}).get('movie_titles') or []
+        expected = normalize_query(item['expected'])
+        ranked = [normalize_query(title) for title in titles]
+        return {
+            'description': item['description'],
+            'expected': item['expected'],
+            'titles': titles,
+            'top1': ranked[:1] == [expected],
+            'top3': expected in ranked[:3],
+            'source': (result or {}).get('source', 'none'),
+            'tokens': ((result or {}).get('usage') or {}).get('total_tokens'),
+            'latency_ms': latency_ms,
+            'error': error,
+        }
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(identify, corpus))
+
+
+def summarize(results, wall_seconds):
+    latencies = [r['latency_ms'] for r in results]
+    tokens = [r['tokens'] for r in results if r['tokens'] is not None]
+    sources = Counter(r['source'] for r in results)
+    total = len(results) or 1
+    return {
+        'requests': len(results),
+        'top1_accuracy': sum(r['top1'] for r in results) / total,
+        'top3_accuracy': sum(r['top3'] for r in results) / total,
+        'p50_ms': percentile(latencies, 50),
+        'p99_ms': percentile(latencies, 99),
+        'tokens_per_request': sum(tokens) / len(tokens) if tokens else None,
+        'fallback_rate': (sources['fallback'] + sources['none']) / total,
+        'sources': dict(sources),
+        'throughput_rps': len(results) / wall_seconds if wall_seconds else 0.0,
+    }
+
+
+def print_report(summary, results, stats, verbose):
+    print(f"🎬 {summary['requests']} descriptions, {summary['throughput_rps']:.1f} req/s")
+    print(f"🎯 Top-1 accuracy: {summary['top1_accuracy']:.1%}   Top-3 accuracy: {summary['top3_accuracy']:.1%}")
+    print(f"⏱️  Latency p50: {summary['p50_ms']:.1f} ms   p99: {summary['p99_ms']:.1f} ms")
+    tokens = summary['tokens_per_request']
+    print(f"🔤 Tokens/request: {f'{tokens:.0f}' if tokens is not None else 'n/a'}")
+    print(f"↩️  Fallback rate: {summary['fallback_rate']:.1%}   sources: {summary['sources']}")
+    if stats:
+        print(f"📼 Stand-in: {dict(stats)}")
+        if stats.get('unrecorded') or stats.get('stale_prompt'):
+            print("⚠️  Some descriptions have no recording for this model/prompt; "
+                  "re-record with `python director_bench.py record`")
+    if verbose:
+        for r in results:
+            mark = '✅' if r['top1'] else ('🟡' if r['top3'] else '❌')
+            print(f"  {mark} {r['expected']!r} -> {r['titles'][:3]} [{r['source']}, {r['latency_ms']:.0f} ms]")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Offline accuracy/latency benchmark for DIRECTOR AI identification')
+    parser.add_argument('command', choices=['run', 'record'],
+                        help='run replays recordings (no network); record calls OpenRouter and saves responses')
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS, help='JSONL of {"description", "expected"}')
+    parser.add_argument('--recordings', default=DEFAULT_RECORDINGS)
+    parser.add_argument('--model', default=Config.OPENROUTER_MODEL)
+    parser.add_argument('--fallback', action='store_true', help='benchmark the keyword fallback instead of the model')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency-scale', type=float, default=1.0,
+                        help='multiply recorded latencies (0 measures only our own overhead)')
+    parser.add_argument('--json', metavar='PATH', help='also write the summary and per-item results as JSON')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    from app import create_app
+
+    corpus = read_jsonl(args.corpus)
+    standin = None
+    # No cache: every description must reach the model (or the stand-in)
+    overrides = {'OPENROUTER_MODEL': args.model, 'PASSWORD_HASH_WORKERS': 0, 'FOR_YOU_BACKGROUND_REFRESH': False,
+                 'CACHE_BACKEND': 'none'}
+    if args.fallback:
+        overrides['OPENROUTER_API_KEY'] = None
+    else:
+        if args.command == 'record' and not Config.OPENROUTER_API_KEY:
+            parser.error('record needs OPENROUTER_API_KEY')
+        if args.command == 'run' and not os.path.exists(args.recordings):
+            parser.error(f'no recordings at {args.recordings}; record them first with '
+                         f'`OPENROUTER_API_KEY=... python director_bench.py record --model {args.model}` '
+                         f'(or benchmark the keyword fallback with --fallback)')
+        standin = OpenRouterStandIn(
+            args.recordings,
+            upstream_url=Config.OPENROUTER_API_URL if args.command == 'record' else None,
+            latency_scale=args.latency_scale
+        )
+        overrides['OPENROUTER_API_URL'] = standin.start()
+        overrides['OPENROUTER_API_KEY'] = Config.OPENROUTER_API_KEY or 'replay'
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Identification never touches the database, but create_app() migrates one
+        app = create_app(DATABASE_PATH=os.path.join(tmp, 'bench.db'), DB_STATS=False, **overrides)
+        try:
+            start = time.perf_counter()
+            results = run_corpus(app, corpus, args.concurrency)
+            summary = summarize(results, time.perf_counter() - start)
+        finally:
+            if standin is not None:
+                standin.stop()
+
+    print_report(summary, results, standin.stats if standin else None, args.verbose)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'model': None if args.fallback else args.model, 'summary': summary, 'results': results}, f, indent=2)
+    if args.command == 'run' and standin is not None and (standin.stats['unrecorded'] or standin.stats['stale_prompt']):
+        sys.exit(1)  # the numbers above measure the fallback, not the model
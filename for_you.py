@@ -0,0 +1,401 @@
+import argparse
+import json
+import os
+import re
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+import catalog_snapshot
+import movie_index
+import posters
+import repository
+import tracing
+from background_tasks import PerProcessExecutor
+from movie_record import MovieRecord
+
+# How much one event adds to the taste profile, and how much each matching feature counts
+FAVORITE_WEIGHT = 3.0
+SEARCH_WEIGHT = 1.0
+FEATURE_WEIGHTS = {'genre': 1.0, 'director': 1.5, 'actor': 0.75}
+ACTORS_PER_MOVIE = 3
+PROFILE_TOP_N = 50  # features kept per kind, so profiles stay small
+RATING_BONUS = 0.5  # added per point of IMDb rating above 6
+
+
+def init_for_you(conn):
+    """Create the profile and feed tables (idempotent)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_taste_profiles (
+            user_id INTEGER PRIMARY KEY,
+            weights TEXT NOT NULL DEFAULT '{}',
+            favorites_hwm INTEGER NOT NULL DEFAULT 0,
+            searches_hwm INTEGER NOT NULL DEFAULT 0,
+            stale INTEGER NOT NULL DEFAULT 1,
+            refreshed_at TIMESTAMP
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_user_taste_profiles_stale ON user_taste_profiles (stale) WHERE stale = 1')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_recommendations (
+            user_id INTEGER NOT NULL,
+            rank INTEGER NOT NULL,
+            imdb_id TEXT NOT NULL,
+            title TEXT NOT NULL,
+            year TEXT,
+            genre TEXT,
+            rating TEXT,
+            reason TEXT,
+            score REAL NOT NULL,
+            PRIMARY KEY (user_id, rank)
+        ) WITHOUT ROWID
+    ''')
+
+
+def add_profile_generation(conn):
+    """Add the counter mark_stale bumps, so a refresh can tell its read went out of date"""
+    conn.execute('ALTER TABLE user_taste_profiles ADD COLUMN generation INTEGER NOT NULL DEFAULT 0')
+
+
+def mark_stale(conn, user_id, rebuild=False):
+    """Flag a user's feed for refresh; rebuild=True refolds the profile from scratch.
+
+    Called in the same transaction as the favorite/search insert that caused it.
+    Every call bumps the profile's generation, which a refresh already under
+    way checks before it writes.
+    """
+    if rebuild:
+        conn.execute(
+            'INSERT INTO user_taste_profiles (user_id) VALUES (?) ON CONFLICT(user_id) DO UPDATE SET '
+            "stale = 1, weights = '{}', favorites_hwm = 0, searches_hwm = 0, generation = generation + 1",
+            (user_id,)
+        )
+    else:
+        conn.execute(
+            'INSERT INTO user_taste_profiles (user_id) VALUES (?) '
+            'ON CONFLICT(user_id) DO UPDATE SET stale = 1, generation = generation + 1',
+            (user_id,)
+        )
+
+
+def fetch_feed(conn, user_id, limit=20):
+    """The stored feed, best first: one range read on the (user_id, rank) primary key"""
+    return conn.execute(
+        'SELECT imdb_id, title, year, genre, rating, reason FROM user_recommendations '
+        'WHERE user_id = ? ORDER BY rank LIMIT ?',
+        (user_id, limit)
+    ).fetchall()
+
+
+def movie_features(record):
+    """(kind, name) pairs describing a MovieRecord"""
+    features = [('genre', g) for g in record.genre_names]
+    features += [('director', d) for d in record.director_names]
+    features += [('actor', a) for a in record.actor_names[:ACTORS_PER_MOVIE]]
+    return features
+
+
+def _omdb_get(params):
+    """An OMDB response through the app's shared helper, or None; detail responses feed the movie index"""
+    from app import omdb_get  # app imports this module
+
+    try:
+        data = omdb_get(**params)
+        if data.get('Response') == 'True':
+            if data.get('imdbID'):
+                posters.remember_poster_source(data['imdbID'], data.get('Poster'))
+                movie_index.remember(data)
+            return data
+    except Exception as e:
+        print(f"OMDB lookup error: {e}")
+    return None
+
+
+def lookup_movie(imdb_id=None, title=None):
+    """OMDB-style movie details from the catalog snapshot, falling back to one OMDB call"""
+    catalog = catalog_snapshot.get_catalog()
+    if catalog is not None:
+        if imdb_id:
+            movie = catalog.get(imdb_id)
+            if movie:
+                return movie
+        elif title:
+            wanted = catalog_snapshot.normalize_title(title)
+            for movie in catalog.prefix_search(title, limit=5):
+                if catalog_snapshot.normalize_title(movie['Title']) == wanted:
+                    return movie
+    if imdb_id:
+        return _omdb_get({'i': imdb_id})
+    if title:
+        return _omdb_get({'t': title, 'type': 'movie'})
+    return None
+
+
+def fold_events(weights, movies, event_weight):
+    """Add each OMDB-style movie's features to weights ({kind: {name: weight}}) in place"""
+    for movie in movies:
+        for kind, name in movie_features(MovieRecord.from_omdb(movie)):
+            bucket = weights.setdefault(kind, {})
+            bucket[name] = bucket.get(name, 0.0) + event_weight
+
+
+def _trim(weights):
+    return {
+        kind: dict(Counter(bucket).most_common(PROFILE_TOP_N))
+        for kind, bucket in weights.items()
+    }
+
+
+def update_profile(conn, user_id):
+    """Fold favorites and searches newer than the user's high-water marks into the profile.
+
+    Only new events cost metadata lookups, so a refresh after one search is
+    one lookup rather than a replay of the whole history. Nothing is
+    written: returns (weights, favorites_hwm, searches_hwm, generation) for
+    refresh_user to store if the profile is still at that generation.
+    """
+    row = conn.execute(
+        'SELECT weights, favorites_hwm, searches_hwm, generation FROM user_taste_profiles WHERE user_id = ?',
+        (user_id,)
+    ).fetchone()
+    weights, favorites_hwm, searches_hwm, generation = (json.loads(row[0]), row[1], row[2], row[3]) if row else ({}, 0, 0, None)
+    conn.commit()  # end the read; the lookups below can take a while
+
+    repo = repository.get_repository()
+    favorites = repo.favorite_events(user_id, favorites_hwm)
+    searches = repo.search_events(user_id, searches_hwm)
+
+    # Repeated searches for the same title count each time but are looked up once
+    search_counts = Counter(re.sub(r'\s+', ' ', title.strip()) for _, title in searches)
+    for title, count in search_counts.items():
+        movie = lookup_movie(title=title)
+        if movie:
+            fold_events(weights, [movie], SEARCH_WEIGHT * count)
+    fold_events(weights, filter(None, (lookup_movie(imdb_id=movie_id) for _, movie_id in favorites)), FAVORITE_WEIGHT)
+
+    if favorites:
+        favorites_hwm = favorites[-1][0]
+    if searches:
+        searches_hwm = searches[-1][0]
+    return _trim(weights), favorites_hwm, searches_hwm, generation
+
+
+def score_movie(weights, record):
+    """Score a candidate MovieRecord against a profile; returns (score, strongest matching feature)"""
+    score = 0.0
+    best = None
+    for kind, name in movie_features(record):
+        contribution = weights.get(kind, {}).get(name, 0.0) * FEATURE_WEIGHTS[kind]
+        score += contribution
+        if contribution and (best is None or contribution > best[0]):
+            best = (contribution, kind, name)
+    if score and record.rating is not None:
+        score += max(record.rating - 6.0, 0.0) * RATING_BONUS
+    return score, best
+
+
+def describe_reason(best):
+    if best is None:
+        return None
+    _, kind, name = best
+    return {
+        'genre': f"Because you like {name} movies",
+        'director': f"Directed by {name}",
+        'actor': f"Starring {name}",
+    }[kind]
+
+
+def candidate_pool(weights, detail_limit):
+    """Movies to score: the whole catalog snapshot, or OMDB searches seeded by the profile"""
+    catalog = catalog_snapshot.get_catalog()
+    if catalog is not None:
+        for index in range(len(catalog)):
+            yield catalog.movie(index)
+        return
+
+    # Without a snapshot, search OMDB for the strongest features and fetch
+    # details for up to detail_limit of the hits
+    seeds = [name for name, _ in Counter(weights.get('genre', {})).most_common(2)]
+    seeds += [name.split()[-1] for name, _ in Counter(weights.get('director', {})).most_common(1)]
+    seeds += [name.split()[-1] for name, _ in Counter(weights.get('actor', {})).most_common(1)]
+    seen = set()
+    for seed in seeds:
+        data = _omdb_get({'s': seed, 'type': 'movie'})
+        for hit in (data or {}).get('Search', []):
+            imdb_id = hit.get('imdbID')
+            if not imdb_id or imdb_id in seen:
+                continue
+            seen.add(imdb_id)
+            if len(seen) > detail_limit:
+                return
+            movie = _omdb_get({'i': imdb_id})
+            if movie:
+                yield movie
+
+
+def refresh_user(conn, user_id):
+    """Recompute one user's feed and clear their stale flag. Returns the feed length.
+
+    If a favorite or search marked the user stale again while this ran
+    (a removed favorite even resets the profile), nothing is written and
+    None is returned: the user stays stale for the next refresh.
+    """
+    config = current_app.config
+    weights, favorites_hwm, searches_hwm, generation = update_profile(conn, user_id)
+
+    repo = repository.get_repository()
+    seen_ids = repo.favorite_ids(user_id)
+    seen_titles = {catalog_snapshot.normalize_title(title) for title in repo.searched_titles(user_id)}
+
+    scored = []
+    if weights:
+        with tracing.span('for_you.score', **{'cinescope.user_id': user_id}) as scoring:
+            for movie in candidate_pool(weights, config['FOR_YOU_CANDIDATE_DETAILS']):
+                if movie.get('imdbID') in seen_ids or catalog_snapshot.normalize_title(movie.get('Title')) in seen_titles:
+                    continue
+                record = MovieRecord.from_omdb(movie)
+                score, best = score_movie(weights, record)
+                if score > 0:
+                    scored.append((score, record, best))
+            if scoring is not None:
+                scoring.set('cinescope.scored', len(scored))
+    scored.sort(key=lambda item: item[0], reverse=True)
+    scored = scored[:config['FOR_YOU_SIZE']]
+
+    for _, record, _ in scored:
+        posters.remember_poster_source(record.imdb_id, record.poster)
+
+    with conn:
+        if generation is None:
+            saved = conn.execute(
+                'INSERT INTO user_taste_profiles (user_id, weights, favorites_hwm, searches_hwm, stale, refreshed_at) '
+                'VALUES (?, ?, ?, ?, 0, CURRENT_TIMESTAMP) ON CONFLICT(user_id) DO NOTHING',
+                (user_id, json.dumps(weights), favorites_hwm, searches_hwm)
+            ).rowcount
+        else:
+            saved = conn.execute(
+                'UPDATE user_taste_profiles SET weights = ?, favorites_hwm = ?, searches_hwm = ?, stale = 0, '
+                'refreshed_at = CURRENT_TIMESTAMP WHERE user_id = ? AND generation = ?',
+                (json.dumps(weights), favorites_hwm, searches_hwm, user_id, generation)
+            ).rowcount
+        if not saved:
+            return None
+        conn.execute('DELETE FROM user_recommendations WHERE user_id = ?', (user_id,))
+        conn.executemany(
+            'INSERT INTO user_recommendations (user_id, rank, imdb_id, title, year, genre, rating, reason, score) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            [
+                (user_id, rank, record.imdb_id, record.title, record.year_text, ', '.join(record.genre_names),
+                 f"{record.rating:.1f}" if record.rating is not None else None, describe_reason(best), round(score, 3))
+                for rank, (score, record, best) in enumerate(scored)
+            ]
+        )
+    return len(scored)
+
+
+def stale_users(conn, limit=None):
+    query = 'SELECT user_id FROM user_taste_profiles WHERE stale = 1 ORDER BY user_id'
+    if limit:
+        query += f' LIMIT {int(limit)}'
+    return [row[0] for row in conn.execute(query)]
+
+
+def refresh_stale(conn, limit=None):
+    """Refresh every stale feed (the batch job). Returns the number of users refreshed."""
+    refreshed = 0
+    for user_id in stale_users(conn, limit):
+        try:
+            if refresh_user(conn, user_id) is not None:
+                refreshed += 1
+        except Exception as e:
+            conn.rollback()
+            print(f"For You refresh error for user {user_id}: {e}")
+    return refreshed
+
+
+class BackgroundRefresher:
+    """Refreshes feeds off the request thread, one user at a time per process.
+
+    A user already queued is not queued again, so a burst of searches
+    collapses into a single refresh.
+    """
+
+    def __init__(self, app, connect):
+        self.app = app
+        self.connect = connect
+        self._pool = PerProcessExecutor(lambda: ThreadPoolExecutor(max_workers=1, thread_name_prefix='for-you'))
+        self._pending = set()
+        self._owner_pid = None
+        self._lock = threading.Lock()
+
+    def schedule(self, user_id):
+        with self._lock:
+            if self._owner_pid != os.getpid():
+                # Users queued in the parent before a fork are never refreshed here
+                self._pending = set()
+                self._owner_pid = os.getpid()
+            if user_id in self._pending:
+                return
+            self._pending.add(user_id)
+        self._pool.get().submit(self._run, user_id, tracing.current_parent())
+
+    def _run(self, user_id, trace_parent=None):
+        with self._lock:
+            self._pending.discard(user_id)
+        with self.app.app_context(), tracing.root_span('for_you refresh', trace_parent, kind='internal'):
+            conn = self.connect()
+            try:
+                refresh_user(conn, user_id)
+            except Exception as e:
+                print(f"For You refresh error for user {user_id}: {e}")
+            finally:
+                conn.close()
+
+
+def init_app(app, connect):
+    if app.config['FOR_YOU_BACKGROUND_REFRESH']:
+        app.extensions['for_you_refresher'] = BackgroundRefresher(app, connect)
+
+
+def schedule_refresh(user_id):
+    """Queue a background refresh; without one the batch job picks the user up"""
+    refresher = current_app.extensions.get('for_you_refresher')
+    if refresher is not None:
+        refresher.schedule(user_id)
+
+
+if __name__ == '__main__':
+    from app import create_app, get_db_connection
+
+    parser = argparse.ArgumentParser(description='Refresh precomputed "For You" feeds')
+    parser.add_argument('command', choices=['refresh', 'show'])
+    parser.add_argument('--user-id', type=int, help='refresh or show a single user')
+    parser.add_argument('--all', action='store_true', help='rebuild every profile from scratch')
+    parser.add_argument('--limit', type=int, help='refresh at most this many stale users')
+    args = parser.parse_args()
+
+    app = create_app(FOR_YOU_BACKGROUND_REFRESH=False)
+    with app.app_context():
+        conn = get_db_connection()
+        try:
+            if args.command == 'show':
+                for row in fetch_feed(conn, args.user_id, app.config['FOR_YOU_SIZE']):
+                    print(f"  - {row['title']} ({row['year']}) {row['imdb_id']}: {row['reason']}")
+            elif args.user_id:
+                with conn:
+                    mark_stale(conn, args.user_id, rebuild=args.all)
+                stored = refresh_user(conn, args.user_id)
+                if stored is None:
+                    print(f"⚠️  User {args.user_id} changed during the refresh; still marked stale")
+                else:
+                    print(f"✅ {stored} recommendations stored for user {args.user_id}")
+            else:
+                if args.all:
+                    with conn:
+                        for user_id in repository.get_repository().user_ids():
+                            mark_stale(conn, user_id, rebuild=True)
+                print(f"✅ Refreshed {refresh_stale(conn, args.limit)} stale feeds")
+        finally:
+            conn.close()
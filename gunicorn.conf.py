@@ -0,0 +1,18 @@
+# gunicorn -c gunicorn.conf.py
+import multiprocessing
+import os
+
+wsgi_app = 'app:create_app()'
+bind = os.getenv('BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+timeout = 60
+
+# Build the app once in the master (config, schema migrations) and fork workers from it
+preload_app = True
+
+
+def post_worker_init(worker):
+    # Per-process resources (HTTP pools, snapshot mmaps, caches) are built here, not on the first request
+    from app import warm_up
+    warm_up(worker.wsgi)
@@ -0,0 +1,53 @@
+import os
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+from flask import current_app
+
+from tracing import TracedSession
+
+_lock = threading.Lock()
+
+
+def create_http_session(pool_size):
+    session = TracedSession()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_http_session():
+    """Shared keep-alive requests.Session for upstream APIs, created on first use.
+
+    One session per process: a session inherited across fork would share
+    sockets with the parent, so a new one is built when the pid changes.
+    """
+    state = current_app.extensions.get('http_session')
+    if state is None or state[0] != os.getpid():
+        with _lock:
+            state = current_app.extensions.get('http_session')
+            if state is None or state[0] != os.getpid():
+                state = (os.getpid(), create_http_session(current_app.config['HTTP_POOL_SIZE']))
+                current_app.extensions['http_session'] = state
+    return state[1]
+
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across threads (rate <= 0: unlimited)"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
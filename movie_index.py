@@ -0,0 +1,595 @@
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, g
+
+import background_tasks
+import posters
+import title_resolver
+from http_client import RateLimiter
+
+# Typed columns /discover can filter and sort on; names are trusted identifiers
+SORT_COLUMNS = {
+    'rating': 'rating',
+    'year': 'year',
+    'runtime': 'runtime',
+    'votes': 'votes',
+    'title': 'title',
+}
+RANGE_FILTERS = (
+    # (query arg prefix, column, parser)
+    ('rating', 'rating', float),
+    ('year', 'year', int),
+    ('runtime', 'runtime', int),
+)
+LINK_TABLES = (
+    # (OMDB field, name table, link table, role stored in the link row or None)
+    ('Genre', 'genres', 'movie_genres', None),
+    ('Language', 'languages', 'movie_languages', None),
+    ('Director', 'people', 'movie_people', 'director'),
+    ('Writer', 'people', 'movie_people', 'writer'),
+    ('Actors', 'people', 'movie_people', 'actor'),
+)
+RECENT_LIMIT = 20000  # ids remembered per process as recently written
+BACKFILL_RETRY_AFTER = 3600  # seconds before an id OMDB could not return is tried again
+
+
+def init_movie_index(conn):
+    """Create the typed movie metadata tables (idempotent)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS movies (
+            id INTEGER PRIMARY KEY,
+            imdb_id TEXT NOT NULL UNIQUE,
+            title TEXT NOT NULL,
+            year INTEGER,
+            runtime INTEGER,
+            rating REAL,
+            votes INTEGER,
+            box_office INTEGER,
+            rated TEXT,
+            plot TEXT,
+            poster TEXT,
+            updated_at REAL NOT NULL
+        )
+    ''')
+    for column in ('rating', 'year', 'runtime', 'votes', 'title'):
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_movies_{column} ON movies ({column}, id)')
+    for table in ('genres', 'languages', 'people'):
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE COLLATE NOCASE
+            )
+        ''')
+    for link, name_column in (('movie_genres', 'genre_id'), ('movie_languages', 'language_id')):
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {link} (
+                {name_column} INTEGER NOT NULL,
+                movie_id INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                PRIMARY KEY ({name_column}, movie_id)
+            ) WITHOUT ROWID
+        ''')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{link}_movie ON {link} (movie_id, position)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS movie_people (
+            person_id INTEGER NOT NULL,
+            role TEXT NOT NULL,
+            movie_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            PRIMARY KEY (person_id, role, movie_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_movie_people_movie ON movie_people (movie_id, role, position)')
+
+
+# OMDB display strings -> typed values (None when OMDB has nothing)
+def parse_int(value):
+    """'148 min' -> 148, '$292,587,330' -> 292587330, '2008–2013' -> 2008"""
+    match = re.search(r'\d[\d,]*', value or '')
+    return int(match.group().replace(',', '')) if match else None
+
+
+def parse_rating(value):
+    try:
+        rating = float(str(value).split('/')[0])
+    except (TypeError, ValueError):
+        return None
+    return rating if 0 <= rating <= 10 else None
+
+
+def split_names(value):
+    if not value or value == 'N/A':
+        return []
+    seen = []
+    for part in value.split(','):
+        # 'Christopher Nolan (screenplay)' -> 'Christopher Nolan'
+        name = re.sub(r'\s*\([^)]*\)$', '', part).strip()
+        if name and name.casefold() not in (s.casefold() for s in seen):
+            seen.append(name)
+    return seen
+
+
+def _text(value):
+    return None if value in (None, '', 'N/A') else value
+
+
+def _name_ids(conn, table, names, cache):
+    ids = []
+    for name in names:
+        key = (table, name.casefold())
+        name_id = cache.get(key)
+        if name_id is None:
+            conn.execute(f'INSERT OR IGNORE INTO {table} (name) VALUES (?)', (name,))
+            name_id = cache[key] = conn.execute(f'SELECT id FROM {table} WHERE name = ?', (name,)).fetchone()[0]
+        ids.append(name_id)
+    return ids
+
+
+def ingest(conn, records, now=None):
+    """Upsert OMDB detail records (dicts) with their link rows; returns how many were written.
+
+    Every record is parsed once here, so readers filter on typed columns and
+    indexed link tables instead of re-splitting display strings. The caller
+    owns the transaction.
+    """
+    now = now or time.time()
+    name_cache = {}
+    written = 0
+    for data in records:
+        imdb_id = data.get('imdbID')
+        if not imdb_id or data.get('Response') == 'False':
+            continue
+        movie_id = conn.execute('''
+            INSERT INTO movies (imdb_id, title, year, runtime, rating, votes, box_office, rated, plot, poster, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(imdb_id) DO UPDATE SET
+                title = excluded.title, year = excluded.year, runtime = excluded.runtime,
+                rating = excluded.rating, votes = excluded.votes, box_office = excluded.box_office,
+                rated = excluded.rated, plot = COALESCE(excluded.plot, plot),
+                poster = excluded.poster, updated_at = excluded.updated_at
+            RETURNING id
+        ''', (
+            imdb_id,
+            data.get('Title') or imdb_id,
+            parse_int(data.get('Year')),
+            parse_int(data.get('Runtime')),
+            parse_rating(data.get('imdbRating')),
+            parse_int(data.get('imdbVotes')),
+            parse_int(data.get('BoxOffice')),
+            _text(data.get('Rated')),
+            _text(data.get('Plot')),
+            _text(data.get('Poster')),
+            now,
+        )).fetchone()[0]
+
+        for field, table, link, role in LINK_TABLES:
+            if field not in data:
+                continue  # e.g. catalog snapshots carry no writers; keep what we have
+            ids = _name_ids(conn, table, split_names(data.get(field)), name_cache)
+            if role is None:
+                name_column = 'genre_id' if table == 'genres' else 'language_id'
+                conn.execute(f'DELETE FROM {link} WHERE movie_id = ?', (movie_id,))
+                conn.executemany(
+                    f'INSERT OR IGNORE INTO {link} ({name_column}, movie_id, position) VALUES (?, ?, ?)',
+                    [(name_id, movie_id, position) for position, name_id in enumerate(ids)]
+                )
+            else:
+                conn.execute('DELETE FROM movie_people WHERE movie_id = ? AND role = ?', (movie_id, role))
+                conn.executemany(
+                    'INSERT OR IGNORE INTO movie_people (person_id, role, movie_id, position) VALUES (?, ?, ?, ?)',
+                    [(name_id, role, movie_id, position) for position, name_id in enumerate(ids)]
+                )
+        written += 1
+    return written
+
+
+class MovieIndexWriter:
+    """Collects OMDB records seen while handling a request and writes them in one transaction.
+
+    Records are buffered on flask.g and flushed when the app context is torn
+    down (after a request, or at the end of a background task). A movie
+    written recently by this process is not written again until refresh
+    seconds have passed, so repeat lookups cost no writes.
+    """
+
+    def __init__(self, connect, refresh):
+        self.connect = connect
+        self.refresh = refresh
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+
+    def remember(self, data):
+        imdb_id = data.get('imdbID') if data else None
+        if not imdb_id or data.get('Response') == 'False':
+            return
+        with self._lock:
+            written_at = self._recent.get(imdb_id)
+            if written_at is not None and time.monotonic() - written_at < self.refresh:
+                return
+        pending = g.setdefault('movie_index_pending', {})
+        pending[imdb_id] = data
+
+    def flush(self, exc=None):
+        pending = g.pop('movie_index_pending', None)
+        if not pending:
+            return
+        try:
+            conn = self.connect()
+            try:
+                with conn:
+                    ingest(conn, pending.values())
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Movie index write error: {e}")
+            return
+        now = time.monotonic()
+        with self._lock:
+            for imdb_id in pending:
+                self._recent[imdb_id] = now
+                self._recent.move_to_end(imdb_id)
+            while len(self._recent) > RECENT_LIMIT:
+                self._recent.popitem(last=False)
+
+
+def remember(data):
+    """Queue an OMDB detail response for the movie index (a no-op outside an app context)"""
+    writer = current_app.extensions.get('movie_index')
+    if writer is not None:
+        writer.remember(data)
+
+
+def parse_filters(args):
+    """Validated /discover filters from request args; raises ValueError on bad input"""
+    filters = {
+        'genres': [name.strip() for name in args.getlist('genre') if name.strip()],
+        'languages': [name.strip() for name in args.getlist('language') if name.strip()],
+        'person': (args.get('person') or '').strip() or None,
+        'ranges': [],
+    }
+    for prefix, column, parse in RANGE_FILTERS:
+        for bound, op in (('min', '>='), ('max', '<=')):
+            raw = args.get(f'{bound}_{prefix}')
+            if raw in (None, ''):
+                continue
+            try:
+                filters['ranges'].append((column, op, parse(raw)))
+            except ValueError:
+                raise ValueError(f'{bound}_{prefix} must be a number')
+
+    sort = args.get('sort', 'rating')
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f"sort must be one of: {', '.join(SORT_COLUMNS)}")
+    order = args.get('order', 'asc' if sort == 'title' else 'desc')
+    if order not in ('asc', 'desc'):
+        raise ValueError('order must be asc or desc')
+    filters['sort'] = SORT_COLUMNS[sort]
+    filters['order'] = order
+    return filters
+
+
+def _lookup_ids(conn, table, names):
+    """ids for names (case-insensitive), or None if any is unknown (nothing can match)"""
+    ids = []
+    for name in names:
+        row = conn.execute(f'SELECT id FROM {table} WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            return None
+        ids.append(row[0])
+    return ids
+
+
+def _genre_list(schema, movie_id):
+    # Comma-joined genre names in OMDB order, as a correlated subquery
+    return (f"(SELECT group_concat(name, ', ') FROM (SELECT g.name FROM {schema}.movie_genres mg "
+            f"JOIN {schema}.genres g ON g.id = mg.genre_id WHERE mg.movie_id = {movie_id} ORDER BY mg.position))")
+
+
+def metadata_join(schema, imdb_id_column):
+    """(join clause, columns) that add indexed metadata to rows with an IMDb id column.
+
+    schema is where the movie index lives from the querying connection
+    ('main', or the main database attached to a shard). The columns are
+    prefixed m_ and are all NULL for a movie that is not indexed yet.
+    """
+    join = f'LEFT JOIN {schema}.movies m ON m.imdb_id = {imdb_id_column}'
+    columns = ['m.title AS m_title', 'm.year AS m_year', 'm.rating AS m_rating',
+               'm.runtime AS m_runtime', f'{_genre_list(schema, "m.id")} AS m_genre']
+    return join, columns
+
+
+def metadata_dict(imdb_id, row):
+    """The movie JSON for a row carrying metadata_join columns, or None if it is not indexed"""
+    if row['m_title'] is None:
+        return None
+    return {
+        'imdb_id': imdb_id,
+        'title': row['m_title'],
+        'poster': posters.poster_url(imdb_id, 'thumb'),
+        'year': row['m_year'],
+        'rating': row['m_rating'],
+        'runtime': row['m_runtime'],
+        'genre': row['m_genre'] or 'N/A'
+    }
+
+
+def missing_ids(conn, imdb_ids):
+    """The ids among imdb_ids that are not in the movie index"""
+    imdb_ids = list(set(imdb_ids))
+    present = set()
+    for start in range(0, len(imdb_ids), 500):
+        chunk = imdb_ids[start:start + 500]
+        present.update(row[0] for row in conn.execute(
+            f'SELECT imdb_id FROM movies WHERE imdb_id IN ({",".join("?" * len(chunk))})', chunk
+        ))
+    return [imdb_id for imdb_id in imdb_ids if imdb_id not in present]
+
+
+def discover(conn, filters, cursor=None, limit=20):
+    """One page of movies matching filters, ordered by (sort column, id).
+
+    Every genre and language given must match. Movies without a value for
+    the sort column are left out. Returns (rows, next_cursor); next_cursor
+    is None on the last page.
+    """
+    import repository
+
+    sort, order = filters['sort'], filters['order']
+    query = [
+        f'SELECT m.id, m.imdb_id, m.title, m.year, m.runtime, m.rating, m.votes, m.box_office, m.poster, '
+        f'{_genre_list("main", "m.id")} AS genre FROM movies m WHERE m.{sort} IS NOT NULL'
+    ]
+    params = []
+
+    for names, table, link, column in ((filters['genres'], 'genres', 'movie_genres', 'genre_id'),
+                                       (filters['languages'], 'languages', 'movie_languages', 'language_id')):
+        ids = _lookup_ids(conn, table, names)
+        if ids is None:
+            return [], None
+        for name_id in ids:
+            # Genres and languages are broad: walk the sort index and probe the link table
+            query.append(f'AND EXISTS (SELECT 1 FROM {link} WHERE {column} = ? AND movie_id = m.id)')
+            params.append(name_id)
+    if filters['person']:
+        ids = _lookup_ids(conn, 'people', [filters['person']])
+        if ids is None:
+            return [], None
+        # A person has few movies: start from their credits and sort those
+        query.append('AND m.id IN (SELECT movie_id FROM movie_people WHERE person_id = ?)')
+        params.append(ids[0])
+    for column, op, value in filters['ranges']:
+        query.append(f'AND m.{column} {op} ?')
+        params.append(value)
+
+    comparison = '<' if order == 'desc' else '>'
+    if cursor:
+        query.append(f'AND (m.{sort}, m.id) {comparison} (?, ?)')
+        params.extend(repository.decode_cursor(cursor, sort_types=(str, int, float)))
+    query.append(f'ORDER BY m.{sort} {order.upper()}, m.id {order.upper()} LIMIT ?')
+    params.append(limit + 1)
+
+    rows = conn.execute(' '.join(query), params).fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = repository.encode_cursor(rows[-1][sort], rows[-1]['id'])
+    return rows, next_cursor
+
+
+class MetadataBackfill:
+    """Indexes the movies behind favorites and searches that pages could not enrich.
+
+    Page endpoints queue what their rows were missing and return at once;
+    one background_tasks job per process then works through the queue a
+    batch at a time.
+    Search titles are first tied to an IMDb id (resolution cache and
+    catalog before OMDB), then details of ids missing from the index are
+    fetched at a limited rate and written in one transaction per batch.
+    """
+
+    def __init__(self, app, connect, fetch_detail, search_title):
+        self.app = app
+        self.connect = connect
+        self.fetch_detail = fetch_detail
+        self.search_title = search_title
+        self.batch_size = app.config['MOVIE_BACKFILL_BATCH']
+        self.limiter = RateLimiter(app.config['MOVIE_BACKFILL_RATE'])
+        self._ids = set()
+        self._titles = set()
+        self._failed = {}
+        self._running = False
+        self._owner_pid = None
+        self._lock = threading.Lock()
+
+    def schedule(self, imdb_ids=(), titles=(), start=True):
+        """Queue IMDb ids to index and (user_id, movie_title) searches to link"""
+        now = time.monotonic()
+        with self._lock:
+            if self._owner_pid != os.getpid():
+                # A run in progress when the worker was forked did not come along
+                self._owner_pid = os.getpid()
+                self._running = False
+            self._ids.update(
+                imdb_id for imdb_id in imdb_ids
+                if imdb_id not in self._failed or now - self._failed[imdb_id] >= BACKFILL_RETRY_AFTER
+            )
+            self._titles.update(titles)
+            if not start or self._running or not (self._ids or self._titles):
+                return
+            self._running = True
+        background_tasks.get_task_registry().spawn(self._run)
+
+    def drain(self):
+        """Work through everything queued on the calling thread (CLI)"""
+        with self._lock:
+            self._running = True
+        self._run()
+
+    def _take(self, pending):
+        return [pending.pop() for _ in range(min(self.batch_size, len(pending)))]
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                with self._lock:
+                    titles = self._take(self._titles)
+                    ids = self._take(self._ids) if not titles else []
+                    if not titles and not ids:
+                        self._running = False
+                        return
+                try:
+                    if titles:
+                        self._link_titles(titles)
+                    else:
+                        self._fill(ids)
+                except Exception as e:
+                    print(f"Movie backfill error: {e}")
+
+    def _link_titles(self, titles):
+        import repository
+
+        def limited_search(query):
+            self.limiter.wait()
+            return self.search_title(query)
+
+        resolved = {}
+        conn = self.connect()
+        try:
+            for user_id, title in titles:
+                imdb_id = title_resolver.resolve(conn, title, limited_search)
+                if imdb_id:
+                    resolved.setdefault(user_id, {})[title] = imdb_id
+        finally:
+            conn.close()
+        for user_id, links in resolved.items():
+            repository.get_repository().link_history_titles(user_id, links)
+        with self._lock:
+            self._ids.update(imdb_id for links in resolved.values() for imdb_id in links.values())
+
+    def _fill(self, ids):
+        conn = self.connect()
+        try:
+            records = []
+            for imdb_id in missing_ids(conn, ids):
+                self.limiter.wait()
+                try:
+                    data = self.fetch_detail(imdb_id)
+                except Exception as e:
+                    print(f"Movie backfill lookup error for {imdb_id}: {e}")
+                    data = None
+                if data and data.get('Response') == 'True':
+                    posters.remember_poster_source(imdb_id, data.get('Poster'))
+                    records.append(data)
+                else:
+                    with self._lock:
+                        self._failed[imdb_id] = time.monotonic()
+                        if len(self._failed) > RECENT_LIMIT:
+                            self._failed.clear()
+            if records:
+                with conn:
+                    ingest(conn, records)
+        finally:
+            conn.close()
+
+
+def schedule_backfill(imdb_ids=(), titles=()):
+    """Queue missing movie metadata for the background backfill (no-op when there is nothing to do)"""
+    backfill = current_app.extensions.get('movie_backfill')
+    if backfill is not None and (imdb_ids or titles):
+        backfill.schedule(imdb_ids, titles)
+
+
+def init_app(app, connect, fetch_detail=None, search_title=None):
+    writer = MovieIndexWriter(connect, app.config['MOVIE_INDEX_REFRESH'])
+    app.extensions['movie_index'] = writer
+    app.teardown_appcontext(writer.flush)
+    if fetch_detail is not None and search_title is not None:
+        app.extensions['movie_backfill'] = MetadataBackfill(app, connect, fetch_detail, search_title)
+
+
+def _read_jsonl(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def _catalog_records(path):
+    import catalog_snapshot
+    snapshot = catalog_snapshot.CatalogSnapshot(path)
+    for index in range(len(snapshot)):
+        yield snapshot.movie(index)
+
+
+def _batches(records, size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+if __name__ == '__main__':
+    from config import Config
+
+    parser = argparse.ArgumentParser(description='Load or inspect the typed movie index behind /discover')
+    sub = parser.add_subparsers(dest='command', required=True)
+    load = sub.add_parser('ingest', help='load OMDB detail records')
+    source = load.add_mutually_exclusive_group(required=True)
+    source.add_argument('--from-jsonl', metavar='PATH', help='one OMDB JSON record per line')
+    source.add_argument('--from-catalog', action='store_true', help='every movie in the catalog snapshot')
+    load.add_argument('--batch-size', type=int, default=1000)
+    sub.add_parser('backfill', help='link every search to an IMDb id and index every favorite and search (uses OMDB)')
+    sub.add_parser('info')
+    parser.add_argument('--db', default=Config.DATABASE_PATH)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db, timeout=30)
+    try:
+        init_movie_index(conn)
+        if args.command == 'ingest':
+            start = time.perf_counter()
+            records = _read_jsonl(args.from_jsonl) if args.from_jsonl else _catalog_records(Config.CATALOG_SNAPSHOT_PATH)
+            total = 0
+            for batch in _batches(records, args.batch_size):
+                with conn:
+                    total += ingest(conn, batch)
+            conn.execute('PRAGMA optimize')
+            print(f"✅ Indexed {total} movies in {time.perf_counter() - start:.2f}s")
+        elif args.command == 'backfill':
+            from app import create_app
+            import repository
+
+            app = create_app(DATABASE_PATH=args.db, FOR_YOU_BACKGROUND_REFRESH=False)
+            with app.app_context():
+                start = time.perf_counter()
+                before = conn.execute('SELECT COUNT(*) FROM movies').fetchone()[0]
+                repo = repository.get_repository()
+                backfill = app.extensions['movie_backfill']
+                titles = [(user_id, title) for user_id, user_titles in repo.unlinked_history_titles().items()
+                          for title in user_titles]
+                backfill.schedule(titles=titles, start=False)
+                backfill.drain()
+                backfill.schedule(missing_ids(conn, repo.referenced_movie_ids()), start=False)
+                backfill.drain()
+                added = conn.execute('SELECT COUNT(*) FROM movies').fetchone()[0] - before
+                print(f"✅ Looked up {len(titles)} unlinked search titles, indexed {added} movies "
+                      f"in {time.perf_counter() - start:.1f}s")
+        else:
+            counts = {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                      for table in ('movies', 'genres', 'languages', 'people', 'movie_people')}
+            print(f"📦 {counts['movies']} movies, {counts['genres']} genres, {counts['languages']} languages, "
+                  f"{counts['people']} people ({counts['movie_people']} credits)")
+    finally:
+        conn.close()
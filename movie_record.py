@@ -0,0 +1,203 @@
+import re
+import sys
+import threading
+
+import posters
+
+
+class NameTable:
+    """Process-wide interning of genre and person names to small integer IDs.
+
+    IDs are only meaningful inside one process; anything persisted or sent to
+    a client uses the names. Only OMDB and catalog data are interned: names
+    posted by clients are matched against the table but never added to it
+    (lookup_list), so requests can't grow it without bound.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._names = []
+        self._lock = threading.Lock()
+
+    def intern(self, name):
+        name_id = self._ids.get(name)
+        if name_id is None:
+            with self._lock:
+                name_id = self._ids.get(name)
+                if name_id is None:
+                    name_id = len(self._names)
+                    self._names.append(sys.intern(name))
+                    self._ids[name] = name_id
+        return name_id
+
+    def intern_list(self, value):
+        """IDs for a comma-joined OMDB list ('Action, Sci-Fi'); 'N/A' is empty"""
+        if not value or value == 'N/A':
+            return ()
+        return tuple(self.intern(part.strip()) for part in value.split(',') if part.strip())
+
+    def lookup_list(self, value):
+        """Like intern_list, but a name not in the table stays a plain string"""
+        if not value or value == 'N/A':
+            return ()
+        return tuple(self._ids.get(part, part) for part in (part.strip() for part in value.split(',')) if part)
+
+    def name(self, name_id):
+        return name_id if isinstance(name_id, str) else self._names[name_id]
+
+    def __len__(self):
+        return len(self._names)
+
+
+names = NameTable()
+
+
+def _parse_int(value):
+    match = re.search(r'\d+', value or '')
+    return int(match.group()) if match else 0
+
+
+def _parse_float(value):
+    try:
+        return float(str(value).split('/')[0])
+    except (TypeError, ValueError):
+        return None
+
+
+def _year_label(text, year):
+    # Kept only when OMDB's text says more than the year itself, e.g. '2008–2013'
+    return text if text and text != 'N/A' and text != str(year) else None
+
+
+def _text(value):
+    return None if value in (None, '', 'N/A') else value
+
+
+def _interned_text(value):
+    value = _text(value)
+    return sys.intern(value) if value else None
+
+
+class MovieRecord:
+    """Compact movie representation shared by the OMDB client, scorers and caches.
+
+    Numbers are parsed once, and genres/directors/actors are tuples of IDs
+    from the shared NameTable, so comparing two movies is set arithmetic on
+    small ints instead of re-splitting and lower-casing strings.
+    """
+
+    __slots__ = ('imdb_id', 'title', 'year', 'year_label', 'runtime', 'rating',
+                 'genres', 'directors', 'actors', 'language', 'plot', 'poster', 'box_office')
+
+    def __init__(self, imdb_id, title, year=0, runtime=0, rating=None, genres=(), directors=(), actors=(),
+                 language=None, plot=None, poster=None, box_office=None, year_label=None):
+        self.imdb_id = imdb_id
+        self.title = title
+        self.year = year
+        self.year_label = year_label
+        self.runtime = runtime
+        self.rating = rating
+        self.genres = genres
+        self.directors = directors
+        self.actors = actors
+        self.language = language
+        self.plot = plot
+        self.poster = poster
+        self.box_office = box_office
+
+    @classmethod
+    def from_omdb(cls, data):
+        """Build from an OMDB detail response (or a catalog snapshot movie)"""
+        year_text = data.get('Year') or ''
+        year = _parse_int(year_text)
+        return cls(
+            imdb_id=data.get('imdbID'),
+            title=data.get('Title') or 'N/A',
+            year=year,
+            year_label=_year_label(year_text, year),
+            runtime=_parse_int(data.get('Runtime')),
+            rating=_parse_float(data.get('imdbRating')),
+            genres=names.intern_list(data.get('Genre')),
+            directors=names.intern_list(data.get('Director')),
+            actors=names.intern_list(data.get('Actors')),
+            language=_interned_text(data.get('Language')),
+            plot=_text(data.get('Plot')),
+            poster=_text(data.get('Poster')),
+            box_office=_text(data.get('BoxOffice')),
+        )
+
+    @classmethod
+    def from_api_dict(cls, data):
+        """Inverse of to_api_dict, for movie data posted back by the browser (nothing is interned)"""
+        year_text = str(data.get('year') or '')
+        year = _parse_int(year_text)
+        return cls(
+            imdb_id=data.get('imdb_id'),
+            title=data.get('title') or 'N/A',
+            year=year,
+            year_label=_year_label(year_text, year),
+            runtime=_parse_int(data.get('runtime')),
+            rating=_parse_float(data.get('rating')),
+            genres=names.lookup_list(data.get('genre')),
+            directors=names.lookup_list(data.get('director')),
+            actors=names.lookup_list(data.get('actors')),
+            language=_text(data.get('language')),
+            plot=_text(data.get('summary')),
+            box_office=_text(data.get('box_office')),
+        )
+
+    @property
+    def genre_names(self):
+        return [names.name(i) for i in self.genres]
+
+    @property
+    def director_names(self):
+        return [names.name(i) for i in self.directors]
+
+    @property
+    def actor_names(self):
+        return [names.name(i) for i in self.actors]
+
+    @property
+    def year_text(self):
+        return self.year_label or (str(self.year) if self.year else 'N/A')
+
+    @property
+    def rating_text(self):
+        return f"{self.rating:.1f}/10" if self.rating is not None else 'N/A/10'
+
+    @staticmethod
+    def _joined(ids):
+        return ', '.join(names.name(i) for i in ids) or 'N/A'
+
+    def to_api_dict(self):
+        """The movie JSON the frontend expects"""
+        return {
+            'title': self.title,
+            'poster': posters.poster_url(self.imdb_id, 'full'),
+            'genre': self._joined(self.genres),
+            'summary': self.plot or 'No summary available.',
+            'rating': self.rating_text,
+            'language': self.language or 'N/A',
+            'runtime': f"{self.runtime} min" if self.runtime else 'N/A',
+            'year': self.year_text,
+            'director': self._joined(self.directors),
+            'actors': self._joined(self.actors),
+            'box_office': self.box_office or 'N/A',
+            'imdb_id': self.imdb_id or 'N/A'
+        }
+
+    def to_card_dict(self):
+        """The smaller JSON used for recommendation cards"""
+        return {
+            'title': self.title,
+            'poster': posters.poster_url(self.imdb_id, 'thumb'),
+            'year': self.year_text,
+            'rating': self.rating_text,
+            'genre': self._joined(self.genres),
+            'director': self._joined(self.directors),
+            'imdb_id': self.imdb_id or ''
+        }
+
+    def __repr__(self):
+        return f"MovieRecord({self.imdb_id!r}, {self.title!r}, {self.year_text})"
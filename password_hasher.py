@@ -0,0 +1,184 @@
+import argparse
+import math
+import multiprocessing
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from background_tasks import PerProcessExecutor
+
+
+def process_pool(workers):
+    """A process pool whose workers don't fork from the (threaded) calling process.
+
+    A forked child inherits every lock another thread held at fork time, so
+    gunicorn's threaded workers start pool processes from a fork server
+    (spawn where that is unavailable).
+    """
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing queue is full or a hash didn't finish; the client should retry later"""
+
+
+class PasswordHasher:
+    """Runs password hashing in a bounded process pool, off the request thread.
+
+    At most max_pending hashes may be queued or running at once; beyond that
+    HashingBusy is raised immediately instead of letting a login burst pile
+    up CPU work in front of search traffic. workers=0 hashes inline, which
+    is handy for development.
+    """
+
+    def __init__(self, workers=2, max_pending=16, timeout=10):
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        # Hashing is CPU-bound, so it gets processes rather than the background_tasks threads
+        self._pool = PerProcessExecutor(lambda: process_pool(self.workers))
+
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy()
+        executor = self._pool.get()
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._pool.discard(executor)
+            raise HashingBusy()
+        except Exception:
+            self._slots.release()
+            raise
+        # The slot is held until the worker finishes, even if we stop waiting
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise HashingBusy()
+        except BrokenProcessPool:
+            # A hashing process died; the pool refuses all further work, so start a new one
+            self._pool.discard(executor)
+            raise HashingBusy()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def shutdown(self):
+        self._pool.shutdown()
+
+
+class AttemptThrottle:
+    """Sliding-window attempt counter keyed by IP or username (per process)"""
+
+    def __init__(self, limit, window_seconds):
+        self.limit = limit
+        self.window = window_seconds
+        self._attempts = defaultdict(deque)
+        self._lock = threading.Lock()
+
+    def allow(self, key):
+        """Record an attempt for key; False if key is over its limit"""
+        now = time.monotonic()
+        with self._lock:
+            attempts = self._attempts[key]
+            while attempts and attempts[0] <= now - self.window:
+                attempts.popleft()
+            if len(attempts) >= self.limit:
+                return False
+            attempts.append(now)
+            # Drop idle keys occasionally so the table doesn't grow forever
+            if len(self._attempts) > 10000:
+                for stale in [k for k, v in self._attempts.items() if not v or v[-1] <= now - self.window]:
+                    del self._attempts[stale]
+            return True
+
+
+def init_app(app):
+    app.extensions['password_hasher'] = PasswordHasher(
+        workers=app.config['PASSWORD_HASH_WORKERS'],
+        max_pending=app.config['PASSWORD_HASH_MAX_PENDING'],
+        timeout=app.config['PASSWORD_HASH_TIMEOUT']
+    )
+    window = app.config['LOGIN_THROTTLE_WINDOW']
+    app.extensions['auth_throttles'] = {
+        'ip': AttemptThrottle(app.config['LOGIN_ATTEMPTS_PER_IP'], window),
+        'username': AttemptThrottle(app.config['LOGIN_ATTEMPTS_PER_USERNAME'], window),
+    }
+
+
+def get_password_hasher():
+    return current_app.extensions['password_hasher']
+
+
+def allow_auth_attempt(ip, username=None):
+    """Check and record an authentication attempt against the per-IP and per-username limits"""
+    throttles = current_app.extensions['auth_throttles']
+    if not throttles['ip'].allow(ip or 'unknown'):
+        return False
+    if username and not throttles['username'].allow(username.lower()):
+        return False
+    return True
+
+
+def _hash_and_verify(password):
+    return check_password_hash(generate_password_hash(password), password)
+
+
+def benchmark(target_per_second, seconds, workers):
+    """Measure hash cost and pool throughput against a target logins/second"""
+    password = 'benchmark-password'
+
+    samples = []
+    for _ in range(5):
+        start = time.perf_counter()
+        check_password_hash(generate_password_hash(password), password)
+        samples.append(time.perf_counter() - start)
+    verify_cost = min(samples) / 2  # one generate + one check per sample
+    print(f"🔐 Hash method: {generate_password_hash(password).split('$')[0]}")
+    print(f"⏱️  Single hash/verify: {verify_cost * 1000:.1f} ms on one core")
+
+    completed = 0
+    with process_pool(workers) as pool:
+        # Keep a couple of jobs per worker in flight for the whole window
+        deadline = time.perf_counter() + seconds
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers * 2) as feeders:
+            def feed():
+                done = 0
+                while time.perf_counter() < deadline:
+                    pool.submit(_hash_and_verify, password).result()
+                    done += 2
+                return done
+            completed = sum(f.result() for f in [feeders.submit(feed) for _ in range(workers * 2)])
+        elapsed = time.perf_counter() - start
+
+    throughput = completed / elapsed
+    needed = math.ceil(target_per_second * verify_cost)
+    print(f"🚀 Pool of {workers} workers: {throughput:.1f} hashes/s")
+    print(f"🎯 Target {target_per_second} logins/s needs ~{needed} dedicated core(s) "
+          f"({'✅ met' if throughput >= target_per_second else '⚠️  not met'} with {workers} workers)")
+    return throughput
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark password hashing cost')
+    parser.add_argument('command', choices=['bench'])
+    parser.add_argument('--target', type=float, default=20, help='target logins per second')
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+    benchmark(args.target, args.seconds, args.workers)
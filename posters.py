@@ -0,0 +1,238 @@
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+
+from flask import current_app
+
+from http_client import get_http_session
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Target width per variant; None keeps the upstream image as-is
+POSTER_SIZES = {
+    'thumb': 200,
+    'full': None,
+}
+DEFAULT_SIZE = 'full'
+IMDB_ID_RE = re.compile(r'^tt\d{5,10}$')
+MAX_UPSTREAM_BYTES = 5 * 1024 * 1024
+
+PLACEHOLDER_SVG = """<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 300 450">
+<defs><linearGradient id="g" x1="0" y1="0" x2="1" y2="1">
+<stop offset="0%" stop-color="#667eea"/><stop offset="100%" stop-color="#764ba2"/>
+</linearGradient></defs>
+<rect width="300" height="450" fill="url(#g)"/>
+<text x="150" y="215" fill="#ffffff" font-family="Inter, Arial, sans-serif" font-size="22" text-anchor="middle">No Poster</text>
+<text x="150" y="245" fill="#ffffff" font-family="Inter, Arial, sans-serif" font-size="22" text-anchor="middle">Available</text>
+</svg>"""
+
+
+def is_valid_imdb_id(imdb_id):
+    return bool(imdb_id and IMDB_ID_RE.match(imdb_id))
+
+
+def poster_url(imdb_id, size=DEFAULT_SIZE):
+    """Local proxy URL for a movie poster (placeholder when there is no usable ID)"""
+    if not is_valid_imdb_id(imdb_id):
+        imdb_id = 'placeholder'
+    return f"/poster/{imdb_id}?size={size}"
+
+
+def placeholder_svg(size=DEFAULT_SIZE):
+    width = POSTER_SIZES.get(size) or 300
+    return PLACEHOLDER_SVG.format(width=width, height=width * 3 // 2).encode('utf-8')
+
+
+def resize_image(data, width):
+    """Downscale image bytes to width, keeping aspect ratio; returns (bytes, content_type)"""
+    if Image is None or width is None:
+        return data, None
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            if img.width <= width:
+                return data, None
+            height = round(img.height * width / img.width)
+            resized = img.convert('RGB').resize((width, height), Image.LANCZOS)
+            out = io.BytesIO()
+            resized.save(out, format='JPEG', quality=82, optimize=True, progressive=True)
+            return out.getvalue(), 'image/jpeg'
+    except Exception as e:
+        print(f"Poster resize error: {e}")
+        return data, None
+
+
+class PosterCache:
+    """Content-addressed on-disk poster cache with size-bounded LRU eviction.
+
+    Layout under root:
+        objects/ab/<sha256>   image bytes, named by the hash of their content
+        index/<imdb_id>.json  upstream URL and the object hash of each variant
+    """
+
+    def __init__(self, root, max_bytes):
+        # Absolute, because send_file() resolves relative paths against the app root, not the CWD
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._known_sources = {}
+        self._total_bytes = None
+        os.makedirs(os.path.join(self.root, 'objects'), exist_ok=True)
+        os.makedirs(os.path.join(self.root, 'index'), exist_ok=True)
+
+    def _index_path(self, imdb_id):
+        return os.path.join(self.root, 'index', f"{imdb_id}.json")
+
+    def _object_path(self, digest):
+        return os.path.join(self.root, 'objects', digest[:2], digest)
+
+    def _read_index(self, imdb_id):
+        try:
+            with open(self._index_path(imdb_id), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'source_url': None, 'variants': {}}
+
+    def _write_index(self, imdb_id, entry):
+        path = self._index_path(imdb_id)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def remember_source(self, imdb_id, url):
+        """Record the upstream poster URL so the proxy can fetch it later without an OMDB call"""
+        if not is_valid_imdb_id(imdb_id) or not url or self._known_sources.get(imdb_id) == url:
+            return
+        with self._lock:
+            entry = self._read_index(imdb_id)
+            if entry.get('source_url') != url:
+                entry = {'source_url': url, 'variants': {}}
+                self._write_index(imdb_id, entry)
+            self._known_sources[imdb_id] = url
+
+    def source_url(self, imdb_id):
+        if imdb_id in self._known_sources:
+            return self._known_sources[imdb_id]
+        return self._read_index(imdb_id).get('source_url')
+
+    def get(self, imdb_id, size):
+        """Return (path, content_type) for a cached variant, or None"""
+        variant = self._read_index(imdb_id).get('variants', {}).get(size)
+        if not variant:
+            return None
+        path = self._object_path(variant['hash'])
+        try:
+            os.utime(path)  # mtime doubles as the LRU clock
+        except OSError:
+            return None
+        return path, variant['content_type']
+
+    def put(self, imdb_id, size, data, content_type):
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        with self._lock:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+                if self._total_bytes is not None:
+                    self._total_bytes += len(data)
+
+            entry = self._read_index(imdb_id)
+            entry.setdefault('variants', {})[size] = {'hash': digest, 'content_type': content_type}
+            self._write_index(imdb_id, entry)
+
+            if self._total_bytes is None or self._total_bytes > self.max_bytes:
+                self._evict()
+        return path
+
+    def _evict(self):
+        """Delete least recently used objects until the cache is back under 90% of max_bytes"""
+        objects = []
+        total = 0
+        for root, _, files in os.walk(os.path.join(self.root, 'objects')):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                objects.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+
+        if total > self.max_bytes:
+            target = self.max_bytes * 0.9
+            objects.sort()
+            for _, size, path in objects:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+        self._total_bytes = total
+
+
+def get_poster_cache():
+    cache = current_app.extensions.get('poster_cache')
+    if cache is None:
+        cache = PosterCache(current_app.config['POSTER_CACHE_DIR'], current_app.config['POSTER_CACHE_MAX_BYTES'])
+        current_app.extensions['poster_cache'] = cache
+    return cache
+
+
+def remember_poster_source(imdb_id, url):
+    if url and isinstance(url, str) and url != 'N/A' and url.lower() not in ['none', 'null']:
+        get_poster_cache().remember_source(imdb_id, url)
+
+
+def load_poster(imdb_id, size, resolve_source=None):
+    """Return (path, content_type) for a poster variant, fetching upstream once on a miss.
+
+    resolve_source is called to look up the upstream URL when it has never been
+    seen; returns None when there is no poster to show.
+    """
+    cache = get_poster_cache()
+    cached = cache.get(imdb_id, size)
+    if cached:
+        return cached
+
+    source = cache.source_url(imdb_id)
+    if not source and resolve_source is not None:
+        remember_poster_source(imdb_id, resolve_source())
+        source = cache.source_url(imdb_id)
+    if not source:
+        return None
+
+    # Derive the variant from the full-size original if we already hold it
+    original = cache.get(imdb_id, 'full')
+    if original:
+        with open(original[0], 'rb') as f:
+            data, content_type = f.read(), original[1]
+    else:
+        try:
+            response = get_http_session().get(source, timeout=5, stream=True)
+            content_type = response.headers.get('Content-Type', '').split(';')[0]
+            if response.status_code != 200 or not content_type.startswith('image/'):
+                return None
+            data = response.raw.read(MAX_UPSTREAM_BYTES + 1, decode_content=True)
+            if len(data) > MAX_UPSTREAM_BYTES:
+                return None
+        except Exception as e:
+            print(f"Poster fetch error: {e}")
+            return None
+        if size != 'full':
+            cache.put(imdb_id, 'full', data, content_type)
+
+    resized, resized_type = resize_image(data, POSTER_SIZES[size])
+    path = cache.put(imdb_id, size, resized, resized_type or content_type)
+    return path, resized_type or content_type
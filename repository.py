@@ -0,0 +1,560 @@
+import argparse
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import current_app
+
+import movie_index
+import db_stats
+
+LAYOUT_KEY = 'user_data_shards'
+DEFAULT_PATH_TEMPLATE = '{stem}.shard{index}.db'
+SHARDED_TABLES = ('favorites', 'search_history')
+MOVE_BATCH_SIZE = 1000
+
+
+class UsernameTaken(Exception):
+    pass
+
+
+def jump_hash(key, buckets):
+    """Jump consistent hash (Lamping & Veach): growing from N to N+1 buckets moves only 1/(N+1) of keys"""
+    b, j = -1, 0
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * (1 << 31) / ((key >> 33) + 1))
+    return b
+
+
+def init_storage_layout(conn, shard_count):
+    """Record how favorites/search_history are split (only an empty database may start sharded)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS storage_layout (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    ''')
+    has_rows = any(conn.execute(f'SELECT 1 FROM {table} LIMIT 1').fetchone() for table in SHARDED_TABLES)
+    conn.execute(
+        'INSERT OR IGNORE INTO storage_layout (name, value) VALUES (?, ?)',
+        (LAYOUT_KEY, 1 if has_rows else max(1, shard_count))
+    )
+
+
+def read_layout(conn):
+    try:
+        row = conn.execute('SELECT value FROM storage_layout WHERE name = ?', (LAYOUT_KEY,)).fetchone()
+    except sqlite3.OperationalError:
+        return 1  # not migrated yet: everything is in the main database
+    return row[0] if row else 1
+
+
+def init_shard_schema(conn):
+    """favorites and search_history in a shard file (idempotent; users stay in the main database)"""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'favorites'").fetchone():
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS search_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            movie_title TEXT NOT NULL,
+            search_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            movie_id TEXT
+        )
+    ''')
+    add_history_movie_id(conn)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS favorites (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            movie_id TEXT NOT NULL,
+            movie_title TEXT NOT NULL,
+            added_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_search_history_user_date ON search_history (user_id, search_date, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_favorites_user_date ON favorites (user_id, added_date, id)')
+    conn.commit()
+
+
+def add_history_movie_id(conn):
+    """Give search_history the IMDb id the search resolved to (NULL until known; idempotent)"""
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(search_history)')}
+    if 'movie_id' not in columns:
+        conn.execute('ALTER TABLE search_history ADD COLUMN movie_id TEXT')
+
+
+# Keyset (cursor) pagination
+def encode_cursor(sort_value, row_id):
+    """Opaque cursor pointing just past (sort_value, row_id)"""
+    raw = json.dumps([sort_value, row_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort_types=(str,)):
+    """Inverse of encode_cursor; raises ValueError on a malformed cursor.
+
+    sort_types are the types the sort value may have (timestamps are
+    strings; /discover also sorts on numbers).
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(raw)
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if isinstance(sort_value, bool) or not isinstance(sort_value, sort_types) or not isinstance(row_id, int):
+        raise ValueError('Invalid cursor')
+    return sort_value, row_id
+
+
+def fetch_keyset_page(conn, table, date_column, columns, user_id, cursor=None, limit=20, join='', join_columns=()):
+    """Fetch one page of a user's rows newest first, ordered by (date_column, id).
+
+    table/date_column/columns are trusted identifiers from our own code, never
+    request input; the table is aliased t so join/join_columns can add data
+    from other tables in the same query. Returns (rows, next_cursor);
+    next_cursor is None on the last page.
+    """
+    selected = [f't.{column}' for column in ('id', date_column, *columns)] + list(join_columns)
+    query = f'SELECT {", ".join(selected)} FROM {table} t {join} WHERE t.user_id = ?'
+    params = [user_id]
+    if cursor:
+        query += f' AND (t.{date_column}, t.id) < (?, ?)'
+        params.extend(decode_cursor(cursor))
+    query += f' ORDER BY t.{date_column} DESC, t.id DESC LIMIT ?'
+    params.append(limit + 1)
+
+    rows = conn.execute(query, params).fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][date_column], rows[-1]['id'])
+    return rows, next_cursor
+
+
+class UserDataRepository:
+    """All reads and writes of users, favorites and search_history.
+
+    users live in the main database. favorites and search_history live in
+    shard files picked per user by jump_hash(user_id, N), so each shard has
+    its own writer lock; with N = 1 the "shard" is the main database itself.
+    N is read from the main database's storage_layout table, which only
+    `python repository.py rebalance` changes.
+    """
+
+    def __init__(self, main_path, path_template=DEFAULT_PATH_TEMPLATE):
+        self.main_path = main_path
+        self.path_template = path_template
+        self._shard_count = None
+        self._ready = set()
+        self._lock = threading.Lock()
+
+    def _connect(self, path):
+        conn = sqlite3.connect(path, timeout=10, factory=db_stats.connection_factory())
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @property
+    def shard_count(self):
+        if self._shard_count is None:
+            conn = self._connect(self.main_path)
+            try:
+                self._shard_count = read_layout(conn)
+            finally:
+                conn.close()
+        return self._shard_count
+
+    def shard_path(self, index, shard_count=None):
+        if (shard_count or self.shard_count) == 1:
+            return self.main_path
+        return self.path_template.format(stem=os.path.splitext(self.main_path)[0], index=index)
+
+    def shard_index(self, user_id, shard_count=None):
+        return jump_hash(int(user_id), shard_count or self.shard_count)
+
+    def connect_shard(self, index, shard_count=None):
+        path = self.shard_path(index, shard_count)
+        conn = self._connect(path)
+        if path != self.main_path and path not in self._ready:
+            init_shard_schema(conn)
+            with self._lock:
+                self._ready.add(path)
+        return conn
+
+    @contextmanager
+    def main(self):
+        conn = self._connect(self.main_path)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def shard(self, user_id):
+        conn = self.connect_shard(self.shard_index(user_id))
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    # Users (main database)
+    def create_user(self, username, password_hash):
+        with self.main() as conn:
+            try:
+                with conn:
+                    return conn.execute(
+                        'INSERT INTO users (username, password) VALUES (?, ?)', (username, password_hash)
+                    ).lastrowid
+            except sqlite3.IntegrityError:
+                raise UsernameTaken(username)
+
+    def find_user(self, username):
+        with self.main() as conn:
+            return conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
+
+    def update_password(self, user_id, password_hash):
+        with self.main() as conn, conn:
+            conn.execute('UPDATE users SET password = ? WHERE id = ?', (password_hash, user_id))
+
+    def user_ids(self):
+        with self.main() as conn:
+            return [row[0] for row in conn.execute('SELECT id FROM users ORDER BY id')]
+
+    def _movies_schema(self, conn):
+        """Schema holding the movie index, as seen from a shard connection"""
+        if self.shard_count == 1:
+            return 'main'
+        conn.execute('ATTACH DATABASE ? AS movie_meta', (self.main_path,))
+        return 'movie_meta'
+
+    # Search history (user's shard)
+    def add_search(self, user_id, movie_title, movie_id=None):
+        with self.shard(user_id) as conn, conn:
+            conn.execute(
+                'INSERT INTO search_history (user_id, movie_title, movie_id) VALUES (?, ?, ?)',
+                (user_id, movie_title, movie_id)
+            )
+
+    def history_page(self, user_id, cursor=None, limit=20):
+        """(rows, next_cursor), newest first, each row joined with its indexed movie metadata.
+
+        One query on the user's shard; raises ValueError on a bad cursor.
+        """
+        with self.shard(user_id) as conn:
+            join, columns = movie_index.metadata_join(self._movies_schema(conn), 't.movie_id')
+            return fetch_keyset_page(conn, 'search_history', 'search_date', ['movie_title', 'movie_id'],
+                                     user_id, cursor, limit, join, columns)
+
+    def link_history_titles(self, user_id, resolved):
+        """Fill in search_history.movie_id for a user's searches from {movie_title: imdb_id}"""
+        with self.shard(user_id) as conn, conn:
+            conn.executemany(
+                'UPDATE search_history SET movie_id = ? WHERE user_id = ? AND movie_title = ? AND movie_id IS NULL',
+                [(imdb_id, user_id, title) for title, imdb_id in resolved.items()]
+            )
+
+    def unlinked_history_titles(self, limit=None):
+        """{user_id: [movie_title]} for searches not yet tied to an IMDb id, across shards"""
+        pending = {}
+        sql = 'SELECT DISTINCT user_id, movie_title FROM search_history WHERE movie_id IS NULL AND user_id IS NOT NULL'
+        for _, rows in self.scatter(sql + (f' LIMIT {int(limit)}' if limit else '')):
+            for user_id, title in rows:
+                pending.setdefault(user_id, []).append(title)
+        return pending
+
+    def search_events(self, user_id, after_id=0):
+        """[(id, movie_title)] newer than after_id, oldest first"""
+        with self.shard(user_id) as conn:
+            return [tuple(row) for row in conn.execute(
+                'SELECT id, movie_title FROM search_history WHERE user_id = ? AND id > ? ORDER BY id',
+                (user_id, after_id)
+            )]
+
+    def searched_titles(self, user_id):
+        with self.shard(user_id) as conn:
+            return [row[0] for row in conn.execute(
+                'SELECT DISTINCT movie_title FROM search_history WHERE user_id = ?', (user_id,)
+            )]
+
+    # Favorites (user's shard)
+    def is_favorite(self, user_id, movie_id):
+        with self.shard(user_id) as conn:
+            return conn.execute(
+                'SELECT 1 FROM favorites WHERE user_id = ? AND movie_id = ?', (user_id, movie_id)
+            ).fetchone() is not None
+
+    def add_favorites(self, user_id, movies):
+        """Insert (movie_id, movie_title) pairs not already saved, in one transaction; returns how many were new"""
+        with self.shard(user_id) as conn, conn:
+            return conn.executemany(
+                'INSERT INTO favorites (user_id, movie_id, movie_title) SELECT ?, ?, ? '
+                'WHERE NOT EXISTS (SELECT 1 FROM favorites WHERE user_id = ? AND movie_id = ?)',
+                [(user_id, movie_id, title, user_id, movie_id) for movie_id, title in movies]
+            ).rowcount
+
+    def add_favorite(self, user_id, movie_id, movie_title):
+        """True if added, False if it was already a favorite"""
+        return self.add_favorites(user_id, [(movie_id, movie_title)]) == 1
+
+    def remove_favorite(self, user_id, favorite_id=None, movie_id=None):
+        with self.shard(user_id) as conn, conn:
+            if favorite_id:
+                conn.execute('DELETE FROM favorites WHERE id = ? AND user_id = ?', (favorite_id, user_id))
+            else:
+                conn.execute('DELETE FROM favorites WHERE movie_id = ? AND user_id = ?', (movie_id, user_id))
+
+    def favorites_page(self, user_id, cursor=None, limit=20):
+        """(rows, next_cursor), most recently added first, each row joined with its indexed movie metadata.
+
+        One query on the user's shard; raises ValueError on a bad cursor.
+        """
+        with self.shard(user_id) as conn:
+            join, columns = movie_index.metadata_join(self._movies_schema(conn), 't.movie_id')
+            return fetch_keyset_page(conn, 'favorites', 'added_date', ['movie_id', 'movie_title'],
+                                     user_id, cursor, limit, join, columns)
+
+    def favorite_events(self, user_id, after_id=0):
+        """[(id, movie_id)] added after after_id, oldest first"""
+        with self.shard(user_id) as conn:
+            return [tuple(row) for row in conn.execute(
+                'SELECT id, movie_id FROM favorites WHERE user_id = ? AND id > ? ORDER BY id',
+                (user_id, after_id)
+            )]
+
+    def favorite_ids(self, user_id):
+        with self.shard(user_id) as conn:
+            return {row[0] for row in conn.execute('SELECT movie_id FROM favorites WHERE user_id = ?', (user_id,))}
+
+    # Cross-shard (admin) queries: run on every shard and merge here
+    def scatter(self, sql, params=()):
+        """Yield (shard index, rows) for a read-only query run on each shard in turn"""
+        for index in range(self.shard_count):
+            conn = self.connect_shard(index)
+            try:
+                yield index, conn.execute(sql, params).fetchall()
+            finally:
+                conn.close()
+
+    def shard_stats(self):
+        """Per shard: path, users with data, favorites and searches"""
+        stats = []
+        for index, rows in self.scatter(
+            'SELECT (SELECT COUNT(*) FROM favorites), (SELECT COUNT(*) FROM search_history), '
+            '(SELECT COUNT(*) FROM (SELECT user_id FROM favorites UNION SELECT user_id FROM search_history))'
+        ):
+            favorites, searches, users = rows[0]
+            stats.append({'shard': index, 'path': self.shard_path(index), 'users': users,
+                          'favorites': favorites, 'searches': searches})
+        return stats
+
+    def referenced_movie_ids(self):
+        """Every IMDb id a favorite or a linked search points at, across shards"""
+        ids = set()
+        for _, rows in self.scatter(
+            'SELECT movie_id FROM favorites UNION SELECT movie_id FROM search_history WHERE movie_id IS NOT NULL'
+        ):
+            ids.update(row[0] for row in rows)
+        return ids
+
+    def most_favorited(self, limit=10):
+        counts = Counter()
+        titles = {}
+        for _, rows in self.scatter(
+            'SELECT movie_id, MAX(movie_title), COUNT(*) FROM favorites GROUP BY movie_id'
+        ):
+            for movie_id, title, count in rows:
+                counts[movie_id] += count
+                titles.setdefault(movie_id, title)
+        return [(movie_id, titles[movie_id], count) for movie_id, count in counts.most_common(limit)]
+
+    def attach_shards(self, conn):
+        """ATTACH every shard file to conn (a main-database connection).
+
+        Returns [(schema, index)]: ('main', 0) when unsharded. SQLite allows
+        10 attached databases by default, which bounds the shard count for
+        tools using this; request code only attaches the main database (for
+        the movie index) to a shard connection.
+        """
+        count = read_layout(conn)
+        if count == 1:
+            return [('main', 0)]
+        attached = {row[1] for row in conn.execute('PRAGMA database_list')}
+        schemas = []
+        for index in range(count):
+            schema = f'shard{index}'
+            if schema not in attached:
+                self.connect_shard(index, count).close()  # creates the schema on first use
+                conn.execute(f'ATTACH DATABASE ? AS {schema}', (self.shard_path(index, count),))
+            schemas.append((schema, index))
+        return schemas
+
+    def rebalance(self, new_count, dry_run=False, on_user=None):
+        """Move each user's favorites and history to their shard under new_count shards.
+
+        Run with the app stopped. Copies first (clearing any leftovers from
+        an interrupted run), then switches the recorded layout and records
+        which old shards still hold moved rows in the same transaction,
+        then deletes those rows. A rerun finishes any recorded deletes
+        before planning new moves, so a crash at any point leaves every row
+        readable exactly once and a rerun finishes the job. Moved rows get
+        new ids in their new shard. Returns {user_id: (old shard, new shard)}.
+        """
+        import analytics
+
+        if not dry_run:
+            self._finish_cleanup()
+        old_count = self.shard_count
+        moves = {}
+        for index in range(old_count):
+            conn = self.connect_shard(index, old_count)
+            try:
+                user_ids = [row[0] for row in conn.execute(
+                    'SELECT user_id FROM favorites UNION SELECT user_id FROM search_history'
+                ) if row[0] is not None]
+            finally:
+                conn.close()
+            for user_id in user_ids:
+                target = self.shard_index(user_id, new_count)
+                if self.shard_path(target, new_count) != self.shard_path(index, old_count):
+                    moves[user_id] = (index, target)
+        if dry_run:
+            return moves
+
+        with self.main() as main:
+            # Every search must be in the rollups before rows are renumbered
+            analytics.update_all_rollups(main, self.path_template)
+
+        for user_id, (source, target) in moves.items():
+            self._copy_user(user_id, source, old_count, target, new_count)
+            if on_user:
+                on_user(user_id)
+
+        with self.main() as main:
+            with main:
+                main.execute('UPDATE storage_layout SET value = ? WHERE name = ?', (new_count, LAYOUT_KEY))
+                main.executemany(
+                    'INSERT OR REPLACE INTO rebalance_cleanup (user_id, shard, shard_count) VALUES (?, ?, ?)',
+                    [(user_id, source, old_count) for user_id, (source, _) in moves.items()]
+                )
+                # Copied history is already counted: start each new shard's rollup mark past it
+                for index in range(new_count):
+                    shard = self.connect_shard(index, new_count)
+                    try:
+                        max_id = shard.execute('SELECT COALESCE(MAX(id), 0) FROM search_history').fetchone()[0]
+                    finally:
+                        shard.close()
+                    analytics.set_high_water_mark(main, max_id, analytics.shard_hwm_key(index, new_count))
+                # Profiles fold events by id; moved users refold from scratch
+                import for_you
+                for user_id in moves:
+                    for_you.mark_stale(main, user_id, rebuild=True)
+        self._shard_count = new_count
+
+        self._finish_cleanup()
+        return moves
+
+    def _finish_cleanup(self):
+        """Delete moved users' rows from the old shards a layout switch left them in"""
+        with self.main() as main:
+            with main:
+                main.execute('''
+                    CREATE TABLE IF NOT EXISTS rebalance_cleanup (
+                        user_id INTEGER PRIMARY KEY,
+                        shard INTEGER NOT NULL,
+                        shard_count INTEGER NOT NULL
+                    )
+                ''')
+            pending = main.execute('SELECT user_id, shard, shard_count FROM rebalance_cleanup').fetchall()
+            for user_id, source, source_count in pending:
+                conn = self.connect_shard(source, source_count)
+                try:
+                    for table in SHARDED_TABLES:
+                        self._delete_user_rows(conn, table, user_id)
+                finally:
+                    conn.close()
+                with main:
+                    main.execute('DELETE FROM rebalance_cleanup WHERE user_id = ?', (user_id,))
+
+    def _copy_user(self, user_id, source, old_count, target, new_count):
+        src = self.connect_shard(source, old_count)
+        dst = self.connect_shard(target, new_count)
+        try:
+            for table in SHARDED_TABLES:
+                self._delete_user_rows(dst, table, user_id)
+            with dst:
+                dst.executemany(
+                    'INSERT INTO search_history (user_id, movie_title, search_date, movie_id) VALUES (?, ?, ?, ?)',
+                    src.execute('SELECT user_id, movie_title, search_date, movie_id FROM search_history '
+                                'WHERE user_id = ? ORDER BY id', (user_id,))
+                )
+                dst.executemany(
+                    'INSERT INTO favorites (user_id, movie_id, movie_title, added_date) VALUES (?, ?, ?, ?)',
+                    src.execute('SELECT user_id, movie_id, movie_title, added_date FROM favorites '
+                                'WHERE user_id = ? ORDER BY id', (user_id,))
+                )
+        finally:
+            src.close()
+            dst.close()
+
+    def _delete_user_rows(self, conn, table, user_id):
+        # Small batches keep each write lock short
+        while True:
+            with conn:
+                deleted = conn.execute(
+                    f'DELETE FROM {table} WHERE id IN (SELECT id FROM {table} WHERE user_id = ? LIMIT ?)',
+                    (user_id, MOVE_BATCH_SIZE)
+                ).rowcount
+            if deleted < MOVE_BATCH_SIZE:
+                return
+
+
+def attach_shards(conn, path_template=DEFAULT_PATH_TEMPLATE):
+    """UserDataRepository.attach_shards for a bare connection to the main database (CLI tools)"""
+    main_path = next(row[2] for row in conn.execute('PRAGMA database_list') if row[1] == 'main')
+    return UserDataRepository(main_path, path_template).attach_shards(conn)
+
+
+def init_app(app):
+    app.extensions['repository'] = UserDataRepository(app.config['DATABASE_PATH'], app.config['SHARD_PATH_TEMPLATE'])
+
+
+def get_repository():
+    return current_app.extensions['repository']
+
+
+if __name__ == '__main__':
+    from config import Config
+
+    parser = argparse.ArgumentParser(description='User data shards: layout, cross-shard reports and rebalancing')
+    parser.add_argument('command', choices=['stats', 'top-favorites', 'rebalance'])
+    parser.add_argument('--db', default=Config.DATABASE_PATH)
+    parser.add_argument('--shards', type=int, default=Config.USER_DATA_SHARDS, help='target shard count for rebalance')
+    parser.add_argument('--dry-run', action='store_true', help='only report which users would move')
+    parser.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args()
+
+    repo = UserDataRepository(args.db, Config.SHARD_PATH_TEMPLATE)
+    if args.command == 'stats':
+        print(f"🗂️  {repo.shard_count} shard(s)")
+        for shard in repo.shard_stats():
+            print(f"  #{shard['shard']} {shard['path']}: {shard['users']} users, "
+                  f"{shard['favorites']} favorites, {shard['searches']} searches")
+    elif args.command == 'top-favorites':
+        for movie_id, title, count in repo.most_favorited(args.limit):
+            print(f"  {count:>6}  {title} ({movie_id})")
+    else:
+        if args.shards < 1:
+            parser.error('--shards must be at least 1')
+        start = time.perf_counter()
+        old_count = repo.shard_count
+        moves = repo.rebalance(args.shards, dry_run=args.dry_run)
+        verb = 'would move' if args.dry_run else 'moved'
+        print(f"✅ {old_count} -> {args.shards} shard(s): {verb} {len(moves)} users "
+              f"in {time.perf_counter() - start:.1f}s")
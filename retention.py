@@ -0,0 +1,196 @@
+import argparse
+import sqlite3
+import time
+
+import analytics
+import repository
+from config import Config
+
+BATCH_PAUSE = 0.01  # seconds between delete batches, so request writers get the lock
+
+
+def record_pruned(conn, count):
+    conn.execute(
+        'INSERT INTO analytics_state (name, value) VALUES (?, ?) '
+        'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value',
+        (analytics.PRUNED_KEY, count)
+    )
+
+
+def pruned_count(conn):
+    """Events deleted by retention so far (0 if never run)"""
+    analytics.init_analytics(conn)
+    row = conn.execute('SELECT value FROM analytics_state WHERE name = ?', (analytics.PRUNED_KEY,)).fetchone()
+    return row[0] if row else 0
+
+
+def _delete_batches(conn, source, select_ids, params, batch_size):
+    """Delete the rows select_ids finds, batch_size per transaction; returns the count"""
+    deleted = 0
+    while True:
+        with conn:
+            count = conn.execute(
+                f'DELETE FROM {source}.search_history WHERE id IN ({select_ids} LIMIT ?)',
+                (*params, batch_size)
+            ).rowcount
+            if count:
+                record_pruned(conn, count)
+        deleted += count
+        if count < batch_size:
+            return deleted
+        time.sleep(BATCH_PAUSE)
+
+
+def prune_by_age(conn, keep_days, hwm, batch_size, source='main'):
+    """Delete events older than keep_days, oldest first (ids grow with search_date)"""
+    if keep_days <= 0:
+        return 0
+    return _delete_batches(
+        conn, source,
+        f"SELECT id FROM {source}.search_history WHERE id <= ? AND search_date < datetime('now', ?) ORDER BY id",
+        (hwm, f'-{keep_days} days'),
+        batch_size
+    )
+
+
+def prune_by_count(conn, keep_per_user, hwm, batch_size, source='main'):
+    """Delete everything but each user's keep_per_user most recent events"""
+    if keep_per_user <= 0:
+        return 0
+    users = conn.execute(
+        f'SELECT user_id FROM {source}.search_history WHERE user_id IS NOT NULL GROUP BY user_id HAVING COUNT(*) > ?',
+        (keep_per_user,)
+    ).fetchall()
+    deleted = 0
+    for (user_id,) in users:
+        # The newest event that falls outside the window; it and everything older goes
+        boundary = conn.execute(
+            f'SELECT search_date, id FROM {source}.search_history WHERE user_id = ? '
+            'ORDER BY search_date DESC, id DESC LIMIT 1 OFFSET ?',
+            (user_id, keep_per_user)
+        ).fetchone()
+        if boundary is None:
+            continue
+        deleted += _delete_batches(
+            conn, source,
+            f'SELECT id FROM {source}.search_history WHERE user_id = ? AND (search_date, id) <= (?, ?) AND id <= ?',
+            (user_id, boundary[0], boundary[1], hwm),
+            batch_size
+        )
+    return deleted
+
+
+def apply_retention(conn, keep_per_user, keep_days, batch_size):
+    """Fold new searches into the analytics rollups, then delete what the policy drops.
+
+    Runs over every search_history shard. Only events at or below a shard's
+    rollup high-water mark are deleted, so every removed search is already
+    counted in search_daily_titles and search_daily_users.
+    Returns (folded, deleted).
+    """
+    folded = analytics.update_all_rollups(conn)
+    sources = repository.attach_shards(conn, Config.SHARD_PATH_TEMPLATE)
+    deleted = 0
+    for source, index in sources:
+        hwm = analytics.get_high_water_mark(conn, analytics.shard_hwm_key(index, len(sources)))
+        deleted += prune_by_age(conn, keep_days, hwm, batch_size, source)
+        deleted += prune_by_count(conn, keep_per_user, hwm, batch_size, source)
+    return folded, deleted
+
+
+def auto_vacuum_mode(conn, schema='main'):
+    mode = conn.execute(f'PRAGMA {schema}.auto_vacuum').fetchone()[0]
+    return {0: 'none', 1: 'full', 2: 'incremental'}.get(mode, 'unknown')
+
+
+def database_schemas(conn):
+    """The main database plus every attached shard"""
+    return [row[1] for row in conn.execute('PRAGMA database_list') if row[1] != 'temp']
+
+
+def enable_incremental_vacuum(conn, schema='main'):
+    """Switch an existing database to auto_vacuum=INCREMENTAL (one full VACUUM; takes an exclusive lock)"""
+    conn.execute(f'PRAGMA {schema}.auto_vacuum = INCREMENTAL')
+    conn.execute(f'VACUUM {schema}')
+
+
+def incremental_vacuum(conn, pages_per_step, max_steps, schema='main', pause=BATCH_PAUSE):
+    """Return free pages to the filesystem a few at a time; returns pages freed.
+
+    A no-op unless the database uses auto_vacuum=INCREMENTAL.
+    """
+    if auto_vacuum_mode(conn, schema) != 'incremental':
+        return 0
+    freed = 0
+    for _ in range(max_steps):
+        free = conn.execute(f'PRAGMA {schema}.freelist_count').fetchone()[0]
+        if not free:
+            break
+        # executescript() steps the pragma to completion; execute() frees a single page
+        conn.executescript(f'PRAGMA {schema}.incremental_vacuum({int(min(free, pages_per_step))})')
+        freed += free - conn.execute(f'PRAGMA {schema}.freelist_count').fetchone()[0]
+        time.sleep(pause)
+    return freed
+
+
+def run_once(conn, keep_per_user, keep_days, batch_size, vacuum_pages, vacuum_steps):
+    start = time.perf_counter()
+    folded, deleted = apply_retention(conn, keep_per_user, keep_days, batch_size)
+    freed = sum(incremental_vacuum(conn, vacuum_pages, vacuum_steps, schema) for schema in database_schemas(conn))
+    print(f"✅ Folded {folded} new searches, deleted {deleted} old ones, "
+          f"freed {freed} pages in {time.perf_counter() - start:.1f}s")
+    if any(auto_vacuum_mode(conn, schema) != 'incremental' for schema in database_schemas(conn)):
+        print("⚠️  auto_vacuum is not INCREMENTAL everywhere; run `python retention.py enable-vacuum` once "
+              "to let the files shrink")
+
+
+def print_status(conn):
+    sources = repository.attach_shards(conn, Config.SHARD_PATH_TEMPLATE)
+    for schema in database_schemas(conn):
+        page_size = conn.execute(f'PRAGMA {schema}.page_size').fetchone()[0]
+        pages = conn.execute(f'PRAGMA {schema}.page_count').fetchone()[0]
+        free = conn.execute(f'PRAGMA {schema}.freelist_count').fetchone()[0]
+        print(f"📦 {schema}: {pages * page_size / 1024 / 1024:.1f} MB ({pages} pages, {free} free), "
+              f"auto_vacuum={auto_vacuum_mode(conn, schema)}")
+    for schema, index in sources:
+        rows = conn.execute(f'SELECT COUNT(*) FROM {schema}.search_history').fetchone()[0]
+        hwm = analytics.get_high_water_mark(conn, analytics.shard_hwm_key(index, len(sources)))
+        print(f"🔎 {schema}.search_history: {rows} rows, rollups up to id {hwm}")
+    print(f"🗑️  {pruned_count(conn)} searches pruned so far")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='search_history retention and incremental vacuum')
+    parser.add_argument('command', choices=['run', 'status', 'enable-vacuum'],
+                        help='run applies the policy (schedule it from cron or use --every); '
+                             'enable-vacuum converts an existing database once')
+    parser.add_argument('--db', default=Config.DATABASE_PATH)
+    parser.add_argument('--keep-per-user', type=int, default=Config.HISTORY_KEEP_PER_USER,
+                        help='most recent searches kept per user (0 = no limit)')
+    parser.add_argument('--keep-days', type=int, default=Config.HISTORY_KEEP_DAYS,
+                        help='searches older than this are deleted (0 = no limit)')
+    parser.add_argument('--batch-size', type=int, default=Config.RETENTION_BATCH_SIZE)
+    parser.add_argument('--vacuum-pages', type=int, default=Config.VACUUM_STEP_PAGES)
+    parser.add_argument('--vacuum-steps', type=int, default=Config.VACUUM_MAX_STEPS)
+    parser.add_argument('--every', type=int, metavar='SECONDS', help='keep running, one pass per interval')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db, timeout=30)
+    try:
+        if args.command == 'status':
+            print_status(conn)
+        elif args.command == 'enable-vacuum':
+            repository.attach_shards(conn, Config.SHARD_PATH_TEMPLATE)
+            for schema in database_schemas(conn):
+                if auto_vacuum_mode(conn, schema) != 'incremental':
+                    enable_incremental_vacuum(conn, schema)
+                print(f"✅ {schema}: auto_vacuum is now {auto_vacuum_mode(conn, schema)}")
+        else:
+            while True:
+                run_once(conn, args.keep_per_user, args.keep_days, args.batch_size,
+                         args.vacuum_pages, args.vacuum_steps)
+                if not args.every:
+                    break
+                time.sleep(args.every)
+    finally:
+        conn.close()
@@ -3,13 +3,92 @@ document.addEventListener('DOMContentLoaded', function() {
     const searchInput = document.getElementById('searchInput');
     const resultsDiv = document.getElementById('results');
 
+    // Session-scoped response cache (sessionStorage), newest entries kept per namespace.
+    // Entries younger than freshMs are served as-is; older ones are shown
+    // immediately and revalidated in the background (stale-while-revalidate).
+    const responseCache = {
+        prefix: 'cinescope:',
+        maxEntries: 30,
+        freshMs: 5 * 60 * 1000,
+        
+        _indexKey(namespace) {
+            return `${this.prefix}${namespace}:index`;
+        },
+        
+        _index(namespace) {
+            try {
+                return JSON.parse(sessionStorage.getItem(this._indexKey(namespace))) || [];
+            } catch (e) {
+                return [];
+            }
+        },
+        
+        get(namespace, key) {
+            try {
+                const entry = JSON.parse(sessionStorage.getItem(`${this.prefix}${namespace}:${key}`));
+                if (!entry) return null;
+                entry.fresh = Date.now() - entry.storedAt < this.freshMs;
+                return entry;
+            } catch (e) {
+                return null;
+            }
+        },
+        
+        set(namespace, key, data) {
+            const index = this._index(namespace).filter(k => k !== key);
+            index.push(key);
+            while (index.length > this.maxEntries) {
+                sessionStorage.removeItem(`${this.prefix}${namespace}:${index.shift()}`);
+            }
+            try {
+                sessionStorage.setItem(`${this.prefix}${namespace}:${key}`, JSON.stringify({ data: data, storedAt: Date.now() }));
+                sessionStorage.setItem(this._indexKey(namespace), JSON.stringify(index));
+            } catch (e) {
+                // Quota exceeded: start this namespace over rather than fail the page
+                this.clear(namespace);
+            }
+        },
+        
+        update(namespace, fn) {
+            this._index(namespace).forEach(key => {
+                const entry = this.get(namespace, key);
+                if (entry && fn(entry.data)) {
+                    sessionStorage.setItem(`${this.prefix}${namespace}:${key}`, JSON.stringify({ data: entry.data, storedAt: entry.storedAt }));
+                }
+            });
+        },
+        
+        clear(namespace) {
+            this._index(namespace).forEach(key => sessionStorage.removeItem(`${this.prefix}${namespace}:${key}`));
+            sessionStorage.removeItem(this._indexKey(namespace));
+        }
+    };
+    
+    function cacheKey(query) {
+        return query.trim().toLowerCase().replace(/\s+/g, ' ');
+    }
+    
+    // In-flight requests; a new search aborts whatever the previous one started
+    let searchController = null;
+    let recommendationsController = null;
+
+    // Back/forward re-shows earlier searches from the cache
+    window.addEventListener('popstate', function(e) {
+        if (e.state && e.state.query && searchInput) {
+            searchInput.value = e.state.query;
+            searchMovie(e.state.query, { fromHistory: true });
+        } else if (resultsDiv) {
+            resultsDiv.innerHTML = '';
+        }
+    });
+
     // Auto-search if parameter exists
     const urlParams = new URLSearchParams(window.location.search);
     const autoSearch = urlParams.get('search') || sessionStorage.getItem('autoSearch');
     if (autoSearch && searchInput) {
         searchInput.value = autoSearch;
         sessionStorage.removeItem('autoSearch');
-        searchMovie(autoSearch);
+        searchMovie(autoSearch, { replaceHistory: true });
     }
 
     if (searchForm) {
@@ -23,10 +102,34 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
-    function searchMovie(query) {
-        showLoading();
+    function searchMovie(query, options = {}) {
+        const key = cacheKey(query);
+        const cached = responseCache.get('search', key);
+        
+        // Superseded requests are cancelled so their results can't land out of order
+        if (searchController) searchController.abort();
+        if (recommendationsController) recommendationsController.abort();
+        searchController = null;
+        
+        if (options.replaceHistory) {
+            history.replaceState({ query: query }, '', `?search=${encodeURIComponent(query)}`);
+        } else if (!options.fromHistory) {
+            history.pushState({ query: query }, '', `?search=${encodeURIComponent(query)}`);
+        }
+        
+        if (cached) {
+            displayResults(cached.data);
+            if (cached.fresh) return;
+        } else {
+            showLoading();
+        }
+        
+        const controller = new AbortController();
+        searchController = controller;
+        // Background revalidation of a cached result isn't a new search, so keep it out of history
+        const url = `/search?q=${encodeURIComponent(query)}${cached ? '&revalidate=1' : ''}`;
         
-        fetch(`/search?q=${encodeURIComponent(query)}`)
+        fetch(url, { signal: controller.signal })
             .then(response => {
                 if (!response.ok) {
                     return response.json().then(data => {
@@ -37,17 +140,43 @@ document.addEventListener('DOMContentLoaded', function() {
             })
             .then(data => {
                 if (data.error) {
-                    showError(data.error);
-                } else {
-                    displayResults(data);
+                    if (!cached) showError(data.error);
+                    return;
                 }
+                // The movie card comes back first; recommendations follow
+                if (!cached) displayResults(data);
+                return completeRecommendations(data, controller.signal).then(full => {
+                    responseCache.set('search', key, full);
+                    // Only repaint a revalidated result if it actually changed
+                    if (!cached || JSON.stringify(cached.data) !== JSON.stringify(full)) {
+                        displayResults(full, { scroll: false });
+                    }
+                });
             })
             .catch(error => {
-                // Silently handle errors - user sees friendly message
-                showError(error.message || 'Error searching for movie. Please try again.');
+                if (error.name === 'AbortError') return;
+                // Silently handle errors - user sees friendly message (the cached copy stays up)
+                if (!cached) showError(error.message || 'Error searching for movie. Please try again.');
+            })
+            .finally(() => {
+                if (searchController === controller) searchController = null;
             });
     }
 
+    // /search answers with the movie alone and starts recommendations server-side;
+    // this collects them and returns the complete response
+    function completeRecommendations(data, signal) {
+        if (!data.recommendations_pending) return Promise.resolve(data);
+        return fetch(`/search/recommendations?imdb_id=${encodeURIComponent(data.movie.imdb_id)}`, { signal: signal })
+            .then(response => response.ok ? response.json() : { recommendations: [] })
+            .then(recs => Object.assign({}, data, {
+                recommendations: recs.recommendations || [],
+                has_more_recommendations: recs.has_more_recommendations || false,
+                recommendation_page: recs.recommendation_page || 1,
+                recommendations_pending: false
+            }));
+    }
+
     function showLoading() {
         if (!resultsDiv) return;
         resultsDiv.innerHTML = `
@@ -79,7 +208,7 @@ document.addEventListener('DOMContentLoaded', function() {
     let currentRecommendationPage = 1;
     let hasMoreRecommendations = false;
 
-    function displayResults(data) {
+    function displayResults(data, options = {}) {
         const movie = data.movie;
         const recommendations = data.recommendations || [];
         const isFavorite = movie.is_favorite || false;
@@ -107,12 +236,12 @@ document.addEventListener('DOMContentLoaded', function() {
                     <div class="row g-4">
                         <div class="col-md-4 text-center">
                             <div class="poster-img-container">
-                                <img src="${movie.poster || 'https://via.placeholder.com/300x450/667eea/ffffff?text=No+Poster'}" 
+                                <img src="${movie.poster || '/poster/placeholder?size=full'}" 
                                      alt="${escapeHtml(movie.title)}" 
                                      class="img-fluid poster-img" 
                                      loading="lazy"
                                      onload="this.classList.add('loaded')"
-                                     onerror="this.onerror=null; this.src='https://via.placeholder.com/300x450/667eea/ffffff?text=No+Poster+Available'; this.classList.add('loaded');">
+                                     onerror="this.onerror=null; this.src='/poster/placeholder?size=full'; this.classList.add('loaded');">
                             </div>
                         </div>
                         <div class="col-md-8">
@@ -177,7 +306,14 @@ document.addEventListener('DOMContentLoaded', function() {
             </div>
         `;
 
-        if (recommendations && recommendations.length > 0) {
+        if (data.recommendations_pending) {
+            html += `
+                <div class="recommendations mt-5 text-center text-muted py-4" id="recommendationsSection">
+                    <div class="spinner-border spinner-border-sm text-primary me-2" role="status"></div>
+                    Finding movies similar to "${escapeHtml(movie.title)}"...
+                </div>
+            `;
+        } else if (recommendations && recommendations.length > 0) {
             // Add shown titles to exclusion list
             recommendations.forEach(rec => {
                 if (rec.title && !shownRecommendationTitles.includes(rec.title)) {
@@ -206,12 +342,12 @@ document.addEventListener('DOMContentLoaded', function() {
                     <div class="col-md-4">
                         <div class="card recommendation-card movie-card h-100 shadow border-0">
                             <div class="position-relative">
-                                <img src="${rec.poster || 'https://via.placeholder.com/300x450/667eea/ffffff?text=No+Poster'}" 
+                                <img src="${rec.poster || '/poster/placeholder?size=thumb'}" 
                                      class="card-img-top" 
                                      alt="${escapeHtml(rec.title || 'Movie')}"
                                      loading="lazy"
                                      onload="this.classList.add('loaded')"
-                                     onerror="this.onerror=null; this.src='https://via.placeholder.com/300x450/667eea/ffffff?text=No+Poster'; this.classList.add('loaded');">
+                                     onerror="this.onerror=null; this.src='/poster/placeholder?size=thumb'; this.classList.add('loaded');">
                                 <div class="position-absolute top-0 end-0 p-2">
                                     <span class="badge bg-primary">${rec.year || 'N/A'}</span>
                                 </div>
@@ -256,7 +392,9 @@ document.addEventListener('DOMContentLoaded', function() {
         resultsDiv.innerHTML = html;
         
         // Smooth scroll to results
-        resultsDiv.scrollIntoView({ behavior: 'smooth', block: 'start' });
+        if (options.scroll !== false) {
+            resultsDiv.scrollIntoView({ behavior: 'smooth', block: 'start' });
+        }
     }
     
     function escapeHtml(text) {
@@ -278,18 +416,35 @@ document.addEventListener('DOMContentLoaded', function() {
             btn.innerHTML = '<i class="fas fa-spinner fa-spin me-2"></i>Loading...';
         }
         
-        fetch('/get_recommendations', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({
-                movie_data: currentMovieData,
-                page: currentRecommendationPage + 1,
-                exclude_titles: shownRecommendationTitles
+        const page = currentRecommendationPage + 1;
+        const key = `${currentMovieData.imdb_id || cacheKey(currentMovieData.title || '')}:${page}`;
+        const cached = responseCache.get('recommendations', key);
+        
+        let request;
+        if (cached) {
+            request = Promise.resolve(cached.data);
+        } else {
+            recommendationsController = new AbortController();
+            request = fetch('/get_recommendations', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({
+                    movie_data: currentMovieData,
+                    page: page,
+                    exclude_titles: shownRecommendationTitles
+                }),
+                signal: recommendationsController.signal
             })
-        })
-        .then(response => response.json())
+            .then(response => response.json())
+            .then(data => {
+                if (!data.error) responseCache.set('recommendations', key, data);
+                return data;
+            });
+        }
+        
+        request
         .then(data => {
             if (data.error) {
                 // Show error in a more user-friendly way
@@ -321,12 +476,12 @@ document.addEventListener('DOMContentLoaded', function() {
                         <div class="col-md-4">
                             <div class="card recommendation-card movie-card h-100 shadow border-0">
                                 <div class="position-relative">
-                                    <img src="${rec.poster || 'https://via.placeholder.com/300x450/667eea/ffffff?text=No+Poster'}" 
+                                    <img src="${rec.poster || '/poster/placeholder?size=thumb'}" 
                                          class="card-img-top" 
                                          alt="${escapeHtml(rec.title)}"
                                          loading="lazy"
                                          onload="this.classList.add('loaded')"
-                                         onerror="this.onerror=null; this.src='https://via.placeholder.com/300x450/667eea/ffffff?text=No+Poster'; this.classList.add('loaded');">
+                                         onerror="this.onerror=null; this.src='/poster/placeholder?size=thumb'; this.classList.add('loaded');">
                                     <div class="position-absolute top-0 end-0 p-2">
                                         <span class="badge bg-primary">${rec.year || 'N/A'}</span>
                                     </div>
@@ -378,6 +533,7 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         })
         .catch(error => {
+            if (error.name === 'AbortError') return;
             // Show user-friendly error message
             const errorDiv = document.createElement('div');
             errorDiv.className = 'alert alert-warning alert-dismissible fade show mt-3';
@@ -415,6 +571,15 @@ document.addEventListener('DOMContentLoaded', function() {
         .then(data => {
             if (data.message) {
                 btn.classList.toggle('active');
+                // Keep cached search results in step with the new favorite state
+                const nowFavorite = btn.classList.contains('active');
+                responseCache.update('search', cachedData => {
+                    if (cachedData.movie && cachedData.movie.imdb_id === movieId) {
+                        cachedData.movie.is_favorite = nowFavorite;
+                        return true;
+                    }
+                    return false;
+                });
                 btn.innerHTML = `<i class="fas fa-heart"></i> ${btn.classList.contains('active') ? 'Remove from Favorites' : 'Add to Favorites'}`;
                 // Show success message briefly
                 const flashDiv = document.createElement('div');
@@ -0,0 +1,89 @@
+import os
+import re
+
+import assets
+
+SCRIPT = os.path.join(os.path.dirname(__file__), 'static', 'js', 'script.js')
+
+
+def template_literals(text):
+    """Every outermost `...` literal in text, scanned over the whole file rather than line by line"""
+    literals = []
+    depth = []  # 'template' or '{' per open level
+    start = None
+    i = 0
+    prev = ''
+    while i < len(text):
+        ch = text[i]
+        top = depth[-1] if depth else None
+        if top == 'template':
+            if ch == '\\':
+                i += 1
+            elif ch == '`':
+                depth.pop()
+                if not depth:
+                    literals.append(text[start:i + 1])
+                prev = '`'
+            elif text.startswith('${', i):
+                depth.append('{')
+                prev = '{'
+                i += 1
+        elif text.startswith('//', i):
+            i = text.find('\n', i)
+            if i < 0:
+                break
+            continue
+        elif text.startswith('/*', i):
+            i = text.index('*/', i) + 2
+            continue
+        elif ch in '\'"':
+            end = re.compile(r'(?:\\.|[^%s\\\n])*%s' % (ch, ch)).match(text, i + 1)
+            i = end.end()
+            prev = ch
+            continue
+        elif ch == '/' and (not prev or prev in '(,=:[!&|?{};'):
+            end = re.compile(r'(?:\\.|\[(?:\\.|[^\]\\])*\]|[^/\\\n\[])+/\w*').match(text, i + 1)
+            i = end.end()
+            prev = '/'
+            continue
+        elif ch == '`':
+            if not depth:
+                start = i
+            depth.append('template')
+        elif ch == '{' and top == '{':
+            depth.append('{')
+        elif ch == '}' and top == '{':
+            depth.pop()
+        if not ch.isspace():
+            prev = ch
+        i += 1
+    assert not depth
+    return literals
+
+
+def test_minified_script_keeps_every_template_literal():
+    with open(SCRIPT, encoding='utf-8') as f:
+        source = f.read()
+    minified = assets.minify_js(source)
+    assert len(minified) < len(source)
+    literals = template_literals(source)
+    assert any('\n' in literal and "replace(/'/g" in literal for literal in literals)
+    assert template_literals(minified) == literals
+
+
+def test_regex_literal_does_not_open_a_string():
+    source = 'const a = `\n    ${x.replace(/\'/g, "\\\\\'")}\n  `;\n    const b = 1;\n'
+    assert assets.minify_js(source) == 'const a = `\n    ${x.replace(/\'/g, "\\\\\'")}\n  `;\nconst b = 1;\n'
+
+
+def test_division_is_not_a_regex():
+    assert assets.minify_js('  const half = total / 2; const s = `a/b`\n') == 'const half = total / 2; const s = `a/b`\n'
+
+
+def test_unbalanced_source_is_left_alone():
+    source = '  const a = `\n  never closed\n'
+    assert assets.minify_js(source) == source
+
+
+def test_minify_css_keeps_strings():
+    assert assets.minify_css('a  {  content: "  x ;}  " ;  }\n/* c */') == 'a{content: "  x ;}  "}'
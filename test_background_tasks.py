@@ -0,0 +1,26 @@
+import threading
+
+import background_tasks
+
+
+def test_long_jobs_do_not_starve_keyed_tasks(app):
+    registry = background_tasks.TaskRegistry(app, workers=1, job_workers=1)
+    release = threading.Event()
+    job = registry.spawn(release.wait, 5)
+    try:
+        assert registry.submit('key', lambda: 'done').result(timeout=2) == 'done'
+    finally:
+        release.set()
+    assert job.result(timeout=2) is True
+
+
+def test_failed_task_is_retried(app):
+    registry = background_tasks.TaskRegistry(app, workers=1)
+
+    def fail():
+        raise ValueError('boom')
+
+    first = registry.submit('key', fail)
+    first.exception(timeout=2)
+    assert registry.get('key') is None
+    assert registry.submit('key', lambda: 'ok').result(timeout=2) == 'ok'
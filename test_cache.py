@@ -0,0 +1,122 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import cache
+
+
+class SlowCompute:
+    """compute() that blocks until released, counting how often it ran"""
+
+    def __init__(self, value='value'):
+        self.value = value
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        return self.value
+
+
+def test_one_computation_per_key_within_a_process():
+    shared = cache.Cache(cache.MemoryBackend())
+    compute = SlowCompute()
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        futures = [pool.submit(shared.get_or_compute, 'omdb', {'i': 'tt1'}, compute, 60) for _ in range(20)]
+        compute.started.wait(5)
+        time.sleep(0.1)
+        compute.release.set()
+        assert {future.result(5) for future in futures} == {'value'}
+    assert compute.calls == 1
+    assert shared.get('omdb', {'i': 'tt1'}) == (True, 'value')
+
+
+def test_lease_makes_other_processes_wait_for_the_result():
+    backend = cache.MemoryBackend()
+    # Two Cache objects on one backend stand in for two worker processes
+    first, second = cache.Cache(backend, lock_timeout=5), cache.Cache(backend, lock_timeout=5)
+    compute = SlowCompute()
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(first.get_or_compute, 'omdb', {'i': 'tt1'}, compute, 60)
+        compute.started.wait(5)
+        follower = pool.submit(second.get_or_compute, 'omdb', {'i': 'tt1'}, compute, 60)
+        time.sleep(0.2)
+        compute.release.set()
+        assert leader.result(5) == follower.result(5) == 'value'
+    assert compute.calls == 1
+    assert second.stats['waits'] == 1
+
+
+def test_uncacheable_results_are_recomputed():
+    shared = cache.Cache(cache.MemoryBackend())
+    results = iter([{'Response': 'False'}, {'Response': 'True'}])
+
+    def is_ok(data):
+        return data['Response'] == 'True'
+
+    assert shared.get_or_compute('omdb', 'k', lambda: next(results), 60, cache_if=is_ok) == {'Response': 'False'}
+    assert shared.get_or_compute('omdb', 'k', lambda: next(results), 60, cache_if=is_ok) == {'Response': 'True'}
+    assert shared.get_or_compute('omdb', 'k', lambda: pytest.fail('cached'), 60) == {'Response': 'True'}
+
+
+def test_waiters_compute_for_themselves_when_the_leader_fails():
+    shared = cache.Cache(cache.MemoryBackend())
+    started = threading.Event()
+    release = threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise RuntimeError('upstream down')
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(shared.get_or_compute, 'omdb', 'k', failing, 60)
+        started.wait(5)
+        waiter = pool.submit(shared.get_or_compute, 'omdb', 'k', lambda: 'fresh', 60)
+        time.sleep(0.1)
+        release.set()
+        with pytest.raises(RuntimeError):
+            leader.result(5)
+        assert waiter.result(5) == 'fresh'
+
+
+def test_lease_expires_after_a_crashed_leader():
+    backend = cache.MemoryBackend()
+    shared = cache.Cache(backend, lock_timeout=0.2)
+    backend.add(shared.make_key('omdb', 'k') + ':lock', b'1', 60)  # held by a process that died
+    start = time.monotonic()
+    assert shared.get_or_compute('omdb', 'k', lambda: 'mine', 60) == 'mine'
+    assert time.monotonic() - start < 2
+
+
+class BrokenBackend(cache.NullBackend):
+    def get(self, key):
+        raise ConnectionError('down')
+
+    def add(self, key, value, ttl):
+        raise ConnectionError('down')
+
+
+def test_backend_failures_degrade_to_misses():
+    shared = cache.Cache(BrokenBackend())
+    assert shared.get_or_compute('omdb', 'k', lambda: 'computed', 60) == 'computed'
+    assert shared.stats['errors'] >= 2
+
+
+def test_resp_backend_round_trip():
+    standin = cache.RespStandIn().start()
+    try:
+        shared = cache.Cache(cache.RespBackend(standin.url))
+        value = {'Title': 'x' * 5000}  # compressed on the wire
+        assert shared.get_or_compute('omdb', 'k', lambda: value, 60) == value
+        assert shared.get('omdb', 'k') == (True, value)
+        assert not any(key.endswith(b':lock') for key in standin.data)
+    finally:
+        standin.stop()
@@ -0,0 +1,60 @@
+import json
+import multiprocessing
+
+import db_stats
+
+
+def collector(tmp_path):
+    return db_stats.StatsCollector(str(tmp_path / 'stats.db'), 3600, 10_000, str(tmp_path / 'slow.log'))
+
+
+def test_flushes_add_up(tmp_path):
+    stats = collector(tmp_path)
+    for elapsed in (0.05, 3, 3, 40):
+        stats.record('main', 'SELECT * FROM users WHERE id = 1', elapsed, 0, False)
+    stats.flush()
+    stats.record('main', 'SELECT * FROM users WHERE id = 2', 7000, 2, True)
+    [entry] = stats.report()
+    assert entry['sql'] == 'SELECT * FROM users WHERE id = ?'
+    assert entry['calls'] == 5
+    assert entry['errors'] == 1
+    assert entry['lock_waits'] == 1
+    assert entry['p50_ms'] == 5
+    assert entry['p95_ms'] is None  # beyond the last bucket
+
+
+def _flush_many(path, rounds):
+    stats = db_stats.StatsCollector(path, 3600, 10_000, path + '.slow')
+    for _ in range(rounds):
+        stats.record('main', 'SELECT 1', 1, 0, False)
+        stats.flush()
+
+
+def test_concurrent_flushes_lose_nothing(tmp_path):
+    path = str(tmp_path / 'stats.db')
+    collector(tmp_path).reset()  # create the file before the workers race to
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=_flush_many, args=(path, 50)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+    [entry] = collector(tmp_path).report()
+    assert entry['calls'] == 200
+    conn = db_stats.StatsCollector(path, 3600, 10_000, path + '.slow')._connect()
+    try:
+        buckets = conn.execute('SELECT buckets FROM statement_stats').fetchone()[0]
+    finally:
+        conn.close()
+    assert sum(json.loads(buckets)) == 200
+
+
+def test_overflow_percentile_sorts_slowest(tmp_path):
+    stats = collector(tmp_path)
+    stats.record('main', 'SELECT * FROM favorites', 400, 0, False)
+    stats.record('main', 'SELECT * FROM movies', 9000, 0, False)
+    stats.record('main', 'SELECT * FROM users', 0.01, 0, False)
+    assert [entry['sql'] for entry in stats.report(sort='p95_ms')] == [
+        'SELECT * FROM movies', 'SELECT * FROM favorites', 'SELECT * FROM users'
+    ]
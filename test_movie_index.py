@@ -0,0 +1,48 @@
+import pytest
+from werkzeug.datastructures import MultiDict
+
+import movie_index
+import repository
+from app import get_db_connection
+
+
+@pytest.fixture
+def conn(app):
+    conn = get_db_connection()
+    with conn:
+        movie_index.ingest(conn, [
+            {'imdbID': f'tt{n:07d}', 'Title': f'Movie {n % 4}', 'Year': str(1990 + n % 3),
+             'imdbRating': f'{7 + n % 2}.0', 'Runtime': f'{90 + n} min', 'Genre': 'Drama' if n % 5 else 'Comedy'}
+            for n in range(1, 31)
+        ])
+    yield conn
+    conn.close()
+
+
+def walk(conn, args, limit=4):
+    filters = movie_index.parse_filters(MultiDict(args))
+    seen, cursor = [], None
+    while True:
+        rows, cursor = movie_index.discover(conn, filters, cursor, limit)
+        seen.extend((row[filters['sort']], row['id']) for row in rows)
+        if cursor is None:
+            return seen
+
+
+@pytest.mark.parametrize('args', [
+    {'sort': 'rating'},
+    {'sort': 'year', 'order': 'asc'},
+    {'sort': 'title'},
+    {'sort': 'runtime', 'genre': 'Drama'},
+])
+def test_discover_pages_through_ties_in_order(conn, args):
+    seen = walk(conn, args)
+    descending = args.get('order', 'asc' if args['sort'] == 'title' else 'desc') == 'desc'
+    assert seen == sorted(seen, reverse=descending)
+    assert len(set(seen)) == len(seen) == (24 if 'genre' in args else 30)
+
+
+def test_discover_rejects_a_cursor_of_the_wrong_shape(conn):
+    filters = movie_index.parse_filters(MultiDict({'sort': 'rating'}))
+    with pytest.raises(ValueError):
+        movie_index.discover(conn, filters, repository.encode_cursor([7.0], 1))
@@ -0,0 +1,16 @@
+from movie_record import MovieRecord, names
+
+
+def test_posted_movies_do_not_grow_the_name_table():
+    known = MovieRecord.from_omdb({'imdbID': 'tt0468569', 'Title': 'The Dark Knight', 'Genre': 'Action, Crime',
+                                   'Director': 'Christopher Nolan'})
+    size = len(names)
+    posted = MovieRecord.from_api_dict({'imdb_id': 'tt0468569', 'title': 'The Dark Knight',
+                                        'genre': 'Action, Made Up Genre 7f3a', 'director': 'Christopher Nolan'})
+    assert len(names) == size
+    assert posted.genre_names == ['Action', 'Made Up Genre 7f3a']
+    assert posted.director_names == ['Christopher Nolan']
+    # Known names keep their ids, so scoring against OMDB records still matches
+    assert set(posted.genres) & set(known.genres) == {known.genres[0]}
+    assert posted.directors == known.directors
+    assert posted.to_api_dict()['genre'] == 'Action, Made Up Genre 7f3a'
@@ -0,0 +1,19 @@
+import password_hasher
+
+
+def test_pool_hashes_and_verifies():
+    hasher = password_hasher.PasswordHasher(workers=1, timeout=60)
+    try:
+        pwhash = hasher.hash('secret')
+        assert hasher.verify(pwhash, 'secret')
+        assert not hasher.verify(pwhash, 'wrong')
+    finally:
+        hasher.shutdown()
+
+
+def test_pool_does_not_fork():
+    pool = password_hasher.process_pool(1)
+    try:
+        assert pool._mp_context.get_start_method() in ('forkserver', 'spawn')
+    finally:
+        pool.shutdown()
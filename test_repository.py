@@ -0,0 +1,124 @@
+import pytest
+
+import repository
+
+
+@pytest.fixture
+def repo(app):
+    repo = repository.get_repository()
+    for n in range(1, 41):
+        user_id = repo.create_user(f'user{n}', 'x')
+        repo.add_favorites(user_id, [(f'tt{n:07d}', f'Movie {n}'), (f'tt{n + 100:07d}', f'Movie {n + 100}')])
+        repo.add_search(user_id, f'Movie {n}')
+    return repo
+
+
+def rows_by_user(repo, shard_count):
+    """{user_id: [(shard, movie_id), ...]} for every favorite on every shard file"""
+    found = {}
+    paths = {repo.shard_path(index, shard_count) for index in range(shard_count)} | {repo.main_path}
+    for path in sorted(paths):
+        conn = repo._connect(path)
+        try:
+            for user_id, movie_id in conn.execute('SELECT user_id, movie_id FROM favorites'):
+                found.setdefault(user_id, []).append((path, movie_id))
+        finally:
+            conn.close()
+    return found
+
+
+def assert_each_row_once_on_its_shard(repo, shard_count):
+    found = rows_by_user(repo, shard_count)
+    assert len(found) == 40
+    for user_id, rows in found.items():
+        assert len(rows) == 2, (user_id, rows)
+        assert {path for path, _ in rows} == {repo.shard_path(repo.shard_index(user_id, shard_count), shard_count)}
+
+
+@pytest.mark.parametrize('old_count,new_count', [(1, 4), (3, 4), (4, 2)])
+def test_rebalance_moves_every_row_once(repo, old_count, new_count):
+    if old_count != 1:
+        repo.rebalance(old_count)
+    moves = repo.rebalance(new_count)
+    assert moves
+    assert repo.shard_count == new_count
+    assert_each_row_once_on_its_shard(repo, new_count)
+
+
+@pytest.mark.parametrize('old_count,new_count', [(1, 4), (3, 4)])
+def test_rebalance_rerun_after_crash_in_delete_phase(repo, monkeypatch, old_count, new_count):
+    if old_count != 1:
+        repo.rebalance(old_count)
+    real_delete = repo._delete_user_rows
+    state = {'deletes': 0}
+
+    def crash_mid_delete(conn, table, user_id):
+        if repo._shard_count != new_count:
+            return real_delete(conn, table, user_id)  # copy phase
+        state['deletes'] += 1
+        if state['deletes'] == 3:
+            # leave one of this user's rows behind, then die
+            with conn:
+                conn.execute(f'DELETE FROM {table} WHERE id = (SELECT MIN(id) FROM {table} WHERE user_id = ?)',
+                             (user_id,))
+            raise RuntimeError('crash')
+        return real_delete(conn, table, user_id)
+
+    monkeypatch.setattr(repo, '_delete_user_rows', crash_mid_delete)
+    with pytest.raises(RuntimeError):
+        repo.rebalance(new_count)
+    monkeypatch.setattr(repo, '_delete_user_rows', real_delete)
+
+    reopened = repository.UserDataRepository(repo.main_path, repo.path_template)
+    assert reopened.shard_count == new_count
+    assert reopened.rebalance(new_count) == {}
+    assert_each_row_once_on_its_shard(reopened, new_count)
+
+
+def test_rebalance_dry_run_changes_nothing(repo):
+    before = rows_by_user(repo, 1)
+    moves = repo.rebalance(4, dry_run=True)
+    assert moves
+    assert repo.shard_count == 1
+    assert rows_by_user(repo, 1) == before
+
+
+def test_cursor_round_trip():
+    cursor = repository.encode_cursor('2024-01-02 03:04:05', 42)
+    assert repository.decode_cursor(cursor) == ('2024-01-02 03:04:05', 42)
+    assert repository.decode_cursor(repository.encode_cursor(7.5, 3), sort_types=(str, int, float)) == (7.5, 3)
+
+
+@pytest.mark.parametrize('cursor', [
+    'not base64 !!',
+    repository.encode_cursor('2024-01-01', 'x'),
+    repository.encode_cursor(7.5, 3),  # numbers are only valid where the caller allows them
+    repository.encode_cursor(True, 3),
+    'WzEsMiwzXQ',  # [1,2,3]
+])
+def test_bad_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError):
+        repository.decode_cursor(cursor)
+
+
+def test_pages_walk_every_row_once_despite_equal_dates(app):
+    repo = repository.get_repository()
+    user_id = repo.create_user('pager', 'x')
+    # Inserted in one second, so every added_date ties and only the id orders them
+    repo.add_favorites(user_id, [(f'tt{n:07d}', f'Movie {n}') for n in range(1, 26)])
+    seen = []
+    cursor = None
+    while True:
+        rows, cursor = repo.favorites_page(user_id, cursor, limit=7)
+        seen.extend(row['movie_id'] for row in rows)
+        if cursor is None:
+            break
+    assert seen == [f'tt{n:07d}' for n in range(25, 0, -1)]
+
+
+def test_history_page_rejects_a_tampered_cursor(app):
+    repo = repository.get_repository()
+    user_id = repo.create_user('pager', 'x')
+    repo.add_search(user_id, 'Heat')
+    with pytest.raises(ValueError):
+        repo.history_page(user_id, repository.encode_cursor(1, 1))
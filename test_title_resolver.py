@@ -0,0 +1,73 @@
+import pytest
+
+import title_resolver
+from app import get_db_connection
+
+
+class Upstream:
+    """search_upstream stand-in answering from a dict and recording every query"""
+
+    def __init__(self, answers=None, default=None):
+        self.answers = answers or {}
+        self.default = default
+        self.queries = []
+
+    def __call__(self, query):
+        self.queries.append(query)
+        return self.answers.get(query, self.default)
+
+
+@pytest.fixture
+def conn(app):
+    conn = get_db_connection()
+    yield conn
+    conn.close()
+
+
+def test_normalize_query():
+    assert title_resolver.normalize_query(' The  Dark Knight! ') == 'dark knight'
+    assert title_resolver.normalize_query('Amélie') == 'amelie'
+    assert title_resolver.normalize_query("Schindler's List") == 'schindlers list'
+    assert title_resolver.normalize_query('The Batman', strip_article=False) == 'the batman'
+
+
+def test_transient_errors_are_not_cached(conn):
+    failing = Upstream(default=None)  # request limit, bad key, ...
+    assert title_resolver.resolve(conn, 'Heat', failing) is None
+    found = Upstream({'Heat': ('tt0113277', 'Heat')})
+    assert title_resolver.resolve(conn, 'Heat', found) == 'tt0113277'
+    assert found.queries == ['Heat']
+
+
+def test_confirmed_misses_are_cached(conn):
+    missing = Upstream(default=title_resolver.NOT_FOUND)
+    assert title_resolver.resolve(conn, 'Qwzx Plorb', missing) is None
+    assert title_resolver.resolve(conn, 'qwzx plorb', missing) is None
+    assert missing.queries == ['Qwzx Plorb']
+
+
+def test_article_variants_share_a_resolution(conn):
+    upstream = Upstream({'The Dark Knight': ('tt0468569', 'The Dark Knight')})
+    assert title_resolver.resolve(conn, 'The Dark Knight', upstream) == 'tt0468569'
+    assert title_resolver.resolve(conn, 'Dark Knight', upstream) == 'tt0468569'
+    assert upstream.queries == ['The Dark Knight']
+
+
+def test_titles_differing_by_article_stay_apart_when_both_are_known(conn):
+    resolver = title_resolver.get_title_resolver()
+    resolver.add_title('Batman', 'tt0096895')
+    resolver.add_title('The Batman', 'tt1877830')
+    upstream = Upstream(default=title_resolver.NOT_FOUND)
+    assert title_resolver.resolve(conn, 'Batman', upstream) == 'tt0096895'
+    assert title_resolver.resolve(conn, 'The Batman', upstream) == 'tt1877830'
+    assert title_resolver.resolve(conn, 'A Batman', upstream) is None  # ambiguous: asked upstream
+    assert upstream.queries == ['A Batman']
+
+
+def test_misspellings_are_corrected_only_after_a_confirmed_miss(conn):
+    title_resolver.get_title_resolver().add_title('Interstellar', 'tt0816692')
+    upstream = Upstream({'Interstelar': title_resolver.NOT_FOUND})
+    assert title_resolver.resolve(conn, 'Interstelar', upstream) == 'tt0816692'
+    assert upstream.queries == ['Interstelar']
+    # A transient failure is not taken as a miss, so nothing is corrected
+    assert title_resolver.resolve(conn, 'Interstellr', Upstream(default=None)) is None
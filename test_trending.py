@@ -0,0 +1,83 @@
+import random
+import sqlite3
+import time
+
+import pytest
+
+import trending
+
+# A bucket boundary a day ahead: counters start at the real clock and only move forward
+NOW = (time.time() // 60 + 1440) * 60
+
+
+def test_sketch_never_undercounts_and_round_trips():
+    sketch = trending.CountMinSketch(64, 4)
+    counts = {f'tt{n}': n % 7 + 1 for n in range(300)}  # far more keys than cells per row
+    for key, count in counts.items():
+        sketch.add(key, count)
+    assert all(sketch.estimate(key) >= count for key, count in counts.items())
+    copy = trending.CountMinSketch.from_bytes(64, 4, sketch.to_bytes())
+    assert all(copy.estimate(key) == sketch.estimate(key) for key in counts)
+
+
+def test_merged_sketches_count_like_one():
+    a, b, both = (trending.CountMinSketch(128, 4) for _ in range(3))
+    for key in ('tt1', 'tt2', 'tt1'):
+        a.add(key)
+        both.add(key)
+    for key in ('tt1', 'tt3'):
+        b.add(key)
+        both.add(key)
+    a.merge(b)
+    assert list(a.counts) == list(both.counts)
+
+
+@pytest.fixture
+def connect(tmp_path):
+    path = str(tmp_path / 'trending.db')
+    with sqlite3.connect(path) as conn:
+        trending.init_trending(conn)
+    return lambda: sqlite3.connect(path)
+
+
+def counter(connect, size=3):
+    return trending.TrendingCounter(connect, width=512, depth=4, size=size, bucket_seconds=60,
+                                    half_life=3600, checkpoint_interval=10 ** 12)
+
+
+def test_heavy_hitters_survive_a_long_tail(connect):
+    trend = counter(connect)
+    stream = ['tt0000001'] * 60 + ['tt0000002'] * 40 + ['tt0000003'] * 25
+    stream += [f'tt9{n:06d}' for n in range(400)]  # one search each
+    random.Random(7).shuffle(stream)
+    for imdb_id in stream:
+        trend.observe(imdb_id, imdb_id.upper(), now=NOW)
+    assert [imdb_id for imdb_id, _, _ in trend.top(3, now=NOW)] == ['tt0000001', 'tt0000002', 'tt0000003']
+    assert len(trend.candidates) <= 3 * trending.CANDIDATES_PER_RESULT
+
+
+def test_scores_halve_every_half_life_and_expire(connect):
+    trend = counter(connect)
+    for _ in range(8):
+        trend.observe('tt1', 'Heat', now=NOW)
+    assert trend.top(1, now=NOW) == [('tt1', 'Heat', 8.0)]
+    assert trend.top(1, now=NOW + 3600) == [('tt1', 'Heat', 4.0)]
+    assert trend.top(1, now=NOW + 3600 * 10) == []
+
+
+def test_workers_converge_through_checkpoints(connect):
+    first, second = counter(connect), counter(connect)
+    for _ in range(3):
+        first.observe('tt1', 'Heat', now=NOW)
+    for _ in range(2):
+        second.observe('tt1', 'Heat', now=NOW)
+    second.observe('tt2', 'Ronin', now=NOW)
+    first.checkpoint(now=NOW)
+    second.checkpoint(now=NOW)
+    first.checkpoint(now=NOW)  # nothing new: must not count anything twice
+    for trend in (first, second):
+        assert trend.top(2, now=NOW) == [('tt1', 'Heat', 5.0), ('tt2', 'Ronin', 1.0)]
+    # A restarted worker resumes from the checkpoint
+    restarted = counter(connect)
+    restarted.checkpoint(now=NOW)
+    assert restarted.top(2, now=NOW) == [('tt1', 'Heat', 5.0), ('tt2', 'Ronin', 1.0)]
@@ -0,0 +1,59 @@
+import io
+
+import pytest
+
+import watchlist_import
+from movie_record import MovieRecord
+
+
+def test_title_only_rows_store_the_canonical_title(app):
+    importer = watchlist_import.get_importer()
+    searches = []
+
+    def search_title(query):
+        searches.append(query)
+        return 'tt0468569', 'The Dark Knight'
+
+    def fetch_by_id(imdb_id):
+        return MovieRecord.from_omdb({'imdbID': imdb_id, 'Title': 'The Dark Knight'})
+
+    entry = watchlist_import.ImportEntry(None, 'dark knight')
+    assert importer._resolve(entry, search_title, fetch_by_id) == ('tt0468569', 'The Dark Knight')
+    # Resolved from the cache the second time: the title comes from OMDB by id
+    assert importer._resolve(entry, search_title, fetch_by_id) == ('tt0468569', 'The Dark Knight')
+    assert searches == ['dark knight']
+
+
+def parse(text, max_titles=100):
+    entries, duplicates = watchlist_import.parse_watchlist(io.BytesIO(text.encode('utf-8')), max_titles)
+    return [(entry.imdb_id, entry.title) for entry in entries], duplicates
+
+
+def test_imdb_export_dedupes_by_id():
+    text = ('\ufeffPosition,Const,Created,Title,URL\n'
+            '1,tt0468569,2024-01-01,The Dark Knight,https://www.imdb.com/title/tt0468569/\n'
+            '2,tt0468569,2024-01-02,The Dark Knight,https://www.imdb.com/title/tt0468569/\n'
+            '3,tt0113277,2024-01-03,Heat,https://www.imdb.com/title/tt0113277/\n')
+    assert parse(text) == ([('tt0468569', 'The Dark Knight'), ('tt0113277', 'Heat')], 1)
+
+
+def test_titles_dedupe_after_normalization():
+    text = 'Name,Year\nThe Dark Knight,2008\n dark  knight! ,2008\nDARK KNIGHT,2008\nHeat,1995\n\n'
+    assert parse(text) == ([(None, 'The Dark Knight'), (None, 'Heat')], 2)
+
+
+def test_an_id_row_and_a_title_row_for_the_same_title_count_once():
+    text = 'imdb_id,title\ntt0113277,Heat\n,heat\n'
+    assert parse(text) == ([('tt0113277', 'Heat')], 1)
+
+
+def test_headerless_lines_mix_ids_and_titles():
+    text = 'Heat\ntt0468569\nhttps://www.imdb.com/title/tt0468569/\nheat\n'
+    assert parse(text) == ([(None, 'Heat'), ('tt0468569', None)], 2)
+
+
+def test_list_size_is_capped_after_dedupe():
+    rows = '\n'.join(['Title'] + ['Heat'] * 10 + ['Ronin', 'Alien'])
+    assert parse(rows, max_titles=3)[0] == [(None, 'Heat'), (None, 'Ronin'), (None, 'Alien')]
+    with pytest.raises(ValueError):
+        parse(rows, max_titles=2)
@@ -0,0 +1,282 @@
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+
+from flask import current_app
+
+import catalog_snapshot
+
+LEADING_ARTICLES = ('the ', 'a ', 'an ')
+MIN_CORRECTABLE_LENGTH = 4  # shorter words are too ambiguous to correct
+
+# search_upstream's answer when OMDB confirms it has no match (None means it could not tell)
+NOT_FOUND = object()
+
+
+def normalize_query(text, strip_article=True):
+    """Canonical cache key for a title query.
+
+    'The Dark Knight', ' dark  knight ' and 'Dark Knight!' all become
+    'dark knight': accents are folded, case and punctuation dropped,
+    whitespace collapsed and a leading article removed. Title resolution
+    keeps the article (strip_article=False): "Batman" and "The Batman"
+    are different films.
+    """
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+    text = text.replace('&', ' and ')
+    text = re.sub(r"['’]", '', text)  # "schindler's" -> "schindlers", not "schindler s"
+    text = re.sub(r'[^\w\s]|_', ' ', text)
+    text = re.sub(r'\s+', ' ', text).strip()
+    if not strip_article:
+        return text
+    for article in LEADING_ARTICLES:
+        if text.startswith(article) and len(text) > len(article):
+            return text[len(article):]
+    return text
+
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance, or limit + 1 once it is certain to exceed limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+class SymSpellIndex:
+    """Symmetric-delete spelling index over title words.
+
+    Every word is stored under each string reachable by deleting up to
+    max_distance characters from its first prefix_length characters; a
+    misspelling is looked up the same way, so candidates are found with
+    dictionary probes instead of scanning the vocabulary. The prefix cap
+    keeps the index small for long words at little cost in recall.
+    """
+
+    def __init__(self, max_distance=2, prefix_length=7):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.words = Counter()
+        self._deletes = {}
+
+    def _variants(self, word):
+        word = word[:self.prefix_length]
+        variants = {word}
+        frontier = {word}
+        for _ in range(self.max_distance):
+            frontier = {w[:i] + w[i + 1:] for w in frontier if len(w) > 1 for i in range(len(w))}
+            variants |= frontier
+        return variants
+
+    def add(self, word, count=1):
+        if word not in self.words:
+            for variant in self._variants(word):
+                self._deletes.setdefault(variant, []).append(word)
+        self.words[word] += count
+
+    def lookup(self, word):
+        """Closest known word (most frequent on ties), or None beyond max_distance"""
+        if word in self.words:
+            return word
+        best = None
+        best_key = None
+        seen = set()
+        for variant in self._variants(word):
+            for candidate in self._deletes.get(variant, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                distance = edit_distance(word, candidate, self.max_distance)
+                if distance <= self.max_distance:
+                    key = (distance, -self.words[candidate])
+                    if best_key is None or key < best_key:
+                        best, best_key = candidate, key
+        return best
+
+
+class TitleResolver:
+    """Known normalized titles and their IMDb ids, plus a word-level speller.
+
+    Seeded from the catalog snapshot and grown with every title OMDB
+    resolves, so repeated and misspelled queries stop reaching OMDB.
+    """
+
+    def __init__(self, max_distance=2):
+        self.index = SymSpellIndex(max_distance)
+        self.titles = {}
+        self.article_free = {}  # key without its leading article -> ids of every known spelling
+        self.catalog_identity = None
+        self._lock = threading.Lock()
+
+    def add_title(self, title, imdb_id):
+        key = normalize_query(title, strip_article=False)
+        if not key:
+            return
+        with self._lock:
+            if key not in self.titles:
+                self.titles[key] = imdb_id
+                self.article_free.setdefault(normalize_query(key), set()).add(imdb_id)
+                for word in key.split():
+                    self.index.add(word)
+
+    def load_catalog(self, catalog):
+        with self._lock:
+            if self.catalog_identity == catalog.identity:
+                return
+            self.catalog_identity = catalog.identity
+        for imdb_id, title in catalog.entries():
+            self.add_title(title, imdb_id)
+
+    def known(self, key):
+        return self.titles.get(key)
+
+    def known_ignoring_article(self, key):
+        """Ids of known titles that differ from key only by a leading article"""
+        return set(self.article_free.get(normalize_query(key), ()))
+
+    def correct(self, key):
+        """Respell each unknown word of a normalized query to its closest title word"""
+        words = []
+        for word in key.split():
+            if len(word) >= MIN_CORRECTABLE_LENGTH and word not in self.index.words:
+                word = self.index.lookup(word) or word
+            words.append(word)
+        return ' '.join(words)
+
+
+def get_title_resolver():
+    """Per-app resolver; reseeded when a new catalog snapshot is swapped in"""
+    resolver = current_app.extensions.get('title_resolver')
+    if resolver is None:
+        resolver = TitleResolver(current_app.config['TITLE_FUZZY_MAX_DISTANCE'])
+        current_app.extensions['title_resolver'] = resolver
+    catalog = catalog_snapshot.get_catalog()
+    if catalog is not None and resolver.catalog_identity != catalog.identity:
+        resolver.load_catalog(catalog)
+    return resolver
+
+
+def init_title_cache(conn):
+    """Create the query -> IMDb id cache (imdb_id NULL marks a known miss)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS title_resolutions (
+            query TEXT PRIMARY KEY,
+            imdb_id TEXT,
+            resolved_at REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+
+def cached_resolution(conn, key, negative_ttl):
+    """(hit, imdb_id): hit is False when the key is unknown or its miss has expired"""
+    row = conn.execute('SELECT imdb_id, resolved_at FROM title_resolutions WHERE query = ?', (key,)).fetchone()
+    if row is None:
+        return False, None
+    if row[0] is None and row[1] < time.time() - negative_ttl:
+        return False, None
+    return True, row[0]
+
+
+def store_resolution(conn, key, imdb_id):
+    conn.execute(
+        'INSERT INTO title_resolutions (query, imdb_id, resolved_at) VALUES (?, ?, ?) '
+        'ON CONFLICT(query) DO UPDATE SET imdb_id = excluded.imdb_id, resolved_at = excluded.resolved_at',
+        (key, imdb_id, time.time())
+    )
+
+
+def article_variants(key):
+    """The other spellings of a resolution key with and without a leading article"""
+    base = normalize_query(key)
+    return {base} | {article + base for article in LEADING_ARTICLES} - {key}
+
+
+def resolve_ignoring_article(conn, resolver, key):
+    """IMDb id shared by every known spelling of key up to its article, or None.
+
+    Known titles and cached resolutions both count; when they disagree
+    (the catalog holds "Batman" and "The Batman") nothing is returned and
+    the query goes upstream as typed.
+    """
+    ids = resolver.known_ignoring_article(key)
+    variants = sorted(article_variants(key))
+    rows = conn.execute(
+        'SELECT imdb_id FROM title_resolutions WHERE imdb_id IS NOT NULL AND query IN (%s)'
+        % ','.join('?' * len(variants)),
+        variants
+    ).fetchall()
+    ids.update(row[0] for row in rows)
+    return ids.pop() if len(ids) == 1 else None
+
+
+def _resolve_key(conn, resolver, key, text, search_upstream, negative_ttl):
+    """(imdb_id, missed) for one key; missed is True only for a confirmed miss"""
+    hit, imdb_id = cached_resolution(conn, key, negative_ttl)
+    if hit:
+        return imdb_id, imdb_id is None
+    imdb_id = resolver.known(key)
+    if imdb_id:
+        store_resolution(conn, key, imdb_id)
+        conn.commit()
+        return imdb_id, False
+    imdb_id = resolve_ignoring_article(conn, resolver, key)
+    if imdb_id:
+        return imdb_id, False
+    found = search_upstream(text)
+    if found is None:
+        # quota, bad key or network trouble: say nothing, cache nothing
+        return None, False
+    if found is NOT_FOUND:
+        store_resolution(conn, key, None)
+        conn.commit()
+        return None, True
+    imdb_id, title = found
+    resolver.add_title(title, imdb_id)
+    store_resolution(conn, key, imdb_id)
+    conn.commit()
+    return imdb_id, False
+
+
+def resolve(conn, query, search_upstream):
+    """Resolve a free-text title to an IMDb id, or None.
+
+    The query itself is looked up first: resolution cache, known titles,
+    spellings that differ only by a leading article, then
+    search_upstream(text), which returns (imdb_id, title), NOT_FOUND or
+    None. Only NOT_FOUND is cached as a miss; None (quota, network) is
+    passed through so the next request asks again. Once the query is a
+    confirmed miss its spelling is corrected and the corrected key
+    resolved the same way. The raw key only ever caches what the query
+    itself resolved to, so a correction is never remembered as the
+    answer to a title OMDB knows (an unknown "Heart" must not become
+    "Heat" for good).
+    """
+    key = normalize_query(query, strip_article=False)
+    if not key:
+        return None
+    negative_ttl = current_app.config['TITLE_NEGATIVE_CACHE_TTL']
+    resolver = get_title_resolver()
+
+    text = re.sub(r'\s+', ' ', query).strip()
+    imdb_id, missed = _resolve_key(conn, resolver, key, text, search_upstream, negative_ttl)
+    if imdb_id or not missed:
+        return imdb_id
+
+    corrected = resolver.correct(key)
+    if corrected == key:
+        return None
+    return _resolve_key(conn, resolver, corrected, corrected, search_upstream, negative_ttl)[0]
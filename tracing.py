@@ -0,0 +1,469 @@
+import argparse
+import atexit
+import contextvars
+import json
+import os
+import queue
+import random
+import re
+import secrets
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+from flask import current_app, g, request
+
+TRACEPARENT_RE = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+SPAN_KINDS = {'internal': 1, 'server': 2, 'client': 3}
+MAX_STATEMENT_CHARS = 500
+EXPORT_QUEUE_SIZE = 1000  # traces waiting for the exporter thread; more are dropped
+SECRET_PARAMS = ('apikey', 'api_key', 'key', 'token', 'password')
+
+_current = contextvars.ContextVar('cinescope_span', default=None)
+_statement_recorders = []
+
+
+class Span:
+    """One timed operation; attributes follow OpenTelemetry naming where one exists"""
+
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'kind', 'start_ns', 'end_ns',
+                 'attributes', 'inherited', 'error')
+
+    def __init__(self, trace, span_id, parent_id, name, kind, attributes, inherited):
+        self.trace = trace
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        self.inherited = inherited
+        self.error = None
+
+    @property
+    def trace_id(self):
+        return self.trace.trace_id
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def traceparent(self):
+        """W3C traceparent header value naming this span as the parent"""
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.trace.forced else '00'}"
+
+
+class LocalTrace:
+    """The spans of one trace recorded under a single local root (a request or a background task).
+
+    Sampling is decided once the root ends, when its duration and outcome are
+    known (tail sampling): the tree is kept if it was slow, failed, or the
+    caller had already sampled the trace, plus a random share of the rest.
+    Spans that end after the decision are dropped.
+    """
+
+    def __init__(self, tracer, trace_id, forced):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.forced = forced
+        self.spans = []
+        self.dropped = 0
+        self.decided = False
+        self._lock = threading.Lock()
+
+    def start(self, name, parent_id, kind, attributes, inherited):
+        return Span(self, secrets.token_hex(8), parent_id, name, kind, attributes, inherited)
+
+    def finish(self, span):
+        span.end_ns = time.time_ns()
+        with self._lock:
+            if self.decided:
+                return
+            if len(self.spans) < self.tracer.max_spans:
+                self.spans.append(span)
+            else:
+                self.dropped += 1
+
+    def decide(self, root):
+        with self._lock:
+            self.decided = True
+            spans = self.spans
+        duration_ms = (root.end_ns - root.start_ns) / 1e6
+        failed = any(span.error for span in spans)
+        if self.forced or failed or duration_ms >= self.tracer.slow_ms or random.random() < self.tracer.sample_rate:
+            if self.dropped:
+                root.set('cinescope.dropped_spans', self.dropped)
+            self.tracer.export(spans)
+
+
+class Tracer:
+    def __init__(self, exporter, service_name, slow_ms, sample_rate, max_spans):
+        self.exporter = exporter
+        self.service_name = service_name
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+        self.max_spans = max_spans
+
+    def export(self, spans):
+        self.exporter.submit(encode_otlp(spans, self.service_name))
+
+
+def parse_traceparent(value):
+    """(trace_id, parent span_id, sampled) from a W3C traceparent header, or None"""
+    match = TRACEPARENT_RE.match((value or '').strip().lower())
+    if not match or match.group(1) == '0' * 32 or match.group(2) == '0' * 16:
+        return None
+    return match.group(1), match.group(2), int(match.group(3), 16) & 1 == 1
+
+
+def current_span():
+    return _current.get()
+
+
+def current_parent():
+    """(trace_id, span_id, sampled) of the active span, for work handed to another thread; None when untraced"""
+    span = _current.get()
+    return (span.trace_id, span.span_id, span.trace.forced) if span is not None else None
+
+
+@contextmanager
+def _activate(span):
+    token = _current.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        span.trace.finish(span)
+
+
+@contextmanager
+def span(name, kind='internal', inherit=None, **attributes):
+    """Time the enclosed block as a child of the active span (a no-op when nothing is being traced).
+
+    inherit holds attributes copied onto every span started beneath this one,
+    e.g. the recommendation strategy an OMDB call was made for.
+    """
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    inherited = {**parent.inherited, **inherit} if inherit else parent.inherited
+    child = parent.trace.start(name, parent.span_id, kind, {**inherited, **attributes}, inherited)
+    with _activate(child):
+        yield child
+
+
+@contextmanager
+def root_span(name, parent=None, kind='server', **attributes):
+    """Start a local root: a request, or background work continuing the trace given by parent.
+
+    parent is (trace_id, span_id, sampled), from parse_traceparent or
+    current_parent(); a no-op outside an app with tracing enabled.
+    """
+    tracer = current_app.extensions.get('tracer')
+    if tracer is None:
+        yield None
+        return
+    trace_id, parent_id, sampled = parent or (secrets.token_hex(16), None, False)
+    trace = LocalTrace(tracer, trace_id, sampled)
+    root = trace.start(name, parent_id, kind, attributes, {})
+    try:
+        with _activate(root):
+            yield root
+    finally:
+        trace.decide(root)
+
+
+def _clean_params(params):
+    if not isinstance(params, dict):
+        return None
+    return json.dumps({k: v for k, v in params.items() if str(k).lower() not in SECRET_PARAMS}, default=str)
+
+
+class TracedSession(requests.Session):
+    """requests.Session that records a client span per call and sends W3C traceparent"""
+
+    def request(self, method, url, *args, **kwargs):
+        if _current.get() is None:
+            return super().request(method, url, *args, **kwargs)
+        parts = urlsplit(url)
+        attributes = {'http.request.method': method.upper(), 'server.address': parts.hostname or '',
+                      'url.path': parts.path}
+        params = _clean_params(kwargs.get('params'))
+        if params:
+            attributes['cinescope.params'] = params
+        with span(f"{method.upper()} {parts.hostname}", kind='client', **attributes) as client:
+            kwargs['headers'] = {**(kwargs.get('headers') or {}), 'traceparent': client.traceparent()}
+            response = super().request(method, url, *args, **kwargs)
+            client.set('http.response.status_code', response.status_code)
+            if response.status_code >= 500:
+                client.error = f"HTTP {response.status_code}"
+            return response
+
+
+@contextmanager
+def recording_statements(callback):
+    """Call callback(conn, sql, params) before each statement run on a TracedConnection (db_advisor.py)"""
+    _statement_recorders.append(callback)
+    try:
+        yield
+    finally:
+        _statement_recorders.remove(callback)
+
+
+def _statement(sql):
+    return re.sub(r'\s+', ' ', sql).strip()[:MAX_STATEMENT_CHARS]
+
+
+class TracedConnection(sqlite3.Connection):
+    """sqlite3 connection factory recording a span per statement while a trace is active.
+
+    The span covers running the statement up to its first row; rows fetched
+    later are not included.
+    """
+
+    def __init__(self, database, *args, **kwargs):
+        super().__init__(database, *args, **kwargs)
+        self.db_name = os.path.basename(str(database))
+
+    def _traced(self, run, sql, *args):
+        for record in _statement_recorders:
+            record(self, sql, args[0] if args else ())
+        if _current.get() is None:
+            return run(sql, *args)
+        with span('sqlite', kind='client', **{'db.system': 'sqlite', 'db.name': self.db_name,
+                                              'db.statement': _statement(sql)}):
+            return run(sql, *args)
+
+    def execute(self, sql, *args):
+        return self._traced(super().execute, sql, *args)
+
+    def executemany(self, sql, *args):
+        return self._traced(super().executemany, sql, *args)
+
+    def executescript(self, sql):
+        return self._traced(super().executescript, sql)
+
+    def commit(self):
+        if _current.get() is None:
+            return super().commit()
+        with span('sqlite COMMIT', kind='client', **{'db.system': 'sqlite', 'db.name': self.db_name}):
+            return super().commit()
+
+
+def _attribute(key, value):
+    if isinstance(value, bool):
+        encoded = {'boolValue': value}
+    elif isinstance(value, int):
+        encoded = {'intValue': str(value)}
+    elif isinstance(value, float):
+        encoded = {'doubleValue': value}
+    else:
+        encoded = {'stringValue': str(value)}
+    return {'key': key, 'value': encoded}
+
+
+def encode_otlp(spans, service_name):
+    """OTLP/JSON ExportTraceServiceRequest for one batch of spans"""
+    encoded = []
+    for span in spans:
+        item = {
+            'traceId': span.trace_id,
+            'spanId': span.span_id,
+            'name': span.name,
+            'kind': SPAN_KINDS[span.kind],
+            'startTimeUnixNano': str(span.start_ns),
+            'endTimeUnixNano': str(span.end_ns),
+            'attributes': [_attribute(k, v) for k, v in span.attributes.items()],
+            'status': {'code': 2, 'message': span.error} if span.error else {}
+        }
+        if span.parent_id:
+            item['parentSpanId'] = span.parent_id
+        encoded.append(item)
+    return {'resourceSpans': [{
+        'resource': {'attributes': [_attribute('service.name', service_name),
+                                    _attribute('process.pid', os.getpid())]},
+        'scopeSpans': [{'scope': {'name': 'cinescope.tracing'}, 'spans': encoded}]
+    }]}
+
+
+class Exporter:
+    """Ships kept traces off the request thread, one exporter thread per process.
+
+    'file' appends one OTLP/JSON request per line (what a collector's
+    otlpjsonfile receiver and `python tracing.py show` read); 'otlp' POSTs the
+    same payload to an OTLP/HTTP endpoint such as a local collector.
+    """
+
+    def __init__(self, kind, target):
+        self.kind = kind
+        self.target = target
+        self._queue = None
+        self._owner_pid = None
+        self._lock = threading.Lock()
+        self._errors = 0
+        atexit.register(self.flush)
+
+    def _get_queue(self):
+        # Threads don't survive fork (gunicorn preload); start the exporter in each worker
+        with self._lock:
+            if self._queue is None or self._owner_pid != os.getpid():
+                self._queue = queue.Queue(EXPORT_QUEUE_SIZE)
+                self._owner_pid = os.getpid()
+                threading.Thread(target=self._drain, args=(self._queue,), name='trace-exporter', daemon=True).start()
+            return self._queue
+
+    def submit(self, payload):
+        try:
+            self._get_queue().put_nowait(payload)
+        except queue.Full:
+            pass
+
+    def _drain(self, pending):
+        session = requests.Session()  # untraced: exporting must not produce spans
+        while True:
+            payload = pending.get()
+            try:
+                self._write(session, payload)
+            except Exception as e:
+                self._errors += 1
+                if self._errors == 1 or self._errors % 100 == 0:
+                    print(f"⚠️  Trace export error ({self._errors} so far): {e}")
+            finally:
+                pending.task_done()
+
+    def _write(self, session, payload):
+        line = json.dumps(payload, separators=(',', ':'))
+        if self.kind == 'file':
+            # One O_APPEND write per trace, so lines from several workers don't interleave
+            fd = os.open(self.target, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, (line + '\n').encode('utf-8'))
+            finally:
+                os.close(fd)
+        else:
+            session.post(self.target, data=line, headers={'Content-Type': 'application/json'},
+                         timeout=2).raise_for_status()
+
+    def flush(self):
+        if self._queue is not None and self._owner_pid == os.getpid():
+            self._queue.join()
+
+
+def _start_request():
+    parent = parse_traceparent(request.headers.get('traceparent'))
+    rule = request.url_rule.rule if request.url_rule is not None else request.path
+    manager = root_span(f"{request.method} {rule}", parent=parent, **{
+        'http.request.method': request.method, 'http.route': rule, 'url.path': request.path
+    })
+    g.trace_root = manager.__enter__()
+    g.trace_manager = manager
+
+
+def _finish_response(response):
+    root = g.get('trace_root')
+    if root is not None:
+        root.set('http.response.status_code', response.status_code)
+        if response.status_code >= 500:
+            root.error = f"HTTP {response.status_code}"
+        # Lets a client (or a load-test log) find the trace of a slow response
+        response.headers['traceresponse'] = f"00-{root.trace_id}-{root.span_id}-01"
+    return response
+
+
+def _end_request(exc):
+    manager = g.pop('trace_manager', None)
+    g.pop('trace_root', None)
+    if manager is not None:
+        if exc is not None:
+            manager.__exit__(type(exc), exc, exc.__traceback__)
+        else:
+            manager.__exit__(None, None, None)
+
+
+def init_app(app):
+    kind = app.config['TRACE_EXPORTER']
+    if kind == 'none':
+        return
+    if kind not in ('file', 'otlp'):
+        raise ValueError(f"Unknown TRACE_EXPORTER {kind!r} (expected none, file or otlp)")
+    exporter = Exporter(kind, app.config['TRACE_FILE'] if kind == 'file' else app.config['TRACE_OTLP_ENDPOINT'])
+    app.extensions['tracer'] = Tracer(
+        exporter,
+        app.config['TRACE_SERVICE_NAME'],
+        app.config['TRACE_SLOW_MS'],
+        app.config['TRACE_SAMPLE_RATE'],
+        app.config['TRACE_MAX_SPANS']
+    )
+    app.before_request(_start_request)
+    app.after_request(_finish_response)
+    app.teardown_request(_end_request)
+
+
+def _read_traces(path):
+    """{trace_id: [span dict]} from an OTLP/JSON lines file"""
+    traces = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            for resource in json.loads(line)['resourceSpans']:
+                for scope in resource['scopeSpans']:
+                    for item in scope['spans']:
+                        traces.setdefault(item['traceId'], []).append(item)
+    return traces
+
+
+def _print_tree(spans):
+    by_parent = {}
+    ids = {item['spanId'] for item in spans}
+    for item in spans:
+        parent = item.get('parentSpanId')
+        by_parent.setdefault(parent if parent in ids else None, []).append(item)
+    origin = min(int(item['startTimeUnixNano']) for item in spans)
+
+    def walk(parent, depth):
+        for item in sorted(by_parent.get(parent, []), key=lambda s: int(s['startTimeUnixNano'])):
+            start = (int(item['startTimeUnixNano']) - origin) / 1e6
+            duration = (int(item['endTimeUnixNano']) - int(item['startTimeUnixNano'])) / 1e6
+            attributes = {a['key']: next(iter(a['value'].values())) for a in item.get('attributes', [])}
+            detail = attributes.get('db.statement') or attributes.get('cinescope.params') or ''
+            strategy = attributes.get('cinescope.strategy')
+            flag = ' ❌' if item.get('status', {}).get('code') == 2 else ''
+            print(f"  {start:9.1f}ms {duration:9.1f}ms  {'  ' * depth}{item['name']}"
+                  f"{f' [{strategy}]' if strategy else ''}{flag} {detail[:100]}")
+            walk(item['spanId'], depth + 1)
+
+    walk(None, 0)
+
+
+if __name__ == '__main__':
+    from config import Config
+
+    parser = argparse.ArgumentParser(description='Inspect traces written by TRACE_EXPORTER=file')
+    parser.add_argument('command', choices=['show'])
+    parser.add_argument('--path', default=Config.TRACE_FILE)
+    parser.add_argument('--slowest', type=int, default=5, help='how many of the slowest traces to print')
+    parser.add_argument('--trace-id', help='print one trace')
+    args = parser.parse_args()
+
+    traces = _read_traces(args.path)
+    if args.trace_id:
+        selected = [(args.trace_id, traces.get(args.trace_id, []))]
+    else:
+        def duration(spans):
+            return (max(int(s['endTimeUnixNano']) for s in spans) - min(int(s['startTimeUnixNano']) for s in spans))
+        selected = sorted(traces.items(), key=lambda item: duration(item[1]), reverse=True)[:args.slowest]
+    print(f"🔎 {len(traces)} traces in {args.path}")
+    for trace_id, spans in selected:
+        if not spans:
+            print(f"❌ Trace {trace_id} not found")
+            continue
+        print(f"\n🧵 {trace_id} ({len(spans)} spans)")
+        _print_tree(spans)
@@ -0,0 +1,300 @@
+import argparse
+import atexit
+import hashlib
+import heapq
+import json
+import sqlite3
+import threading
+import time
+from array import array
+
+from flask import current_app
+
+STATE_NAME = 'searches'
+CANDIDATES_PER_RESULT = 5  # heavy-hitter candidates tracked per trending slot
+MIN_SCORE = 0.05  # decayed counts below this have left the window
+
+
+class CountMinSketch:
+    """depth x width counters; estimate(key) never undercounts and overcounts by a bounded amount.
+
+    Cells are picked with blake2b rather than hash(), so every worker process
+    (and every restart) maps a key to the same cells and sketches can be
+    added together.
+    """
+
+    def __init__(self, width, depth, counts=None):
+        self.width = width
+        self.depth = depth
+        self.counts = counts if counts is not None else array('d', bytes(8 * width * depth))
+
+    def _cells(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=4 * self.depth).digest()
+        return [row * self.width + int.from_bytes(digest[4 * row:4 * row + 4], 'little') % self.width
+                for row in range(self.depth)]
+
+    def add(self, key, amount=1.0):
+        counts = self.counts
+        for cell in self._cells(key):
+            counts[cell] += amount
+
+    def estimate(self, key):
+        counts = self.counts
+        return min(counts[cell] for cell in self._cells(key))
+
+    def scale(self, factor):
+        counts = self.counts
+        for i in range(len(counts)):
+            counts[i] *= factor
+
+    def merge(self, other):
+        counts = self.counts
+        for i, value in enumerate(other.counts):
+            if value:
+                counts[i] += value
+
+    def to_bytes(self):
+        return self.counts.tobytes()
+
+    @classmethod
+    def from_bytes(cls, width, depth, data):
+        counts = array('d')
+        counts.frombytes(data)
+        return cls(width, depth, counts)
+
+
+class TrendingCounter:
+    """Streaming top-K of searched movies over a decaying time window.
+
+    Each search adds 1 to a count-min sketch and re-estimates the movie,
+    which joins a bounded set of heavy-hitter candidates if it beats the
+    weakest one (a lazy min-heap finds it). Time is cut into buckets; at
+    each bucket boundary every count is multiplied by the per-bucket decay,
+    so a search loses half its weight every half-life and drops out of the
+    window once its decayed count falls below MIN_SCORE.
+
+    Every worker counts its own searches and, every checkpoint_interval
+    seconds, merges them into the shared checkpoint row in SQLite and
+    adopts the merged state, so workers converge on one view and a restart
+    resumes from the last checkpoint. top() only sorts the small candidate
+    set: its cost does not depend on search volume.
+    """
+
+    def __init__(self, connect, width, depth, size, bucket_seconds, half_life, checkpoint_interval):
+        self.connect = connect
+        self.width = width
+        self.depth = depth
+        self.capacity = size * CANDIDATES_PER_RESULT
+        self.bucket_seconds = bucket_seconds
+        self.decay = 0.5 ** (bucket_seconds / half_life)
+        self.checkpoint_interval = checkpoint_interval
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._synced_at = 0.0
+        self._reset(self._epoch())
+
+    def _epoch(self, now=None):
+        return int((now or time.time()) // self.bucket_seconds)
+
+    def _reset(self, epoch):
+        self.epoch = epoch
+        self.sketch = CountMinSketch(self.width, self.depth)
+        self.delta = CountMinSketch(self.width, self.depth)  # local searches not yet checkpointed
+        self.candidates = {}  # imdb_id -> [estimate, title]
+        self._heap = []
+
+    def _advance(self, epoch):
+        """Apply one decay step per bucket boundary crossed since the last call"""
+        if epoch <= self.epoch:
+            return
+        factor = self.decay ** (epoch - self.epoch)
+        self.sketch.scale(factor)
+        self.delta.scale(factor)
+        self.epoch = epoch
+        self._rebuild({key: title for key, (_, title) in self.candidates.items()})
+
+    def _rebuild(self, titles):
+        """Re-estimate candidate keys against the sketch and keep the strongest"""
+        scored = [(self.sketch.estimate(key), key) for key in titles]
+        scored = heapq.nlargest(self.capacity, (item for item in scored if item[0] >= MIN_SCORE))
+        self.candidates = {key: [estimate, titles[key]] for estimate, key in scored}
+        self._heap = [(estimate, key) for estimate, key in scored]
+        heapq.heapify(self._heap)
+
+    def _offer(self, key, title, estimate):
+        entry = self.candidates.get(key)
+        if entry is not None:
+            entry[0], entry[1] = estimate, title
+            heapq.heappush(self._heap, (estimate, key))
+            return
+        if len(self.candidates) >= self.capacity:
+            # Drop stale heap entries (their candidate has been re-estimated since)
+            while self._heap and (self._heap[0][1] not in self.candidates
+                                  or self.candidates[self._heap[0][1]][0] != self._heap[0][0]):
+                heapq.heappop(self._heap)
+            if not self._heap or self._heap[0][0] >= estimate:
+                return
+            del self.candidates[heapq.heappop(self._heap)[1]]
+        self.candidates[key] = [estimate, title]
+        heapq.heappush(self._heap, (estimate, key))
+        if len(self._heap) > 4 * self.capacity:
+            self._rebuild({k: t for k, (_, t) in self.candidates.items()})
+
+    def observe(self, imdb_id, title, now=None):
+        """Count one search for a movie"""
+        if not imdb_id:
+            return
+        now = now or time.time()
+        with self._lock:
+            self._maybe_checkpoint(now)
+            self._advance(self._epoch(now))
+            self.sketch.add(imdb_id)
+            self.delta.add(imdb_id)
+            self._offer(imdb_id, title, self.sketch.estimate(imdb_id))
+
+    def top(self, limit, now=None):
+        """[(imdb_id, title, score)] for the most searched movies right now, best first"""
+        now = now or time.time()
+        with self._lock:
+            self._maybe_checkpoint(now)
+            self._advance(self._epoch(now))
+            ranked = heapq.nlargest(limit, self.candidates.items(), key=lambda item: item[1][0])
+        return [(key, title, round(score, 2)) for key, (score, title) in ranked if score >= MIN_SCORE]
+
+    def _maybe_checkpoint(self, now):
+        if now - self._synced_at < self.checkpoint_interval:
+            return
+        try:
+            self.checkpoint(now)
+        except sqlite3.Error as e:
+            print(f"Trending checkpoint error: {e}")
+        self._synced_at = now
+
+    def checkpoint(self, now=None):
+        """Merge this worker's searches into the shared state and adopt the result"""
+        now = now or time.time()
+        with self._lock:
+            epoch = self._epoch(now)
+            self._advance(epoch)
+            conn = self.connect()
+            try:
+                conn.isolation_level = None
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    shared, titles = self._load_shared(conn, epoch)
+                    shared.merge(self.delta)
+                    titles.update({key: title for key, (_, title) in self.candidates.items()})
+                    self.sketch = shared
+                    self.delta = CountMinSketch(self.width, self.depth)
+                    self._rebuild(titles)
+                    conn.execute(
+                        'INSERT INTO trending_state (name, epoch, width, depth, sketch, candidates, updated_at) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(name) DO UPDATE SET epoch = excluded.epoch, '
+                        'width = excluded.width, depth = excluded.depth, sketch = excluded.sketch, '
+                        'candidates = excluded.candidates, updated_at = excluded.updated_at',
+                        (STATE_NAME, epoch, self.width, self.depth, self.sketch.to_bytes(),
+                         json.dumps({key: title for key, (_, title) in self.candidates.items()}), now)
+                    )
+                    conn.execute('COMMIT')
+                except Exception:
+                    conn.execute('ROLLBACK')
+                    raise
+            finally:
+                conn.close()
+            self._loaded = True
+
+    def _load_shared(self, conn, epoch):
+        """The checkpointed sketch decayed to epoch, and its candidate titles"""
+        row = conn.execute(
+            'SELECT epoch, width, depth, sketch, candidates FROM trending_state WHERE name = ?', (STATE_NAME,)
+        ).fetchone()
+        if row is None or (row[1], row[2]) != (self.width, self.depth):
+            # Nothing saved yet, or the sketch was resized in config: start over
+            return CountMinSketch(self.width, self.depth), {}
+        sketch = CountMinSketch.from_bytes(self.width, self.depth, row[3])
+        if epoch > row[0]:
+            sketch.scale(self.decay ** (epoch - row[0]))
+        return sketch, json.loads(row[4])
+
+
+def init_trending(conn):
+    """Create the shared trending checkpoint table (idempotent)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS trending_state (
+            name TEXT PRIMARY KEY,
+            epoch INTEGER NOT NULL,
+            width INTEGER NOT NULL,
+            depth INTEGER NOT NULL,
+            sketch BLOB NOT NULL,
+            candidates TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    ''')
+
+
+def _counter_from_config(connect, config):
+    return TrendingCounter(
+        connect,
+        width=config['TRENDING_SKETCH_WIDTH'],
+        depth=config['TRENDING_SKETCH_DEPTH'],
+        size=config['TRENDING_SIZE'],
+        bucket_seconds=config['TRENDING_BUCKET_SECONDS'],
+        half_life=config['TRENDING_HALF_LIFE'],
+        checkpoint_interval=config['TRENDING_CHECKPOINT_INTERVAL']
+    )
+
+
+def init_app(app, connect):
+    counter = _counter_from_config(connect, app.config)
+    app.extensions['trending'] = counter
+
+    def final_checkpoint():
+        # Searches counted since the last checkpoint would otherwise be lost on shutdown
+        if counter._loaded:
+            with app.app_context():
+                try:
+                    counter.checkpoint()
+                except sqlite3.Error as e:
+                    print(f"Trending checkpoint error: {e}")
+
+    atexit.register(final_checkpoint)
+
+
+def get_trending():
+    return current_app.extensions['trending']
+
+
+def record_search(imdb_id, title):
+    """Count a search toward /trending; never lets a counting problem fail the search"""
+    try:
+        get_trending().observe(imdb_id, title)
+    except Exception as e:
+        print(f"Trending error: {e}")
+
+
+if __name__ == '__main__':
+    from config import Config
+
+    parser = argparse.ArgumentParser(description='Inspect or reset the checkpointed trending state')
+    parser.add_argument('command', choices=['show', 'reset'])
+    parser.add_argument('--db', default=Config.DATABASE_PATH)
+    parser.add_argument('--limit', type=int, default=Config.TRENDING_SIZE)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db, timeout=30)
+    try:
+        init_trending(conn)
+        if args.command == 'reset':
+            with conn:
+                conn.execute('DELETE FROM trending_state WHERE name = ?', (STATE_NAME,))
+            print("✅ Trending state cleared")
+        else:
+            config = {name: getattr(Config, name) for name in dir(Config) if name.startswith('TRENDING_')}
+            counter = _counter_from_config(lambda: sqlite3.connect(args.db, timeout=30), config)
+            ranked = counter.top(args.limit)
+            if not ranked:
+                print("No trending movies yet")
+            for rank, (imdb_id, title, score) in enumerate(ranked, 1):
+                print(f"  {rank:2}. {title} ({imdb_id}) {score}")
+    finally:
+        conn.close()
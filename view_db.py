@@ -1,8 +1,59 @@
 import sqlite3
 import os
-from tabulate import tabulate
+import sys
+import csv
+import json
+import argparse
+from urllib.request import pathname2url
 from config import Config
 
+try:
+    from tabulate import tabulate
+except ImportError:
+    tabulate = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Rows pulled from the cursor per round trip; memory use is bounded by this, not by table size
+DEFAULT_CHUNK_SIZE = 1000
+# Rows inspected to size columns in the plain-text table printer
+WIDTH_SAMPLE_SIZE = 200
+# parquet is only offered when the optional pyarrow package is installed
+EXPORT_FORMATS = ('csv', 'jsonl') + (('parquet',) if pa is not None else ())
+
+def open_readonly(db_path):
+    """Open the database read-only via a URI so inspection never takes a write lock"""
+    uri = f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro"
+    return sqlite3.connect(uri, uri=True)
+
+def quote_identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def iter_rows(cursor, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield lists of rows from an executed cursor, chunk_size at a time"""
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield rows
+
+def sample_column_widths(cursor, table_name, column_names, sample_size=WIDTH_SAMPLE_SIZE, max_width=30):
+    """Size columns from a sample of rows instead of walking the whole table"""
+    cursor.execute(f"SELECT * FROM {quote_identifier(table_name)} LIMIT ?", (sample_size,))
+    col_widths = [len(str(name)) for name in column_names]
+    for row in cursor.fetchall():
+        for i, cell in enumerate(row):
+            col_widths[i] = max(col_widths[i], len(str(cell if cell is not None else 'NULL')))
+    return [min(width + 2, max_width) for width in col_widths]
+
+def list_tables(cursor):
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
+    return [row[0] for row in cursor.fetchall()]
+
 def view_database():
     db_path = Config.DATABASE_PATH
     
@@ -13,43 +64,43 @@ def view_database():
     print(f"📊 Opening database: {db_path}")
     print("=" * 60)
     
-    conn = sqlite3.connect(db_path)
+    conn = open_readonly(db_path)
     cursor = conn.cursor()
     
     # Get all tables
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-    tables = cursor.fetchall()
+    tables = list_tables(cursor)
     
     print("📋 Tables in database:")
-    for table in tables:
-        print(f"  - {table[0]}")
+    for table_name in tables:
+        print(f"  - {table_name}")
     
     print("\n" + "=" * 60)
     
     # Show data from each table
-    for table in tables:
-        table_name = table[0]
+    for table_name in tables:
         print(f"\n📁 Table: {table_name}")
         print("-" * 50)
         
         try:
             # Get table columns
-            cursor.execute(f"PRAGMA table_info({table_name})")
+            cursor.execute(f"PRAGMA table_info({quote_identifier(table_name)})")
             columns = cursor.fetchall()
             column_names = [col[1] for col in columns]
             
-            # Get all data from table
-            cursor.execute(f"SELECT * FROM {table_name}")
-            rows = cursor.fetchall()
+            cursor.execute(f"SELECT COUNT(*) FROM {quote_identifier(table_name)}")
+            row_count = cursor.fetchone()[0]
             
-            if rows:
+            if row_count:
                 # Display data in table format
                 print(f"Columns: {', '.join(column_names)}")
-                print(f"Total rows: {len(rows)}")
+                print(f"Total rows: {row_count}")
                 print()
                 
-                # Use tabulate for nice table formatting
-                print(tabulate(rows, headers=column_names, tablefmt='grid', maxcolwidths=30))
+                # Stream the table in chunks; only the first chunk repeats the headers
+                cursor.execute(f"SELECT * FROM {quote_identifier(table_name)}")
+                for chunk_number, rows in enumerate(iter_rows(cursor)):
+                    headers = column_names if chunk_number == 0 else ()
+                    print(tabulate(rows, headers=headers, tablefmt='grid', maxcolwidths=30))
             else:
                 print("  (No data)")
                 
@@ -71,47 +122,39 @@ def view_database_simple():
     print(f"📊 Opening database: {db_path}")
     print("=" * 60)
     
-    conn = sqlite3.connect(db_path)
+    conn = open_readonly(db_path)
     cursor = conn.cursor()
     
     # Get all tables
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-    tables = cursor.fetchall()
+    tables = list_tables(cursor)
     
     print("📋 Tables in database:")
-    for table in tables:
-        print(f"  - {table[0]}")
+    for table_name in tables:
+        print(f"  - {table_name}")
     
     print("\n" + "=" * 60)
     
     # Show data from each table
-    for table in tables:
-        table_name = table[0]
+    for table_name in tables:
         print(f"\n📁 Table: {table_name}")
         print("-" * 50)
         
         try:
             # Get table columns
-            cursor.execute(f"PRAGMA table_info({table_name})")
+            cursor.execute(f"PRAGMA table_info({quote_identifier(table_name)})")
             columns = cursor.fetchall()
             column_names = [col[1] for col in columns]
             
-            # Get all data from table
-            cursor.execute(f"SELECT * FROM {table_name}")
-            rows = cursor.fetchall()
+            cursor.execute(f"SELECT COUNT(*) FROM {quote_identifier(table_name)}")
+            row_count = cursor.fetchone()[0]
             
-            if rows:
+            if row_count:
                 print(f"Columns: {', '.join(column_names)}")
-                print(f"Total rows: {len(rows)}")
+                print(f"Total rows: {row_count}")
                 print()
                 
-                # Calculate column widths
-                col_widths = []
-                for i, col_name in enumerate(column_names):
-                    max_width = len(str(col_name))
-                    for row in rows:
-                        max_width = max(max_width, len(str(row[i] if i < len(row) else '')))
-                    col_widths.append(min(max_width + 2, 30))  # Limit max width
+                # Calculate column widths from a sample (limit max width)
+                col_widths = sample_column_widths(cursor, table_name, column_names)
                 
                 # Print header
                 header = ""
@@ -120,13 +163,15 @@ def view_database_simple():
                 print(header)
                 print("-" * sum(col_widths))
                 
-                # Print rows
-                for row in rows:
-                    row_str = ""
-                    for i, cell in enumerate(row):
-                        cell_str = str(cell) if cell is not None else "NULL"
-                        row_str += f"{cell_str[:col_widths[i]-2]:<{col_widths[i]}}"
-                    print(row_str)
+                # Print rows, streaming the table in chunks
+                cursor.execute(f"SELECT * FROM {quote_identifier(table_name)}")
+                for rows in iter_rows(cursor):
+                    for row in rows:
+                        row_str = ""
+                        for i, cell in enumerate(row):
+                            cell_str = str(cell) if cell is not None else "NULL"
+                            row_str += f"{cell_str[:col_widths[i]-2]:<{col_widths[i]}}"
+                        print(row_str)
                     
             else:
                 print("  (No data)")
@@ -149,28 +194,26 @@ def view_database_detailed():
     print(f"📊 Opening database: {db_path}")
     print("=" * 70)
     
-    conn = sqlite3.connect(db_path)
+    conn = open_readonly(db_path)
     cursor = conn.cursor()
     
     # Get database info
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-    tables = cursor.fetchall()
+    tables = list_tables(cursor)
     
     print(f"📋 Total tables: {len(tables)}")
-    for table in tables:
-        print(f"  - {table[0]}")
+    for table_name in tables:
+        print(f"  - {table_name}")
     
     print("\n" + "=" * 70)
     
     # Show detailed info for each table
-    for table in tables:
-        table_name = table[0]
+    for table_name in tables:
         print(f"\n📊 Table: {table_name}")
         print("=" * 50)
         
         try:
             # Get table schema
-            cursor.execute(f"PRAGMA table_info({table_name})")
+            cursor.execute(f"PRAGMA table_info({quote_identifier(table_name)})")
             columns = cursor.fetchall()
             
             print("🔍 Table Structure:")
@@ -182,10 +225,9 @@ def view_database_detailed():
             
             # Print column info in table format
             if col_info:
-                try:
-                    from tabulate import tabulate
+                if tabulate is not None:
                     print(tabulate(col_info, headers=["Column", "Type", "Nullable", "Key"], tablefmt="simple"))
-                except ImportError:
+                else:
                     # Fallback without tabulate
                     print(f"{'Column':<15} {'Type':<10} {'Nullable':<8} {'Key':<5}")
                     print("-" * 40)
@@ -193,7 +235,7 @@ def view_database_detailed():
                         print(f"{info[0]:<15} {info[1]:<10} {info[2]:<8} {info[3]:<5}")
             
             # Get row count
-            cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
+            cursor.execute(f"SELECT COUNT(*) FROM {quote_identifier(table_name)}")
             row_count = cursor.fetchone()[0]
             
             print(f"\n📈 Total rows: {row_count}")
@@ -203,15 +245,14 @@ def view_database_detailed():
                 print("-" * 50)
                 
                 # Get sample data
-                cursor.execute(f"SELECT * FROM {table_name} LIMIT 10")
+                cursor.execute(f"SELECT * FROM {quote_identifier(table_name)} LIMIT 10")
                 rows = cursor.fetchall()
                 column_names = [col[1] for col in columns]
                 
                 # Display data
-                try:
-                    from tabulate import tabulate
+                if tabulate is not None:
                     print(tabulate(rows, headers=column_names, tablefmt='grid', maxcolwidths=25))
-                except ImportError:
+                else:
                     # Simple table formatting
                     col_widths = [min(max(len(str(name)), *[len(str(row[i])) for row in rows]), 25) + 2 
                                  for i, name in enumerate(column_names)]
@@ -254,13 +295,123 @@ def view_database_detailed():
     print("\n" + "=" * 70)
     print("✅ Database inspection complete!")
 
+# Constant-memory export of a single table
+def table_columns(cursor, table_name):
+    """(name, declared type) of each column, in table order"""
+    cursor.execute(f"PRAGMA table_info({quote_identifier(table_name)})")
+    return [(row[1], row[2] or '') for row in cursor.fetchall()]
+
+def arrow_type(pa, declared):
+    """Arrow type for a declared SQLite column type, following SQLite's affinity rules"""
+    declared = declared.upper()
+    if 'INT' in declared:
+        return pa.int64()
+    if any(name in declared for name in ('CHAR', 'CLOB', 'TEXT')):
+        return pa.string()
+    if 'BLOB' in declared:
+        return pa.binary()
+    if any(name in declared for name in ('REAL', 'FLOA', 'DOUB')):
+        return pa.float64()
+    # NUMERIC affinity (TIMESTAMP, DATE, ...) and untyped columns often hold text; keep it as text
+    return pa.string()
+
+def column_values(pa, values, field_type):
+    """SQLite is dynamically typed: render stray values in text columns as text"""
+    if field_type == pa.string():
+        return [value if value is None or isinstance(value, str) else str(value) for value in values]
+    return values
+
+def export_table(table_name, fmt, output_path, chunk_size=DEFAULT_CHUNK_SIZE, db_path=None):
+    """Stream a table to CSV, JSON Lines or Parquet without loading it into memory.
+
+    Returns the number of rows exported, or None when nothing could be exported.
+    """
+    db_path = db_path or Config.DATABASE_PATH
+    
+    if not os.path.exists(db_path):
+        print("❌ Database file not found!")
+        return None
+    
+    conn = open_readonly(db_path)
+    cursor = conn.cursor()
+    
+    if table_name not in list_tables(cursor):
+        conn.close()
+        print(f"❌ Table not found: {table_name}")
+        return None
+    
+    query = f"SELECT * FROM {quote_identifier(table_name)}"
+    exported = 0
+    
+    try:
+        if fmt == 'parquet':
+            if pa is None:
+                print("❌ Parquet export needs 'pyarrow'.")
+                print("💡 Install with: pip install pyarrow")
+                return None
+            
+            # The schema comes from the declared column types, not from whatever the first
+            # rows hold: an all-NULL chunk or a late NULL can't change a column's type
+            schema = pa.schema([
+                (name, arrow_type(pa, declared))
+                for name, declared in table_columns(cursor, table_name)
+            ])
+            cursor.execute(query)
+            with pq.ParquetWriter(output_path, schema) as writer:
+                for rows in iter_rows(cursor, chunk_size):
+                    columns = list(zip(*rows))
+                    writer.write_table(pa.Table.from_arrays(
+                        [pa.array(column_values(pa, values, field.type), type=field.type)
+                         for values, field in zip(columns, schema)],
+                        schema=schema
+                    ))
+                    exported += len(rows)
+        else:
+            cursor.execute(query)
+            column_names = [desc[0] for desc in cursor.description]
+            with open(output_path, 'w', newline='', encoding='utf-8') as f:
+                if fmt == 'csv':
+                    writer = csv.writer(f)
+                    writer.writerow(column_names)
+                    for rows in iter_rows(cursor, chunk_size):
+                        writer.writerows(rows)
+                        exported += len(rows)
+                else:
+                    for rows in iter_rows(cursor, chunk_size):
+                        for row in rows:
+                            f.write(json.dumps(dict(zip(column_names, row)), default=str))
+                            f.write('\n')
+                        exported += len(rows)
+    finally:
+        conn.close()
+    
+    print(f"✅ Exported {exported} rows from {table_name} to {output_path}")
+    return exported
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or export the CineScope database")
+    parser.add_argument('--simple', action='store_true', help="plain-text tables, no tabulate")
+    parser.add_argument('--stream', action='store_true', help="print every row, streamed in chunks")
+    parser.add_argument('--export', metavar='TABLE', help="export TABLE instead of printing")
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv',
+                        help="export format (parquet needs the optional pyarrow package)")
+    parser.add_argument('--output', help="export file (default: <table>.<format>)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+    
+    if args.export:
+        output = args.output or f"{args.export}.{args.format}"
+        exported = export_table(args.export, args.format, output, args.chunk_size)
+        sys.exit(0 if exported is not None else 1)
+    
     # Try the detailed version first, fall back to simple if tabulate is not available
-    try:
-        import tabulate
-        view_database_detailed()
-    except ImportError:
-        print("⚠️  'tabulate' package not installed. Using simple table format.")
-        print("💡 Install with: pip install tabulate")
-        print()
-        view_database_simple()
\ No newline at end of file
+    if tabulate is None or args.simple:
+        if tabulate is None:
+            print("⚠️  'tabulate' package not installed. Using simple table format.")
+            print("💡 Install with: pip install tabulate")
+            print()
+        view_database_simple()
+    elif args.stream:
+        view_database()
+    else:
+        view_database_detailed()
\ No newline at end of file
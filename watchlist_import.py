@@ -0,0 +1,318 @@
+import csv
+import io
+import json
+import re
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+import background_tasks
+import catalog_snapshot
+import for_you
+import repository
+import title_resolver
+from http_client import RateLimiter
+
+IMDB_ID_RE = re.compile(r'\btt\d{7,}\b')
+
+# Header names (lowercased) recognised in IMDb list/ratings exports, Letterboxd
+# exports and hand-written CSVs
+ID_COLUMNS = ('const', 'tconst', 'imdb_id', 'imdbid', 'imdb id', 'imdb')
+TITLE_COLUMNS = ('title', 'name', 'movie', 'movie_title', 'movie title', 'film')
+URL_COLUMNS = ('url', 'imdb url', 'link')
+
+MAX_REPORTED_MISSES = 50  # unresolved titles listed in the job status
+ACTIVE_JOB_GRACE = 300  # seconds without progress before a running job counts as dead
+
+
+def init_import_jobs(conn):
+    """Create the watchlist import job table (idempotent)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS import_jobs (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            total INTEGER NOT NULL DEFAULT 0,
+            duplicates INTEGER NOT NULL DEFAULT 0,
+            processed INTEGER NOT NULL DEFAULT 0,
+            added INTEGER NOT NULL DEFAULT 0,
+            existing INTEGER NOT NULL DEFAULT 0,
+            not_found INTEGER NOT NULL DEFAULT 0,
+            misses TEXT NOT NULL DEFAULT '[]',
+            error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_import_jobs_user ON import_jobs (user_id, created_at)')
+
+
+class ImportEntry:
+    """One deduplicated line of an uploaded list"""
+
+    __slots__ = ('imdb_id', 'title')
+
+    def __init__(self, imdb_id, title):
+        self.imdb_id = imdb_id
+        self.title = title
+
+
+def _find_column(header, names):
+    for index, name in enumerate(header):
+        if name in names:
+            return index
+    return None
+
+
+def parse_watchlist(stream, max_titles):
+    """Read a CSV list export row by row into (entries, duplicates).
+
+    Recognises IMDb exports (Const/Title), Letterboxd (Name) and any CSV
+    with a title or imdb_id column; a file without a known header is read
+    as one title or IMDb id per line. Rows are deduplicated by IMDb id and
+    by normalized title as they stream in, so memory grows with the number
+    of distinct titles, not the file size. Raises ValueError past max_titles.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace', newline='')
+    try:
+        return _parse_rows(csv.reader(text), max_titles)
+    except csv.Error as e:
+        raise ValueError(f'Could not read the file as CSV: {e}')
+
+
+def _parse_rows(rows, max_titles):
+    first = next(rows, None)
+    if first is None:
+        return [], 0
+
+    header = [cell.strip().lower() for cell in first]
+    id_col = _find_column(header, ID_COLUMNS)
+    title_col = _find_column(header, TITLE_COLUMNS)
+    url_col = _find_column(header, URL_COLUMNS)
+    if id_col is None and title_col is None:
+        # Headerless: the first cell of every row (including this one) is the movie
+        id_col = title_col = 0
+        rows = _chain_first(first, rows)
+
+    entries = []
+    seen_ids = set()
+    seen_titles = set()
+    duplicates = 0
+    for row in rows:
+        imdb_id = _cell_imdb_id(row, id_col) or _cell_imdb_id(row, url_col)
+        title = row[title_col].strip() if title_col is not None and title_col < len(row) else ''
+        if IMDB_ID_RE.fullmatch(title):
+            title = ''
+        key = title_resolver.normalize_query(title)
+        if not imdb_id and not key:
+            continue
+        if (imdb_id and imdb_id in seen_ids) or (key and key in seen_titles):
+            duplicates += 1
+            continue
+        if imdb_id:
+            seen_ids.add(imdb_id)
+        if key:
+            seen_titles.add(key)
+        if len(entries) >= max_titles:
+            raise ValueError(f'Lists are limited to {max_titles} titles')
+        entries.append(ImportEntry(imdb_id, title or None))
+    return entries, duplicates
+
+
+def _chain_first(first, rows):
+    yield first
+    yield from rows
+
+
+def _cell_imdb_id(row, col):
+    if col is None or col >= len(row):
+        return None
+    match = IMDB_ID_RE.search(row[col])
+    return match.group(0) if match else None
+
+
+class WatchlistImporter:
+    """Runs imports off the request thread, as background_tasks jobs.
+
+    Each job resolves its titles on a small thread pool; every OMDB call
+    (catalog and resolution-cache hits cost none) first waits on a limiter
+    shared by all jobs in the process. Resolved movies are written in
+    batches, one short transaction per batch, each followed by an update of
+    the progress counters the status endpoint reads.
+    """
+
+    def __init__(self, app, connect):
+        self.app = app
+        self.connect = connect
+        self.concurrency = app.config['IMPORT_CONCURRENCY']
+        self.batch_size = app.config['IMPORT_BATCH_SIZE']
+        self.limiter = RateLimiter(app.config['IMPORT_OMDB_RATE'])
+
+    def start(self, conn, user_id, entries, duplicates, search_title, fetch_by_id):
+        """Record a queued job and start it; returns the job id.
+
+        search_title(query) -> (imdb_id, title), NOT_FOUND or None (see
+        title_resolver.resolve) and fetch_by_id(imdb_id)
+        -> MovieRecord or None are the app's OMDB calls.
+        """
+        now = time.time()
+        job_id = secrets.token_urlsafe(12)
+        conn.execute(
+            'DELETE FROM import_jobs WHERE created_at < ?',
+            (now - current_app.config['IMPORT_JOB_TTL'],)
+        )
+        conn.execute(
+            'INSERT INTO import_jobs (id, user_id, total, duplicates, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+            (job_id, user_id, len(entries), duplicates, now, now)
+        )
+        conn.commit()
+        background_tasks.get_task_registry().spawn(self.run_job, job_id, user_id, entries, search_title, fetch_by_id)
+        return job_id
+
+    def run_job(self, job_id, user_id, entries, search_title, fetch_by_id):
+        conn = self.connect()
+        try:
+            self._import(conn, job_id, user_id, entries, search_title, fetch_by_id)
+        except Exception as e:
+            print(f"Watchlist import {job_id} failed: {e}")
+            conn.rollback()
+            conn.execute(
+                "UPDATE import_jobs SET status = 'failed', error = ?, updated_at = ? WHERE id = ?",
+                (str(e), time.time(), job_id)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        for_you.schedule_refresh(user_id)
+
+    def _import(self, conn, job_id, user_id, entries, search_title, fetch_by_id):
+        conn.execute("UPDATE import_jobs SET status = 'running', updated_at = ? WHERE id = ?", (time.time(), job_id))
+        conn.commit()
+
+        counts = {'processed': 0, 'added': 0, 'existing': 0, 'not_found': 0}
+        misses = []
+        seen = set()
+        batch = []
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='watchlist-resolve') as pool:
+            for entry, found in zip(entries, pool.map(lambda e: self._resolve(e, search_title, fetch_by_id), entries)):
+                counts['processed'] += 1
+                if found is None:
+                    counts['not_found'] += 1
+                    if len(misses) < MAX_REPORTED_MISSES:
+                        misses.append(entry.title or entry.imdb_id)
+                elif found[0] in seen:
+                    # Two spellings of one movie in the same file
+                    counts['existing'] += 1
+                else:
+                    seen.add(found[0])
+                    batch.append(found)
+                if counts['processed'] % self.batch_size == 0:
+                    self._flush(conn, job_id, user_id, batch, counts, misses)
+                    batch = []
+        self._flush(conn, job_id, user_id, batch, counts, misses, status='done')
+
+    def _resolve(self, entry, search_title, fetch_by_id):
+        """(imdb_id, title) for an entry, or None; OMDB is only asked what we can't answer locally"""
+        with self.app.app_context():
+            try:
+                if entry.imdb_id:
+                    if entry.title:
+                        return entry.imdb_id, entry.title
+                    title = self._known_title(entry.imdb_id)
+                    if title:
+                        return entry.imdb_id, title
+                    self.limiter.wait()
+                    record = fetch_by_id(entry.imdb_id)
+                    return (entry.imdb_id, record.title) if record else None
+
+                searched = {}
+
+                def limited_search(query):
+                    self.limiter.wait()
+                    found = search_title(query)
+                    if isinstance(found, tuple):
+                        searched[found[0]] = found[1]
+                    return found
+
+                conn = self.connect()
+                try:
+                    imdb_id = title_resolver.resolve(conn, entry.title, limited_search)
+                finally:
+                    conn.close()
+                if not imdb_id:
+                    return None
+                # Store the film's own title, not however the CSV spelled it
+                title = searched.get(imdb_id) or self._known_title(imdb_id)
+                if not title:
+                    self.limiter.wait()
+                    record = fetch_by_id(imdb_id)
+                    title = record.title if record else entry.title
+                return imdb_id, title
+            except Exception as e:
+                print(f"Watchlist import lookup error for {entry.title or entry.imdb_id!r}: {e}")
+                return None
+
+    def _known_title(self, imdb_id):
+        """Title from the catalog snapshot or the movie index, or None (no OMDB call)"""
+        catalog = catalog_snapshot.get_catalog()
+        movie = catalog.get(imdb_id) if catalog is not None else None
+        if movie:
+            return movie['Title']
+        conn = self.connect()
+        try:
+            row = conn.execute('SELECT title FROM movies WHERE imdb_id = ?', (imdb_id,)).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else None
+
+    def _flush(self, conn, job_id, user_id, batch, counts, misses, status=None):
+        """Insert one batch of favorites (one transaction on the user's shard), then record progress"""
+        inserted = repository.get_repository().add_favorites(user_id, batch) if batch else 0
+        counts['added'] += inserted
+        counts['existing'] += len(batch) - inserted
+        with conn:
+            if inserted:
+                for_you.mark_stale(conn, user_id)
+            conn.execute(
+                'UPDATE import_jobs SET status = COALESCE(?, status), processed = ?, added = ?, existing = ?, '
+                'not_found = ?, misses = ?, updated_at = ? WHERE id = ?',
+                (status, counts['processed'], counts['added'], counts['existing'],
+                 counts['not_found'], json.dumps(misses), time.time(), job_id)
+            )
+
+
+def has_active_job(conn, user_id):
+    """True while one of the user's imports is queued or still making progress"""
+    row = conn.execute(
+        "SELECT 1 FROM import_jobs WHERE user_id = ? AND status IN ('queued', 'running') AND updated_at >= ?",
+        (user_id, time.time() - ACTIVE_JOB_GRACE)
+    ).fetchone()
+    return row is not None
+
+
+def job_status(conn, job_id, user_id):
+    """The user's job as a JSON-ready dict, or None"""
+    row = conn.execute(
+        'SELECT id, status, total, duplicates, processed, added, existing, not_found, misses, error '
+        'FROM import_jobs WHERE id = ? AND user_id = ?',
+        (job_id, user_id)
+    ).fetchone()
+    if row is None:
+        return None
+    status = dict(zip(
+        ('job_id', 'status', 'total', 'duplicates', 'processed', 'added', 'existing', 'not_found', 'misses', 'error'),
+        tuple(row)
+    ))
+    status['misses'] = json.loads(status['misses'])
+    return status
+
+
+def init_app(app, connect):
+    app.extensions['watchlist_importer'] = WatchlistImporter(app, connect)
+
+
+def get_importer():
+    return current_app.extensions['watchlist_importer']